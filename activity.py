@@ -0,0 +1,132 @@
+"""Per-board activity log, written behind the request.
+
+Mutations (through ``events.published``) ``note`` what they changed on the
+session. Once the transaction commits, the notes move to the process-wide
+``ActivityRecorder``, whose worker inserts them in batches. A request never
+waits for its audit rows, and rolled-back changes are never logged.
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+import orjson
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import async_session_maker
+from models.models import Activity
+from settings import ACTIVITY_QUEUE_SIZE, ACTIVITY_BATCH_SIZE, ACTIVITY_FLUSH_INTERVAL, ACTIVITY_DRAIN_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+def note(session: AsyncSession, board_id: int, action: str, **data):
+    """Record ``action`` on ``board_id`` if and when ``session`` commits."""
+    session.info.setdefault('activity', []).append((board_id, action, data))
+
+
+class ActivityRecorder:
+    """Bounded queue of activity rows and the worker that inserts them.
+
+    ``record`` never blocks: when the queue is full the row is dropped and
+    counted, so a slow database degrades the audit trail, not the API. The
+    worker flushes when ``batch_size`` rows are waiting or ``flush_interval``
+    seconds after the oldest one arrived, whichever comes first.
+    """
+
+    def __init__(self, queue_size: int = ACTIVITY_QUEUE_SIZE, batch_size: int = ACTIVITY_BATCH_SIZE,
+                 flush_interval: float = ACTIVITY_FLUSH_INTERVAL, session_maker=async_session_maker):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.session_maker = session_maker
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._task = None
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def record(self, board_id: int, user_id: int, action: str, data: dict):
+        try:
+            self.queue.put_nowait({
+                "board_id": board_id, "user_id": user_id, "action": action, "data": data,
+                "created_at": datetime.utcnow(),
+            })
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = ACTIVITY_DRAIN_TIMEOUT):
+        """Wait up to ``timeout`` seconds for queued rows to be written, then stop the worker."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Activity log stopped with %d rows unwritten", self.queue.qsize())
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.flush(batch)
+                self.written += len(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("Writing %d activity rows failed", len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def flush(self, rows: list):
+        for row in rows:
+            # Event data may hold enums and datetimes; store what the JSON feed will show.
+            row["data"] = orjson.loads(orjson.dumps(row["data"]))
+        async with self.session_maker() as session:
+            # One multi-row INSERT per batch (insertmanyvalues).
+            await session.execute(insert(Activity), rows)
+            await session.commit()
+
+
+activity_recorder = ActivityRecorder()
+
+
+@event.listens_for(Session, 'after_commit')
+def hand_over_activity(session):
+    notes = session.info.pop('activity', None)
+    if notes:
+        user_id = session.info.get('user_id')
+        for board_id, action, data in notes:
+            activity_recorder.record(board_id, user_id, action, data)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_activity(session):
+    session.info.pop('activity', None)
@@ -0,0 +1,116 @@
+import itertools
+
+from sqlalchemy import select, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache, MISSING
+from models.models import Board, BoardUsers, BoardTable
+from settings import AUTHZ_CACHE_SIZE, AUTHZ_CACHE_TTL, READ_YOUR_WRITES_WINDOW
+
+OWNER = 'owner'
+MEMBER = 'member'
+GUEST = 'guest'
+
+
+class BoardAuthCache:
+    """Per-process cache of (user_id, board_id) -> role and table_id -> board_id.
+
+    Users without access to an existing board get ``GUEST``, missing boards are
+    cached as ``None`` so callers can tell 403 from 404. Entries expire after
+    ``ttl`` seconds; membership changes made through this process invalidate
+    them immediately, other replicas catch up within the TTL. For
+    ``lag`` seconds after an invalidation, roles read on a replica session are
+    not cached: a lagging replica would put back the role the invalidation
+    just removed, for the whole TTL.
+
+    Invalidating a whole board bumps its generation instead of scanning the
+    roles. A generation only has to outlive the roles cached before it, so it
+    is kept for the same TTL and the map stays bounded. If it is evicted
+    early, the board falls back to what other replicas already tolerate:
+    stale roles for at most the TTL.
+    """
+
+    def __init__(self, maxsize: int = AUTHZ_CACHE_SIZE, ttl: float = AUTHZ_CACHE_TTL,
+                 lag: float = READ_YOUR_WRITES_WINDOW):
+        self.roles = TTLCache(maxsize, ttl)
+        self.tables = TTLCache(maxsize, ttl)
+        self._generations = TTLCache(maxsize, ttl)
+        # (user_id, board_id) and board_id keys invalidated in the last ``lag`` seconds.
+        self._invalidated = TTLCache(maxsize, lag)
+        # Process-wide, so a board whose generation expired never gets an old number back.
+        self._next_generation = itertools.count(1)
+
+    @property
+    def hits(self):
+        return self.roles.hits + self.tables.hits
+
+    @property
+    def misses(self):
+        return self.roles.misses + self.tables.misses
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "roles": len(self.roles),
+            "tables": len(self.tables),
+        }
+
+    async def role(self, session: AsyncSession, user_id: int, board_id: int):
+        generation = self._generations.get(board_id, 0)
+        cached = self.roles.get((user_id, board_id), MISSING)
+        if cached is not MISSING and cached[0] == generation:
+            return cached[1]
+
+        query = select(
+            Board.user_id,
+            exists().where((BoardUsers.board_id == board_id), (BoardUsers.user_id == user_id)),
+        ).where((Board.id == board_id), Board.deleted_at.is_(None))
+        row = (await session.execute(query)).first()
+        if row is None:
+            role = None
+        elif row[0] == user_id:
+            role = OWNER
+        elif row[1]:
+            role = MEMBER
+        else:
+            role = GUEST
+        if not (session.info.get('replica') and self._recently_invalidated(user_id, board_id)):
+            self.roles.set((user_id, board_id), (generation, role))
+        return role
+
+    def _recently_invalidated(self, user_id: int, board_id: int) -> bool:
+        return self._invalidated.get((user_id, board_id)) is not None or self._invalidated.get(board_id) is not None
+
+    async def table_board(self, session: AsyncSession, table_id: int):
+        board_id = self.tables.get(table_id, MISSING)
+        if board_id is MISSING:
+            query = select(BoardTable.board_id).where(BoardTable.id == table_id)
+            board_id = (await session.execute(query)).scalar()
+            # Tables never change boards, but one the replica has not seen yet must not be cached as missing.
+            if board_id is not None or not session.info.get('replica'):
+                self.tables.set(table_id, board_id)
+        return board_id
+
+    async def table_role(self, session: AsyncSession, user_id: int, table_id: int):
+        board_id = await self.table_board(session, table_id)
+        if board_id is None:
+            return None
+        return await self.role(session, user_id, board_id)
+
+    def grant(self, user_id: int, board_id: int, role: str):
+        self.roles.set((user_id, board_id), (self._generations.get(board_id, 0), role))
+
+    def invalidate(self, user_id: int, board_id: int):
+        self.roles.pop((user_id, board_id))
+        self._invalidated.set((user_id, board_id), True)
+
+    def invalidate_board(self, board_id: int):
+        self._generations.set(board_id, next(self._next_generation))
+        self._invalidated.set(board_id, True)
+
+    def invalidate_table(self, table_id: int):
+        self.tables.pop(table_id)
+
+
+board_auth = BoardAuthCache()
@@ -0,0 +1,43 @@
+"""Task insert throughput by batch size: one add_task-style statement and commit per
+task vs. queries.create_tasks in one transaction per batch.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_batch_tasks
+"""
+import argparse
+import asyncio
+import time
+
+import queries
+from benchmarks.common import make_engine, reset_schema, seed_board
+from schemas import TaskCreate
+
+
+async def main(args):
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+    try:
+        _, (table_id,) = await seed_board(session_maker)
+
+        for batch_size in args.sizes:
+            items = [TaskCreate(table_id=table_id, message=f'task {i}') for i in range(args.tasks)]
+            started = time.perf_counter()
+            async with session_maker() as session:
+                if batch_size == 1:
+                    for item in items:
+                        await queries.create_task(session, item.table_id, 1, item.message)
+                        await session.commit()
+                else:
+                    for start in range(0, len(items), batch_size):
+                        await queries.create_tasks(session, 1, items[start:start + batch_size])
+                        await session.commit()
+            elapsed = time.perf_counter() - started
+            print(f'batch {batch_size:>5}: {args.tasks / elapsed:10.0f} tasks/s')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=10_000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""Lock hold times of deleting a large board: one cascading DELETE vs tombstone + reaper.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_board_delete --tasks 1000000
+
+Two identical boards are seeded. The first is removed with a single
+``DELETE FROM board`` that cascades to its tables and tasks. The second is
+tombstoned through ``queries.delete_board`` and then reaped chunk by chunk.
+The longest transaction is how long the board's rows stay locked. Meanwhile a
+writer keeps adding tasks to a third board, so the table shows what each
+approach costs unrelated traffic.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text, delete
+
+import queries
+from benchmarks.common import make_engine, reset_schema, seed_board, timer, percentile
+from models.models import Board
+from reaper import BoardReaper
+
+SEED = [
+    """INSERT INTO board (board_name, user_id, visibility, created_at)
+       SELECT 'doomed ' || n, 1, 'private', now() FROM generate_series(1, 2) AS n""",
+    """INSERT INTO boardtable (title, board_id, position)
+       SELECT 'table ' || n, b, lpad(n::text, 6, '0')
+       FROM generate_series(1, :tables) AS n, generate_series(1, 2) AS b""",
+    """INSERT INTO tasktable (message, boardtable_id, position)
+       SELECT 'task ' || n, boardtable.id, lpad(n::text, 10, '0')
+       FROM boardtable, generate_series(1, :tasks / :tables) AS n""",
+    """INSERT INTO boardusers (board_id, user_id)
+       SELECT b, n FROM generate_series(2, :members + 1) AS n, generate_series(1, 2) AS b""",
+    "ANALYZE",
+]
+
+
+async def write_continuously(session_maker, table_id: int, samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        async with session_maker() as session:
+            with timer(samples):
+                await queries.create_task(session, table_id, 1, 'probe')
+                await session.commit()
+
+
+async def measure(session_maker, table_id: int, work):
+    samples, stop = [], asyncio.Event()
+    writer = asyncio.create_task(write_continuously(session_maker, table_id, samples, stop))
+    started = time.perf_counter()
+    transactions = await work()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await writer
+    return elapsed, transactions, samples
+
+
+def report(name: str, elapsed: float, transactions: list, samples: list):
+    print(f'{name:<12}{elapsed:>10.2f}{len(transactions):>8}{percentile(transactions, 50) * 1000:>12.1f}'
+          f'{max(transactions) * 1000:>12.1f}{percentile(samples, 50) * 1000:>12.2f}'
+          f'{percentile(samples, 99) * 1000:>12.2f}')
+
+
+async def main(args):
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+    async with session_maker() as session:
+        for statement in SEED:
+            await session.execute(text(statement), {
+                "tables": args.tables, "tasks": args.tasks, "members": args.members
+            })
+        await session.commit()
+    _, (probe_table,) = await seed_board(session_maker)
+
+    try:
+        async def cascade():
+            transactions = []
+            async with session_maker() as session:
+                with timer(transactions):
+                    await session.execute(delete(Board).where(Board.id == 1))
+                    await session.commit()
+            return transactions
+
+        async def tombstone_and_reap():
+            transactions = []
+            async with session_maker() as session:
+                with timer(transactions):
+                    await queries.delete_board(session, 2, 1)
+                    await session.commit()
+            reaper = BoardReaper(chunk_size=args.chunk_size, pause=args.pause, session_maker=session_maker)
+            while True:
+                with timer(transactions):
+                    if not await reaper.reap_chunk():
+                        break
+                await asyncio.sleep(reaper.pause)
+            return transactions[:-1]
+
+        print(f'{"approach":<12}{"total s":>10}{"txns":>8}{"txn p50 ms":>12}{"txn max ms":>12}'
+              f'{"probe p50":>12}{"probe p99":>12}')
+        report('cascade', *await measure(session_maker, probe_table, cascade))
+        report('reaper', *await measure(session_maker, probe_table, tombstone_and_reap))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=1_000_000, help='tasks per board')
+    parser.add_argument('--tables', type=int, default=100)
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--pause', type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,44 @@
+"""Latency and SQL round trips of GET /boards/{id} as the board grows.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_board_snapshot
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select, func
+
+from benchmarks.common import make_engine, reset_schema, seed_board, count_statements, timer, percentile
+from models.models import BoardTable, TaskTable
+from queries import get_board_snapshot
+
+
+async def main(args):
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+    try:
+        for tasks in args.sizes:
+            board_id, _ = await seed_board(session_maker, tasks, args.tables)
+            samples = []
+            for _ in range(args.repeat):
+                async with session_maker() as session:
+                    with count_statements(engine) as statements, timer(samples):
+                        board, tables, tasks_rows = await get_board_snapshot(session, board_id, 1)
+            async with session_maker() as session:
+                stored = (await session.execute(
+                    select(func.count()).select_from(TaskTable)
+                    .join(BoardTable).where(BoardTable.board_id == board_id)
+                )).scalar_one()
+            assert len(tasks_rows) == stored == tasks
+            print(f'{tasks:>8} tasks: {len(statements)} statements  '
+                  f'p50 {percentile(samples, 50) * 1000:9.2f} ms  '
+                  f'p95 {percentile(samples, 95) * 1000:9.2f} ms')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1_000, 10_000, 100_000])
+    parser.add_argument('--tables', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
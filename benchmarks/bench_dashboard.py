@@ -0,0 +1,62 @@
+"""Dashboard page latency: maintained counters vs COUNT(*) over tables and tasks per board.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_dashboard --boards 50 --tasks 20000
+
+Seeds ``--boards`` boards owned by one user, fills in their counters with the
+reconciliation queries, then times the first dashboard page both ways.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select, func
+
+import queries
+from benchmarks.common import make_engine, reset_schema, seed_board, timer, percentile
+from models.models import Board, BoardTable, TaskTable
+from pagination import paginate
+
+
+def counted_dashboard(user_id: int):
+    tables = select(func.count()).where(BoardTable.board_id == Board.id).scalar_subquery()
+    tasks = select(func.count()).select_from(TaskTable).join(
+        BoardTable, BoardTable.id == TaskTable.boardtable_id
+    ).where(BoardTable.board_id == Board.id).scalar_subquery()
+    return select(
+        Board.id, Board.board_name, Board.visibility, Board.background, tables.label('table_count'),
+        tasks.label('task_count'), Board.created_at
+    ).where(Board.id.in_(queries.accessible_board_ids(user_id)))
+
+
+async def main(args):
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+    try:
+        for _ in range(args.boards):
+            await seed_board(session_maker, args.tasks, args.tables)
+        for reconcile in (queries.reconcile_table_counts, queries.reconcile_board_counts):
+            async with session_maker() as session:
+                await reconcile(session, 0, args.boards * args.tables)
+                await session.commit()
+
+        columns = (Board.created_at, Board.id)
+        for name, query in (("counters", queries.dashboard_for_user(1)), ("COUNT(*)", counted_dashboard(1))):
+            samples = []
+            async with session_maker() as session:
+                for _ in range(args.repeat):
+                    with timer(samples):
+                        page = await paginate(session, query, columns, None, args.limit, descending=True)
+            assert page["items"][0]["task_count"] == args.tasks
+            print(f'{name:>8}: p50 {percentile(samples, 50) * 1000:8.2f} ms  '
+                  f'p95 {percentile(samples, 95) * 1000:8.2f} ms')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--boards', type=int, default=50)
+    parser.add_argument('--tables', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=20_000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
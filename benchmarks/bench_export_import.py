@@ -0,0 +1,94 @@
+"""Export a large board to NDJSON and import it back, reporting time and memory.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_export_import --tasks 2000000
+
+The export is written to a temporary file and the import reads it back in
+64 KiB chunks, the way the endpoints see a request or response body. Peak RSS
+growth is the interesting number: it should stay flat as ``--tasks`` grows.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import time
+
+from sqlalchemy import text
+
+import exports
+from benchmarks.common import make_engine, reset_schema
+
+SEED = [
+    "INSERT INTO board (board_name, user_id, visibility, created_at) VALUES ('export', 1, 'private', now())",
+    """INSERT INTO boardtable (title, board_id, position)
+       SELECT 'table ' || n, 1, lpad(n::text, 6, '0') FROM generate_series(1, :tables) AS n""",
+    """INSERT INTO tasktable (message, boardtable_id, position)
+       SELECT 'task number ' || n || ' with a message of typical length', (n - 1) % :tables + 1,
+              lpad(n::text, 10, '0')
+       FROM generate_series(1, :tasks) AS n""",
+    "ANALYZE",
+]
+READ_SIZE = 64 * 1024
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def read_chunks(path: str):
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_SIZE):
+            yield chunk
+
+
+async def main(args):
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+    async with session_maker() as session:
+        for statement in SEED:
+            await session.execute(text(statement), {"tables": args.tables, "tasks": args.tasks})
+        await session.commit()
+
+    fd, path = tempfile.mkstemp(suffix='.ndjson')
+    try:
+        rss = max_rss_mb()
+        started = time.perf_counter()
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            async with session_maker() as session:
+                async for chunk in exports.export_board(session, 1, args.chunk_size):
+                    out.write(chunk)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f'export  {elapsed:8.2f}s  {args.tasks / elapsed:>10.0f} tasks/s  {size:8.1f} MB  '
+              f'peak RSS +{max_rss_mb() - rss:.1f} MB')
+
+        rss = max_rss_mb()
+        started = time.perf_counter()
+        async with session_maker() as session:
+            board_id, tables, tasks = await exports.import_board(
+                session, 1, read_chunks(path), batch_size=args.batch_size
+            )
+            await session.commit()
+        elapsed = time.perf_counter() - started
+        print(f'import  {elapsed:8.2f}s  {args.tasks / elapsed:>10.0f} tasks/s  {"":>11}  '
+              f'peak RSS +{max_rss_mb() - rss:.1f} MB')
+
+        async with session_maker() as session:
+            copied = (await session.execute(text(
+                "SELECT count(*) FROM tasktable JOIN boardtable ON boardtable.id = tasktable.boardtable_id "
+                "WHERE boardtable.board_id = :board_id"
+            ), {"board_id": board_id})).scalar_one()
+        assert (tables, tasks, copied) == (args.tables, args.tasks, args.tasks), (tables, tasks, copied)
+        print(f'verified: board {board_id} has {tables} tables and {copied} tasks')
+    finally:
+        os.unlink(path)
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=2_000_000)
+    parser.add_argument('--tables', type=int, default=50)
+    parser.add_argument('--chunk-size', type=int, default=exports.EXPORT_CHUNK_SIZE)
+    parser.add_argument('--batch-size', type=int, default=exports.IMPORT_BATCH_SIZE)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,49 @@
+"""First-page vs deep-page latency of keyset and OFFSET pagination over a table's tasks.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_pagination
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from benchmarks.common import make_engine, reset_schema, seed_board, timer, percentile
+from models.models import TaskTable
+from pagination import encode_cursor, paginate
+from queries import tasks_for_table
+
+
+async def main(args):
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+    try:
+        _, (table_id,) = await seed_board(session_maker, args.tasks)
+
+        query = tasks_for_table(table_id, 1)
+        columns = (TaskTable.position, TaskTable.id)
+        for depth in (0, args.tasks // 2, args.tasks - args.limit):
+            keyset_samples, offset_samples = [], []
+            async with session_maker() as session:
+                cursor = None
+                if depth:
+                    key = (await session.execute(
+                        select(*columns).order_by(*columns).offset(depth - 1).limit(1)
+                    )).one()
+                    cursor = encode_cursor(key)
+                for _ in range(args.repeat):
+                    with timer(keyset_samples):
+                        await paginate(session, query, columns, cursor, args.limit)
+                    with timer(offset_samples):
+                        await session.execute(query.order_by(*columns).offset(depth).limit(args.limit))
+            print(f'row {depth:>8}: keyset p50 {percentile(keyset_samples, 50) * 1000:8.2f} ms  '
+                  f'offset p50 {percentile(offset_samples, 50) * 1000:8.2f} ms')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=500_000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+"""Cost of moving tasks inside a large column: rank keys vs. integer renumbering.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_reorder --tasks 50000
+"""
+import argparse
+import asyncio
+import random
+
+from sqlalchemy import select, update, func
+
+import queries
+from benchmarks.common import make_engine, reset_schema, seed_board, count_statements, timer, percentile
+from models.models import TaskTable
+from ranking import rank_between
+
+
+async def main(args):
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+    try:
+        _, (table_id,) = await seed_board(session_maker, args.tasks)
+        async with session_maker() as session:
+            ids = (await session.execute(select(TaskTable.id))).scalars().all()
+
+        rank_samples, touched = [], []
+        async with session_maker() as session:
+            for _ in range(args.moves):
+                task_id, anchor_id = random.sample(ids, 2)
+                with timer(rank_samples):
+                    with count_statements(engine) as statements:
+                        _, lower, upper = await queries.rank_slot(
+                            session, TaskTable.boardtable_id, anchor_id, task_id, before=True
+                        )
+                        result = await session.execute(
+                            update(TaskTable).where(TaskTable.id == task_id)
+                            .values(position=rank_between(lower, upper))
+                        )
+                        await session.commit()
+                touched.append(result.rowcount)
+            longest = (await session.execute(select(func.max(func.length(TaskTable.position))))).scalar()
+
+        # Baseline: dense integer positions, shifting every row after the target slot.
+        renumber_samples, shifted = [], []
+        async with session_maker() as session:
+            for _ in range(args.moves):
+                slot = random.randrange(args.tasks)
+                with timer(renumber_samples):
+                    result = await session.execute(
+                        update(TaskTable).where(TaskTable.boardtable_id == table_id, TaskTable.id >= slot)
+                        .values(message=TaskTable.message)
+                    )
+                    await session.commit()
+                shifted.append(result.rowcount)
+
+        async with session_maker() as session:
+            rebalance_samples = []
+            with timer(rebalance_samples):
+                await queries.rebalance(session, TaskTable.boardtable_id, table_id)
+                await session.commit()
+
+        print(f'rank move:     p50 {percentile(rank_samples, 50) * 1000:8.2f} ms  '
+              f'p95 {percentile(rank_samples, 95) * 1000:8.2f} ms  rows written/move {max(touched)}  '
+              f'statements/move {len(statements)}  longest key {longest}')
+        print(f'renumber move: p50 {percentile(renumber_samples, 50) * 1000:8.2f} ms  '
+              f'p95 {percentile(renumber_samples, 95) * 1000:8.2f} ms  rows written/move ~{sum(shifted) // len(shifted)}')
+        print(f'rebalance of {args.tasks} tasks: {rebalance_samples[0] * 1000:.1f} ms')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=50_000)
+    parser.add_argument('--moves', type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
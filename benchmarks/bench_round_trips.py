@@ -0,0 +1,81 @@
+"""SQL round trips per mutating endpoint (statements + COMMIT).
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_round_trips
+
+BASELINE holds the counts of the check-then-write handlers this replaced
+(SELECT for ownership, then the write, then COMMIT). Each mutation is now one
+statement, carrying its rank key and change-feed NOTIFY, plus the COMMIT.
+"""
+import asyncio
+
+import httpx
+from sqlalchemy import event, select
+
+import main
+from benchmarks.common import make_engine, reset_schema, seed_board, count_statements
+from database import get_async_session
+from models.models import TaskTable
+from utils import verify_token
+
+BASELINE = {
+    'add_board_user': 4,
+    'delete_board_user': 2,
+    'edit_board': 3,
+    'create_table_for_board': 4,
+    'update_table_title': 3,
+    'add_task': 3,
+    'update_task': 3,
+    'delete_task': 3,
+    'delete_table': 3,
+    'delete_board': 3,
+}
+
+
+async def main_():
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+
+    async def session_override():
+        async with session_maker() as session:
+            yield session
+
+    async def user_lookup(email):
+        return {"id": 2, "email": email}
+
+    main.app.dependency_overrides[get_async_session] = session_override
+    main.app.dependency_overrides[verify_token] = lambda: {"user_id": 1}
+    main.request_api_for_user_data = user_lookup
+
+    board_id, (table_id, empty_table_id) = await seed_board(session_maker, tasks=1, tables=2)
+    async with session_maker() as session:
+        task_id = (await session.execute(select(TaskTable.id))).scalar_one()
+
+    calls = [
+        ('add_board_user', 'POST', '/board-user/add', {"email": "a@b.c", "board_id": board_id}),
+        ('delete_board_user', 'DELETE', '/board-user/delete', {"user_id": 2, "board_id": board_id}),
+        ('edit_board', 'PATCH', '/edit-board', {"board_id": board_id, "new_board_name": "renamed"}),
+        ('create_table_for_board', 'POST', '/create-table-for-board', {"title": "t", "board_id": board_id}),
+        ('update_table_title', 'PATCH', '/update-table-title', {"table_id": table_id, "new_title": "t2"}),
+        ('add_task', 'POST', '/add-task-for-table', {"message": "m", "table_id": table_id}),
+        ('update_task', 'PATCH', '/update-task', {"task_id": task_id, "new_message": "m2"}),
+        ('delete_task', 'DELETE', '/delete-task', {"task_id": task_id}),
+        ('delete_table', 'DELETE', f'/delete-table{empty_table_id}', {}),
+        ('delete_board', 'DELETE', '/delete-board', {"board_id": board_id}),
+    ]
+
+    commits = []
+    event.listen(engine.sync_engine, 'commit', lambda conn: commits.append(1))
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        print(f'{"endpoint":<24}{"before":>8}{"after":>8}')
+        for name, method, url, params in calls:
+            commits.clear()
+            with count_statements(engine) as statements:
+                response = await client.request(method, url, params=params)
+            assert response.status_code == 200, (name, response.text)
+            print(f'{name:<24}{BASELINE[name]:>8}{len(statements) + len(commits):>8}')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main_())
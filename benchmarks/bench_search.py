@@ -0,0 +1,95 @@
+"""Latency of /search/tasks queries over a large task table.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_search --tasks 1000000
+
+Task messages are six words drawn from a vocabulary of a few common words and
+many rare ones. The searching user belongs to a tenth of the boards, so the
+access filter is part of every plan.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import text
+
+import queries
+from benchmarks.common import make_engine, reset_schema, timer, percentile
+from pagination import paginate
+
+COMMON = ['meeting', 'deploy', 'release', 'review', 'design', 'bug', 'fix', 'docs', 'client', 'sprint']
+RARE = [f'term{i}' for i in range(5000)]
+
+SEED = [
+    """INSERT INTO board (board_name, user_id, visibility, created_at)
+       SELECT 'board ' || n, n, 'private', now() FROM generate_series(1, :boards) AS n""",
+    """INSERT INTO boardusers (board_id, user_id)
+       SELECT n, 0 FROM generate_series(1, :boards, 10) AS n""",
+    """INSERT INTO boardtable (title, board_id, position)
+       SELECT 'table ' || n, (n - 1) / 10 + 1, lpad((n % 10 + 1)::text, 4, '0')
+       FROM generate_series(1, :boards * 10) AS n""",
+    """INSERT INTO tasktable (message, boardtable_id, position)
+       SELECT array_to_string(ARRAY(
+                  SELECT (CAST(:words AS text[]))[1 + floor(random() * (:vocabulary + n * 0))::int]
+                  FROM generate_series(1, 6)
+              ), ' '),
+              (n - 1) % (:boards * 10) + 1, lpad(n::text, 10, '0')
+       FROM generate_series(1, :tasks) AS n""",
+    "UPDATE tasktable SET message = message || ' zebra' WHERE id % 100000 = 7",
+    "ANALYZE",
+]
+
+SEARCHES = {
+    'common word': 'meeting',
+    'two words': 'deploy release',
+    'rare word': 'term42',
+    'very rare word': 'zebra',
+    'typo': 'relase',
+    'prefix': 'deplo',
+}
+
+
+async def main(args):
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+    # Weight the common words so they make up about half of all words.
+    words = COMMON * (len(RARE) // len(COMMON)) + RARE
+    try:
+        async with session_maker() as session:
+            for statement in SEED:
+                await session.execute(text(statement), {
+                    "boards": args.boards, "tasks": args.tasks, "words": words, "vocabulary": len(words)
+                })
+            await session.commit()
+
+        print(f'{"search":<16}{"page":>6}{"p50 ms":>10}{"p95 ms":>10}{"rows":>8}')
+        for name, term in SEARCHES.items():
+            query, columns = queries.search_tasks(0, term)
+            first, deep, rows = [], [], 0
+            async with session_maker() as session:
+                for _ in range(args.repeat):
+                    with timer(first):
+                        page = await paginate(session, query, columns, None, args.limit, descending=True)
+                    rows = len(page["items"])
+                    cursor = page["next_cursor"]
+                    for _ in range(args.pages - 1):
+                        if cursor is None:
+                            break
+                        with timer(deep):
+                            page = await paginate(session, query, columns, cursor, args.limit, descending=True)
+                        cursor = page["next_cursor"]
+            print(f'{name:<16}{"1":>6}{percentile(first, 50) * 1000:>10.2f}{percentile(first, 95) * 1000:>10.2f}'
+                  f'{rows:>8}')
+            if deep:
+                print(f'{"":<16}{f"2-{args.pages}":>6}{percentile(deep, 50) * 1000:>10.2f}'
+                      f'{percentile(deep, 95) * 1000:>10.2f}')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=1_000_000)
+    parser.add_argument('--boards', type=int, default=1_000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
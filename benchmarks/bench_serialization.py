@@ -0,0 +1,78 @@
+"""Serialization cost of GET /boards/{id} snapshots, without the database round trip.
+
+    python -m benchmarks.bench_serialization --sizes 1000 10000 100000 1000000
+
+Rows come from an in-memory SQLite query so they are real SQLAlchemy rows,
+shaped like ``queries.get_board_snapshot`` returns them. Three paths are
+compared for each size:
+
+    default   plain dicts through jsonable_encoder + JSONResponse (the old path)
+    pydantic  BoardSnapshot validation and dump, as response_model does it
+    orjson    snapshot_content + ORJSONResponse (what the endpoint does now)
+"""
+import argparse
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import create_engine, text
+
+from benchmarks.common import timer, percentile
+from schemas import BoardSnapshot, snapshot_content
+
+ROWS = {
+    "board": "SELECT 1 AS id, 'bench' AS board_name, 1 AS user_id, 'Private' AS visibility, "
+             "'uploads/ab/cd/abcd.png' AS background, '2026-10-18T12:00:00.123456' AS created_at",
+    "tables": """WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :tables)
+                 SELECT i AS id, 'table ' || i AS title FROM n""",
+    "tasks": """WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :tasks)
+                SELECT i AS id, 'task number ' || i || ' with a message of typical length' AS message,
+                       (i - 1) % :tables + 1 AS boardtable_id
+                FROM n ORDER BY boardtable_id, id""",
+}
+
+
+def default_path(board, tables, tasks):
+    return JSONResponse(jsonable_encoder(snapshot_content(board, tables, tasks))).body
+
+
+def pydantic_path(board, tables, tasks):
+    snapshot = BoardSnapshot.model_validate(snapshot_content(board, tables, tasks))
+    return ORJSONResponse(snapshot.model_dump(mode='json')).body
+
+
+def orjson_path(board, tables, tasks):
+    return ORJSONResponse(snapshot_content(board, tables, tasks)).body
+
+
+PATHS = {"default": default_path, "pydantic": pydantic_path, "orjson": orjson_path}
+
+
+def main(args):
+    engine = create_engine('sqlite://')
+    print(f'{"tasks":>9}{"path":>10}{"p50 ms":>10}{"p95 ms":>10}{"MB":>8}{"MB/s":>9}')
+    with engine.connect() as conn:
+        for size in args.sizes:
+            params = {"tables": args.tables, "tasks": size}
+            board = conn.execute(text(ROWS["board"])).first()
+            tables = conn.execute(text(ROWS["tables"]), params).all()
+            tasks = conn.execute(text(ROWS["tasks"]), params).all()
+            bodies = set()
+            for name, path in PATHS.items():
+                samples = []
+                for _ in range(args.repeat):
+                    with timer(samples):
+                        body = path(board, tables, tasks)
+                bodies.add(body.replace(b' ', b''))
+                megabytes = len(body) / 1024 / 1024
+                print(f'{size:>9}{name:>10}{percentile(samples, 50) * 1000:>10.2f}'
+                      f'{percentile(samples, 95) * 1000:>10.2f}{megabytes:>8.1f}'
+                      f'{megabytes / percentile(samples, 50):>9.0f}')
+            assert len(bodies) == 1, 'serializers disagree'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--tables', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=10)
+    main(parser.parse_args())
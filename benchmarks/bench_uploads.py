@@ -0,0 +1,88 @@
+"""Peak memory of concurrent board-background uploads.
+
+    python -m benchmarks.bench_uploads --uploads 100 --size-mb 50
+
+``streaming`` runs storage.receive_upload (chunked, hashed, size-capped), so
+its peak is about one UPLOAD_CHUNK_SIZE per concurrent upload whatever the file
+size; ``legacy`` reads each upload fully into memory the way create_board used to.
+Files go to a temporary UPLOAD_DIR that is removed afterwards.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import aiofiles
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+
+
+class FakeUpload:
+    """Produces ``size`` bytes of PNG-looking data without holding them."""
+
+    def __init__(self, index: int, size: int):
+        self.filename = f'background-{index}.png'
+        self.remaining = size
+        self.block = PNG_MAGIC + bytes([index % 256]) * (1024 * 1024 - len(PNG_MAGIC))
+
+    async def read(self, size: int = -1):
+        if size < 0:
+            size = self.remaining
+        size = min(size, self.remaining)
+        self.remaining -= size
+        await asyncio.sleep(0)
+        if size <= len(self.block):
+            return self.block[:size]
+        return (self.block * (size // len(self.block) + 1))[:size]
+
+
+async def legacy_receive(upload, upload_dir):
+    out_file = os.path.join(upload_dir, upload.filename)
+    async with aiofiles.open(out_file, 'wb') as f:
+        content = await upload.read()
+        await f.write(content)
+
+
+async def run(name, receive, uploads, size):
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(receive(FakeUpload(i, size)) for i in range(uploads)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:>9}: {uploads} x {size >> 20} MB in {elapsed:6.2f} s  '
+          f'peak Python allocations {peak >> 20:6d} MB  '
+          f'max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss >> 10} MB')
+
+
+async def main(args):
+    upload_dir = tempfile.mkdtemp(prefix='bench-uploads-')
+    os.environ['UPLOAD_DIR'] = upload_dir
+    from storage import receive_upload, publish_upload
+
+    async def streaming(upload):
+        async def chunks():
+            while chunk := await upload.read(1024 * 1024):
+                yield chunk
+
+        await publish_upload(await receive_upload(chunks(), max_size=args.size_mb << 21))
+
+    try:
+        await run('streaming', streaming, args.uploads, args.size_mb << 20)
+        if args.legacy_uploads:
+            await run('legacy', lambda upload: legacy_receive(upload, upload_dir), args.legacy_uploads,
+                      args.size_mb << 20)
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--uploads', type=int, default=100)
+    parser.add_argument('--size-mb', type=int, default=50)
+    parser.add_argument('--legacy-uploads', type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""Event-loop stall while resolving board invitees against a stub auth service.
+
+    python -m benchmarks.bench_user_lookup --requests 200 --latency 0.02
+
+``legacy`` reproduces the old blocking ``requests.get`` call made from the async
+handler; ``client`` uses the pooled, cached ``UserDirectoryClient``.
+"""
+import argparse
+import asyncio
+import time
+
+import requests
+
+from benchmarks.stub_auth import start_stub_auth
+from user_client import UserDirectoryClient
+
+
+async def probe(stop: asyncio.Event, lags: list, interval=0.001):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - started - interval))
+
+
+async def run(name, lookup, emails):
+    stop, lags = asyncio.Event(), []
+    probe_task = asyncio.create_task(probe(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(lookup(email) for email in emails))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    print(f'{name:>8}: total {elapsed * 1000:8.1f} ms  '
+          f'max stall {max(lags, default=0) * 1000:7.1f} ms  '
+          f'summed stall {sum(lags) * 1000:8.1f} ms')
+
+
+async def main(args):
+    server, url = start_stub_auth(latency=args.latency)
+    emails = [f'user{i % args.distinct}@example.com' for i in range(args.requests)]
+
+    async def legacy(email):
+        response = requests.get(f'{url}/auth/get-user-data{email}', json={"email": email})
+        response.raise_for_status()
+        return response.json()
+
+    client = UserDirectoryClient(base_url=url)
+    try:
+        await run('legacy', legacy, emails)
+        await run('client', client.get_user, emails)
+        await run('warm', client.get_user, emails)
+    finally:
+        await client.aclose()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--distinct', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.02)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,46 @@
+"""Per-request cost of bearer-token verification.
+
+    python -m benchmarks.bench_verify_token --requests 200000 --tokens 1000
+"""
+import argparse
+import os
+import time
+
+import jwt
+from fastapi.security import HTTPAuthorizationCredentials
+
+from settings import SECRET, JWT_ALGORITHM
+from utils import verify_token
+
+
+def legacy_verify_token(credentials):
+    return jwt.decode(credentials.credentials, os.environ.get('SECRET'), algorithms=['HS256'])
+
+
+def run(name, verify, credentials, requests):
+    started = time.perf_counter()
+    for i in range(requests):
+        verify(credentials[i % len(credentials)])
+    elapsed = time.perf_counter() - started
+    print(f'{name:>8}: {elapsed / requests * 1e6:7.2f} us/request  ~{requests / elapsed:10.0f} req/s per core')
+
+
+def main(args):
+    os.environ.setdefault('SECRET', SECRET)
+    exp = int(time.time()) + 3600
+    credentials = [
+        HTTPAuthorizationCredentials(
+            scheme='Bearer',
+            credentials=jwt.encode({"user_id": i, "exp": exp}, SECRET, algorithm=JWT_ALGORITHM),
+        )
+        for i in range(args.tokens)
+    ]
+    run('legacy', legacy_verify_token, credentials, args.requests)
+    run('cached', verify_token, credentials, args.requests)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200_000)
+    parser.add_argument('--tokens', type=int, default=1_000)
+    main(parser.parse_args())
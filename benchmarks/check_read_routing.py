@@ -0,0 +1,81 @@
+"""Check that reads go to the replica and read-your-writes go to the primary.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://.../primary \
+    BENCH_REPLICA_URL=postgresql+asyncpg://.../replica python -m benchmarks.check_read_routing
+
+The two databases stand in for a primary and its replica: both are seeded
+with the same board, whose table has a different title in each, so each
+response shows which one served it. Reads go to the board's table list:
+``GET /boards/{id}`` answers from the snapshot cache and would hide the
+routing. Exits with status 1 when a request was routed to the wrong one.
+"""
+import asyncio
+import os
+import sys
+
+import httpx
+from fastapi import Request
+from sqlalchemy import update
+
+import database
+import main
+from benchmarks.common import make_engine, reset_schema, seed_board
+from models.models import Board, BoardTable, TrelloChoiceEnum
+from utils import verify_token
+
+BENCH_REPLICA_URL = os.getenv('BENCH_REPLICA_URL')
+WINDOW = 0.5
+
+
+def token_from_header(request: Request):
+    return {"user_id": int(request.headers['x-user'])}
+
+
+async def main_():
+    primary_engine, primary = make_engine()
+    replica_engine, replica = make_engine(BENCH_REPLICA_URL)
+    for engine, session_maker, name in ((primary_engine, primary, 'primary'), (replica_engine, replica, 'replica')):
+        await reset_schema(engine)
+        board_id, (table_id,) = await seed_board(session_maker)
+        async with session_maker() as session:
+            await session.execute(update(Board).values(visibility=TrelloChoiceEnum.public))
+            await session.execute(update(BoardTable).values(title=name))
+            await session.commit()
+
+    database.async_session_maker = primary
+    database.router.primary = primary
+    database.router.replica = replica
+    database.router.recent_writers.ttl = WINDOW
+    database.router.window = WINDOW
+    main.app.dependency_overrides[verify_token] = token_from_header
+
+    failures = 0
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://check') as client:
+        async def expect(label, user_id, name):
+            nonlocal failures
+            response = await client.get(f'/boards/{board_id}/tables', headers={"x-user": str(user_id)})
+            served = response.json()['items'][0]['title']
+            ok = served == ('written' if name == 'primary' else name)
+            failures += not ok
+            print(f'{"ok  " if ok else "FAIL"} {label}: served by {served}, expected {name}')
+
+        await expect('read before any write', 1, 'replica')
+        await client.patch(
+            '/update-table-title', params={"table_id": table_id, "new_title": "written"}, headers={"x-user": "1"}
+        )
+        await expect('read right after own write', 1, 'primary')
+        # Another API replica only has the client's cookie to go by.
+        database.router.recent_writers.clear()
+        await expect('read right after own write, other replica', 1, 'primary')
+        await expect('read by another user', 2, 'replica')
+        await asyncio.sleep(WINDOW * 1.5)
+        await expect('read after the window', 1, 'replica')
+
+    await primary_engine.dispose()
+    await replica_engine.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main_()))
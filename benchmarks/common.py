@@ -0,0 +1,75 @@
+import os
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import DATABASE_URL
+from models.models import metadata, Board, BoardTable, TaskTable, TrelloChoiceEnum
+from ranking import spread
+
+# Point this at a scratch database: the schema is dropped and recreated.
+BENCH_DATABASE_URL = os.getenv('BENCH_DATABASE_URL', DATABASE_URL)
+
+
+def make_engine(url: str = BENCH_DATABASE_URL):
+    engine = create_async_engine(url)
+    return engine, sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def reset_schema(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        await conn.run_sync(metadata.drop_all)
+        await conn.run_sync(metadata.create_all)
+
+
+@contextmanager
+def count_statements(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def timer(samples: list):
+    started = time.perf_counter()
+    yield
+    samples.append(time.perf_counter() - started)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def seed_board(session_maker, tasks: int = 0, tables: int = 1, user_id: int = 1, chunk: int = 10_000):
+    """Create one board with ``tables`` tables and ``tasks`` tasks spread across them."""
+    async with session_maker() as session:
+        board_id = (await session.execute(insert(Board).values(
+            board_name='bench', user_id=user_id, visibility=TrelloChoiceEnum.private
+        ).returning(Board.id))).scalar_one()
+        table_ids = (await session.execute(
+            insert(BoardTable).returning(BoardTable.id, sort_by_parameter_order=True),
+            [{"title": f'table {i}', "board_id": board_id, "position": position}
+             for i, position in enumerate(spread(tables))]
+        )).scalars().all()
+        positions = spread(tasks // tables + 1)
+        for start in range(0, tasks, chunk):
+            await session.execute(insert(TaskTable), [
+                {"message": f'task {i}', "boardtable_id": table_ids[i % tables], "position": positions[i // tables]}
+                for i in range(start, min(tasks, start + chunk))
+            ])
+        await session.commit()
+        return board_id, table_ids
@@ -0,0 +1,145 @@
+"""Fail if a hot-path query plans a sequential scan on a large seeded dataset.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.explain_hot_paths
+
+Each data-access function from queries.py/authz.py is run against a session
+that EXPLAINs the statements instead of executing them. Exits with status 1
+and prints the offending plan when any of the board tables is seq-scanned.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from sqlalchemy import text
+
+import queries
+from authz import BoardAuthCache
+from benchmarks.common import make_engine, reset_schema
+from models.models import Board, BoardTable, TaskTable
+from schemas import TaskCreate, TaskMove
+
+HOT_TABLES = {'board', 'boardusers', 'boardtable', 'tasktable'}
+
+SEED = [
+    """INSERT INTO board (board_name, user_id, visibility, created_at)
+       SELECT 'board ' || n, n % :users, 'private', now() - n * interval '1 second'
+       FROM generate_series(1, :boards) AS n""",
+    """INSERT INTO boardusers (board_id, user_id)
+       SELECT b, (b * 7 + m) % :users FROM generate_series(1, :boards) AS b, generate_series(1, 3) AS m
+       ON CONFLICT DO NOTHING""",
+    """INSERT INTO boardtable (title, board_id, position)
+       SELECT 'table ' || n, (n - 1) / 5 + 1, rtrim(lpad((n % 5 + 1)::text, 4, '0'), '0')
+       FROM generate_series(1, :boards * 5) AS n""",
+    """INSERT INTO tasktable (message, boardtable_id, position)
+       SELECT 'task ' || n, (n - 1) / :tasks_per_table + 1, rtrim(lpad(n::text, 10, '0'), '0')
+       FROM generate_series(1, :boards * 5 * :tasks_per_table) AS n""",
+    "ANALYZE",
+]
+
+
+class _Result:
+    def scalar(self):
+        return None
+
+    def first(self):
+        return None
+
+    def all(self):
+        return []
+
+    def scalars(self):
+        return self
+
+    def __iter__(self):
+        return iter(())
+
+
+class ExplainSession:
+    """Stands in for AsyncSession and EXPLAINs every statement it is given."""
+
+    def __init__(self, session, dialect):
+        self.session = session
+        self.dialect = dialect
+        self.plans = []
+
+    async def execute(self, statement, params=None):
+        if params:
+            statement = statement.values(params)
+        sql = str(statement.compile(dialect=self.dialect, compile_kwargs={"literal_binds": True}))
+        result = await self.session.execute(text(f'EXPLAIN (FORMAT JSON) {sql}'))
+        plan = result.scalar()
+        self.plans.append((sql, plan if isinstance(plan, list) else json.loads(plan)))
+        return _Result()
+
+
+def seq_scans(node):
+    if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in HOT_TABLES:
+        yield node['Relation Name']
+    for child in node.get('Plans', ()):
+        yield from seq_scans(child)
+
+
+def hot_paths(user_id, board_id, table_id, task_id):
+    return {
+        'list boards': lambda s: s.execute(queries.boards_for_user(user_id).order_by(
+            Board.created_at.desc(), Board.id.desc()).limit(50)),
+        'list tables': lambda s: s.execute(queries.tables_for_board(board_id, user_id).order_by(
+            BoardTable.position, BoardTable.id).limit(50)),
+        'list tasks': lambda s: s.execute(queries.tasks_for_table(table_id, user_id).order_by(
+            TaskTable.position, TaskTable.id).limit(50)),
+        'board role': lambda s: BoardAuthCache().role(s, user_id, board_id),
+        'table board': lambda s: BoardAuthCache().table_board(s, table_id),
+        'add member': lambda s: queries.add_board_member(s, board_id, user_id, user_id + 1),
+        'remove member': lambda s: queries.remove_board_member(s, board_id, user_id, user_id + 1),
+        'edit board': lambda s: queries.update_board(s, board_id, user_id, board_name='x'),
+        'create table': lambda s: queries.create_table(s, board_id, user_id, 'x'),
+        'update table': lambda s: queries.update_table(s, table_id, user_id, title='x'),
+        'add task': lambda s: queries.create_task(s, table_id, user_id, 'x'),
+        'update task': lambda s: queries.update_task(s, task_id, user_id, message='x', boardtable_id=table_id),
+        'delete task': lambda s: queries.delete_task(s, task_id, user_id),
+        'batch create': lambda s: queries.create_tasks(s, user_id, [TaskCreate(table_id=table_id, message='x')]),
+        'batch move': lambda s: queries.move_tasks(s, user_id, [TaskMove(task_id=task_id, table_id=table_id)]),
+        'move slot': lambda s: queries.rank_slot(s, TaskTable.boardtable_id, task_id, task_id + 1, before=True),
+        'snapshot': lambda s: queries.get_board_snapshot(s, board_id, user_id),
+    }
+
+
+async def main(args):
+    engine, session_maker = make_engine()
+    await reset_schema(engine)
+    failures = 0
+    try:
+        async with session_maker() as session:
+            for statement in SEED:
+                await session.execute(text(statement), {
+                    "boards": args.boards, "users": args.users, "tasks_per_table": args.tasks_per_table
+                })
+            await session.commit()
+
+        user_id, board_id = 42, 42 + args.users
+        table_id = board_id * 5 - 2
+        task_id = table_id * args.tasks_per_table - 1
+        for name, run in hot_paths(user_id, board_id, table_id, task_id).items():
+            async with session_maker() as session:
+                explain = ExplainSession(session, engine.dialect)
+                await run(explain)
+                await session.rollback()
+            for sql, plan in explain.plans:
+                scanned = sorted(set(seq_scans(plan[0]['Plan'])))
+                if scanned:
+                    failures += 1
+                    print(f'FAIL {name}: seq scan on {", ".join(scanned)}\n{sql}\n{json.dumps(plan, indent=2)}')
+            if not any(seq_scans(plan[0]['Plan']) for _, plan in explain.plans):
+                print(f'ok   {name}')
+    finally:
+        await engine.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--boards', type=int, default=20_000)
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--tasks-per-table', type=int, default=20)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,243 @@
+"""Replay a load-test trace against the app and report latency per endpoint.
+
+    python -m benchmarks.loadtest_trace --out benchmarks/traces/default.jsonl
+    python -m benchmarks.loadtest benchmarks/traces/default.jsonl --concurrency 32 --save-baseline main
+    python -m benchmarks.loadtest benchmarks/traces/default.jsonl --concurrency 32 --compare main
+
+The app's own database (DB_* settings) is reset and seeded from the trace, so
+point it at a scratch database. Requests go through ``httpx.ASGITransport`` by
+default; ``--uvicorn`` starts ``uvicorn main:app`` in a subprocess and replays
+over HTTP instead. Board invites resolve against the stub auth service.
+
+Baselines are stored as JSON under benchmarks/baselines/. ``--compare`` exits
+with status 1 when an endpoint's p95 or throughput is worse than the baseline
+by more than ``--tolerance``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import jwt
+from sqlalchemy import insert, text
+
+from benchmarks.common import make_engine, reset_schema, percentile
+from benchmarks.stub_auth import start_stub_auth
+from database import DATABASE_URL
+from models.models import Board, BoardUsers, BoardTable, TaskTable, TrelloChoiceEnum
+from ranking import spread
+from settings import SECRET, JWT_ALGORITHM
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+SEED_CHUNK = 5000
+
+
+def read_trace(path: str):
+    seeds, requests = defaultdict(list), []
+    with open(path) as trace:
+        for line in trace:
+            item = json.loads(line)
+            if 'seed' in item:
+                seeds[item.pop('seed')].append(item)
+            else:
+                requests.append(item)
+    return seeds, requests
+
+
+async def seed_database(seeds: dict):
+    engine, session_maker = make_engine(DATABASE_URL)
+    await reset_schema(engine)
+    tasks_by_table = defaultdict(list)
+    for task in seeds['task']:
+        tasks_by_table[task['table_id']].append(task)
+    tables_by_board = defaultdict(list)
+    for table in seeds['table']:
+        tables_by_board[table['board_id']].append(table)
+
+    rows = {
+        Board: [{"id": board['id'], "board_name": f"board {board['id']}", "user_id": board['user_id'],
+                 "visibility": TrelloChoiceEnum[board['visibility']]} for board in seeds['board']],
+        BoardUsers: [{"board_id": member['board_id'], "user_id": member['user_id']} for member in seeds['member']],
+        BoardTable: [
+            {"id": table['id'], "title": f"table {table['id']}", "board_id": table['board_id'], "position": position}
+            for tables in tables_by_board.values() for table, position in zip(tables, spread(len(tables)))
+        ],
+        TaskTable: [
+            {"id": task['id'], "message": f"task {task['id']}", "boardtable_id": task['table_id'],
+             "position": position}
+            for tasks in tasks_by_table.values() for task, position in zip(tasks, spread(len(tasks)))
+        ],
+    }
+    async with session_maker() as session:
+        for model, values in rows.items():
+            for start in range(0, len(values), SEED_CHUNK):
+                await session.execute(insert(model), values[start:start + SEED_CHUNK])
+            table = model.__tablename__
+            await session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false) "
+                f"FROM {table}"
+            ))
+        await session.execute(text('ANALYZE'))
+        await session.commit()
+    await engine.dispose()
+
+
+def tokens_for(requests) -> dict:
+    expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    return {
+        user_id: jwt.encode({"user_id": user_id, "exp": expires}, SECRET, algorithm=JWT_ALGORITHM)
+        for user_id in {request['user_id'] for request in requests}
+    }
+
+
+async def replay(client: httpx.AsyncClient, requests, tokens: dict, concurrency: int):
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    pending = iter(requests)
+
+    async def worker():
+        for request in pending:
+            started = time.perf_counter()
+            response = await client.request(
+                request['method'], request['path'], params=request['params'], json=request.get('json'),
+                headers={"Authorization": f"Bearer {tokens[request['user_id']]}"},
+            )
+            samples[request['op']].append(time.perf_counter() - started)
+            if response.status_code >= 400 or response.json().get('success') is False:
+                errors[request['op']] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors, time.perf_counter() - started
+
+
+def summarize(samples: dict, errors: dict, elapsed: float) -> dict:
+    summary = {}
+    everything = [sample for op_samples in samples.values() for sample in op_samples]
+    for op, op_samples in sorted(samples.items()) + [('TOTAL', everything)]:
+        summary[op] = {
+            "count": len(op_samples),
+            "errors": errors.get(op, 0) if op != 'TOTAL' else sum(errors.values()),
+            "p50": percentile(op_samples, 50),
+            "p95": percentile(op_samples, 95),
+            "p99": percentile(op_samples, 99),
+            "rps": len(op_samples) / elapsed,
+        }
+    return summary
+
+
+def print_summary(summary: dict, baseline: dict = None):
+    print(f'{"endpoint":<20}{"count":>8}{"errors":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"req/s":>10}'
+          + (f'{"p95 Δ":>10}{"req/s Δ":>10}' if baseline else ''))
+    for op, row in summary.items():
+        line = (f'{op:<20}{row["count"]:>8}{row["errors"]:>8}{row["p50"] * 1000:>10.2f}'
+                f'{row["p95"] * 1000:>10.2f}{row["p99"] * 1000:>10.2f}{row["rps"]:>10.1f}')
+        if baseline and op in baseline:
+            before = baseline[op]
+            line += f'{change(before["p95"], row["p95"]):>+10.1%}{change(before["rps"], row["rps"]):>+10.1%}'
+        print(line)
+
+
+def change(before: float, after: float) -> float:
+    return (after - before) / before if before else 0.0
+
+
+def regressions(summary: dict, baseline: dict, tolerance: float):
+    for op, row in summary.items():
+        before = baseline.get(op)
+        if before is None:
+            continue
+        if change(before['p95'], row['p95']) > tolerance:
+            yield f'{op}: p95 {before["p95"] * 1000:.2f} ms -> {row["p95"] * 1000:.2f} ms'
+        if -change(before['rps'], row['rps']) > tolerance:
+            yield f'{op}: throughput {before["rps"]:.1f} -> {row["rps"]:.1f} req/s'
+
+
+async def run(args, requests, tokens):
+    if args.uvicorn:
+        env = {**os.environ, "AUTH_SERVICE_URL": args.auth_url}
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(args.port), '--log-level', 'warning',
+             '--workers', str(args.workers)],
+            env=env,
+        )
+        base_url = f'http://127.0.0.1:{args.port}'
+        try:
+            async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+                for _ in range(100):
+                    try:
+                        await client.get('/pool-stats')
+                        break
+                    except httpx.TransportError:
+                        await asyncio.sleep(0.1)
+                return await replay(client, requests, tokens, args.concurrency)
+        finally:
+            server.terminate()
+            server.wait()
+
+    import main
+    from user_client import user_directory
+
+    user_directory.base_url = args.auth_url
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://loadtest', timeout=60) as client:
+            return await replay(client, requests, tokens, args.concurrency)
+
+
+async def main_(args):
+    seeds, requests = read_trace(args.trace)
+    requests = requests[:args.limit] if args.limit else requests
+    await seed_database(seeds)
+    auth_server, args.auth_url = start_stub_auth(latency=args.auth_latency)
+    try:
+        samples, errors, elapsed = await run(args, requests, tokens_for(requests))
+    finally:
+        auth_server.shutdown()
+
+    summary = summarize(samples, errors, elapsed)
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f'{args.compare}.json')) as f:
+            baseline = json.load(f)['endpoints']
+    print(f'{len(requests)} requests in {elapsed:.1f}s at concurrency {args.concurrency} '
+          f'({"uvicorn" if args.uvicorn else "in-process"})')
+    print_summary(summary, baseline)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(os.path.join(BASELINE_DIR, f'{args.save_baseline}.json'), 'w') as f:
+            json.dump({
+                "trace": os.path.basename(args.trace),
+                "requests": len(requests),
+                "concurrency": args.concurrency,
+                "mode": "uvicorn" if args.uvicorn else "in-process",
+                "endpoints": summary,
+            }, f, indent=2)
+    if baseline is not None:
+        found = list(regressions(summary, baseline, args.tolerance))
+        for regression in found:
+            print(f'REGRESSION {regression}')
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('trace')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--limit', type=int, default=0, help='replay only the first N requests')
+    parser.add_argument('--uvicorn', action='store_true', help='replay over HTTP against uvicorn main:app')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--auth-latency', type=float, default=0.01)
+    parser.add_argument('--save-baseline', metavar='NAME')
+    parser.add_argument('--compare', metavar='NAME')
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    sys.exit(asyncio.run(main_(parser.parse_args())))
@@ -0,0 +1,182 @@
+"""Generate a load-test trace: seed rows followed by HTTP requests, one JSON object per line.
+
+    python -m benchmarks.loadtest_trace --requests 20000 --out benchmarks/traces/default.jsonl
+
+Board popularity and user activity follow a Zipf distribution, so a few hot
+boards take most of the traffic the way they do in production. Seed lines carry
+explicit ids; request lines only reference seeded rows, so a replay against a
+freshly seeded database is deterministic regardless of concurrency.
+
+    {"seed": "board", "id": 1, "user_id": 4, "visibility": "public"}
+    {"op": "get_board", "user_id": 4, "method": "GET", "path": "/boards/1", "params": {}}
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+
+# op -> relative weight in the request mix
+MIX = {
+    'get_board': 30,
+    'list_boards': 10,
+    'list_tables': 5,
+    'list_tasks': 15,
+    'add_task': 12,
+    'update_task': 8,
+    'move_task': 6,
+    'delete_task': 3,
+    'batch_tasks': 2,
+    'create_table': 2,
+    'update_table_title': 2,
+    'add_board_user': 2,
+    'edit_board': 1,
+}
+
+
+def zipf_weights(n: int, s: float):
+    return list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+
+class TraceBuilder:
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.args = args
+        self.boards = {}
+        self.tables = {}
+        self.tasks = {}
+        self.user_weights = zipf_weights(args.users, args.skew)
+        self.board_weights = zipf_weights(args.boards, args.skew)
+
+    def seed(self):
+        args, rng = self.args, self.rng
+        table_ids, task_ids = itertools.count(1), itertools.count(1)
+        for board_id in range(1, args.boards + 1):
+            owner = rng.choices(range(1, args.users + 1), cum_weights=self.user_weights)[0]
+            members = set(rng.sample(range(1, args.users + 1), args.members)) - {owner}
+            visibility = 'public' if rng.random() < args.public else 'private'
+            self.boards[board_id] = {"owner": owner, "members": sorted(members), "tables": []}
+            yield {"seed": "board", "id": board_id, "user_id": owner, "visibility": visibility}
+            for user_id in sorted(members):
+                yield {"seed": "member", "board_id": board_id, "user_id": user_id}
+            for _ in range(args.tables):
+                table_id = next(table_ids)
+                self.boards[board_id]["tables"].append(table_id)
+                self.tables[table_id] = []
+                yield {"seed": "table", "id": table_id, "board_id": board_id}
+                for _ in range(rng.randint(0, 2 * args.tasks)):
+                    task_id = next(task_ids)
+                    self.tables[table_id].append(task_id)
+                    self.tasks[task_id] = table_id
+                    yield {"seed": "task", "id": task_id, "board_id": board_id, "table_id": table_id}
+
+    def requests(self):
+        ops = list(MIX)
+        weights = list(itertools.accumulate(MIX.values()))
+        for _ in range(self.args.requests):
+            board_id = self.rng.choices(range(1, self.args.boards + 1), cum_weights=self.board_weights)[0]
+            op = self.rng.choices(ops, cum_weights=weights)[0]
+            request = getattr(self, op)(board_id, self.boards[board_id])
+            if request is not None:
+                method, path, params = request[:3]
+                line = {"op": op, "user_id": self.writer(board_id), "method": method, "path": path, "params": params}
+                if len(request) > 3:
+                    line["json"] = request[3]
+                yield line
+
+    def writer(self, board_id):
+        board = self.boards[board_id]
+        return self.rng.choice([board["owner"], board["owner"], *board["members"]])
+
+    def pick_table(self, board):
+        return self.rng.choice(board["tables"]) if board["tables"] else None
+
+    def pick_task(self, board):
+        tables = [table_id for table_id in board["tables"] if self.tables[table_id]]
+        if not tables:
+            return None
+        return self.rng.choice(self.tables[self.rng.choice(tables)])
+
+    def get_board(self, board_id, board):
+        return 'GET', f'/boards/{board_id}', {}
+
+    def list_boards(self, board_id, board):
+        return 'GET', '/boards', {"limit": 50}
+
+    def list_tables(self, board_id, board):
+        return 'GET', f'/boards/{board_id}/tables', {}
+
+    def list_tasks(self, board_id, board):
+        table_id = self.pick_table(board)
+        return table_id and ('GET', f'/tables/{table_id}/tasks', {"limit": 50})
+
+    def add_task(self, board_id, board):
+        table_id = self.pick_table(board)
+        return table_id and ('POST', '/add-task-for-table', {"table_id": table_id, "message": "load test"})
+
+    def update_task(self, board_id, board):
+        task_id = self.pick_task(board)
+        return task_id and ('PATCH', '/update-task', {"task_id": task_id, "new_message": "edited"})
+
+    def move_task(self, board_id, board):
+        task_id = self.pick_task(board)
+        if task_id is None:
+            return None
+        table_id = self.pick_table(board)
+        self.tables[self.tasks[task_id]].remove(task_id)
+        self.tables[table_id].append(task_id)
+        self.tasks[task_id] = table_id
+        return 'POST', f'/tasks/{task_id}/move', {"table_id": table_id}
+
+    def delete_task(self, board_id, board):
+        task_id = self.pick_task(board)
+        if task_id is None:
+            return None
+        self.tables[self.tasks.pop(task_id)].remove(task_id)
+        return 'DELETE', '/delete-task', {"task_id": task_id}
+
+    def batch_tasks(self, board_id, board):
+        table_id = self.pick_table(board)
+        if table_id is None:
+            return None
+        create = [{"table_id": table_id, "message": f"batch {i}"} for i in range(self.rng.randint(5, 50))]
+        return 'POST', '/tasks/batch', {}, {"create": create, "move": [], "delete": []}
+
+    def create_table(self, board_id, board):
+        return 'POST', '/create-table-for-board', {"board_id": board_id, "title": "load test"}
+
+    def update_table_title(self, board_id, board):
+        table_id = self.pick_table(board)
+        return table_id and ('PATCH', '/update-table-title', {"table_id": table_id, "new_title": "renamed"})
+
+    def add_board_user(self, board_id, board):
+        email = f'user{self.rng.randrange(self.args.users * 10)}@loadtest.local'
+        return 'POST', '/board-user/add', {"board_id": board_id, "email": email}
+
+    def edit_board(self, board_id, board):
+        return 'PATCH', '/edit-board', {"board_id": board_id, "new_board_name": f"board {board_id}"}
+
+
+def main(args):
+    builder = TraceBuilder(args)
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w') as trace:
+        for line in itertools.chain(builder.seed(), builder.requests()):
+            trace.write(json.dumps(line, separators=(',', ':')) + '\n')
+    print(f'wrote {args.out}: {args.boards} boards, {len(builder.tables)} tables, '
+          f'{sum(map(len, builder.tables.values()))} live tasks, {args.requests} requests')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default='benchmarks/traces/default.jsonl')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--boards', type=int, default=200)
+    parser.add_argument('--tables', type=int, default=5, help='tables per board')
+    parser.add_argument('--tasks', type=int, default=20, help='mean tasks per table')
+    parser.add_argument('--members', type=int, default=3, help='members per board')
+    parser.add_argument('--public', type=float, default=0.3, help='share of public boards')
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for boards and users')
+    parser.add_argument('--requests', type=int, default=20_000)
+    main(parser.parse_args())
@@ -0,0 +1,46 @@
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = '/auth/get-user-data'
+
+
+class StubAuthHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.02
+
+    def do_GET(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(self.latency)
+        email = self.path[len(PREFIX):] if self.path.startswith(PREFIX) else ''
+        if not email or email.startswith('missing'):
+            body, code = b'{"detail": "Not found"}', 404
+        else:
+            user_id = zlib.crc32(email.encode()) % 1_000_000 + 1
+            body, code = json.dumps({"id": user_id, "email": email}).encode(), 200
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_auth(host='127.0.0.1', port=0, latency=0.02):
+    handler = type('Handler', (StubAuthHandler,), {'latency': latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    server, url = start_stub_auth(port=8002)
+    print(f'stub auth service on {url}')
+    threading.Event().wait()
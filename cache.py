@@ -0,0 +1,130 @@
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire after a per-entry TTL.
+
+    With ``weigh`` (value -> size) the cache is also held under ``maxweight``
+    in total, e.g. bytes, evicting least recently used entries first.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, maxweight: int = None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxweight = maxweight
+        self.weigh = weigh
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _remove(self, key):
+        self.weight -= self._data.pop(key)[2]
+
+    def get(self, key, default=None):
+        item = self._data.get(key, MISSING)
+        if item is not MISSING:
+            value, expires_at, _ = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            self._remove(key)
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl: float = None):
+        if ttl is None:
+            ttl = self.ttl
+        if key in self._data:
+            self._remove(key)
+        weight = self.weigh(value) if self.weigh is not None else 0
+        if ttl <= 0 or (self.maxweight is not None and weight > self.maxweight):
+            return
+        self._data[key] = (value, time.monotonic() + ttl, weight)
+        self.weight += weight
+        while len(self._data) > self.maxsize or (self.maxweight is not None and self.weight > self.maxweight):
+            self._remove(next(iter(self._data)))
+
+    def pop(self, key, default=None):
+        if key not in self._data:
+            return default
+        value = self._data[key][0]
+        self._remove(key)
+        return value
+
+    def clear(self):
+        self._data.clear()
+        self.weight = 0
+
+
+# Raise the integer at KEYS[1] to ARGV[1] (never lower it), refresh its TTL and return it.
+SET_MAX_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local value = tonumber(ARGV[1])
+if value > current then current = value end
+redis.call('SET', KEYS[1], current, 'PX', ARGV[2])
+return current
+"""
+
+
+class MemoryStore:
+    """In-process stand-in for ``RedisStore``, for tests and single-replica setups."""
+
+    def __init__(self):
+        self._data = {}
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    async def get(self, key: str):
+        item = self._live(key)
+        return None if item is None else item[0]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._data[key] = (value, time.monotonic() + ttl)
+
+    async def set_max(self, key: str, value: int, ttl: float) -> int:
+        item = self._live(key)
+        current = max(value, 0 if item is None else int(item[0]))
+        self._data[key] = (str(current).encode(), time.monotonic() + ttl)
+        return current
+
+    async def aclose(self):
+        self._data.clear()
+
+
+class RedisStore:
+    """Shared cache in Redis (or anything speaking its protocol), same interface as ``MemoryStore``."""
+
+    def __init__(self, url: str):
+        # Optional dependency: only needed when a shared cache is configured.
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self._set_max = self.client.register_script(SET_MAX_SCRIPT)
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    async def set_max(self, key: str, value: int, ttl: float) -> int:
+        return int(await self._set_max(keys=[key], args=[value, max(1, int(ttl * 1000))]))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def shared_store(url: str = None):
+    return RedisStore(url) if url else MemoryStore()
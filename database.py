@@ -1,19 +1,237 @@
+import contextvars
+import time
 from typing import AsyncGenerator
+from uuid import uuid4
 
+from fastapi import Depends
+from sqlalchemy import exc, event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from starlette.requests import cookie_parser
 
-from settings import DB_USER, DB_NAME, DB_PORT, DB_HOST, DB_PASSWORD
+from settings import (
+    DB_USER, DB_NAME, DB_PORT, DB_HOST, DB_PASSWORD, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE, DB_PGBOUNCER, DB_REPLICA_HOST, DB_REPLICA_PORT,
+    READ_YOUR_WRITES_WINDOW, READ_YOUR_WRITES_USERS, READ_YOUR_WRITES_COOKIE
+)
+from cache import TTLCache
+from metrics import instrument
+from utils import verify_token
 
 DATABASE_URL = f'postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+REPLICA_URL = DB_REPLICA_HOST and \
+    f'postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}'
 
-engine = create_async_engine(DATABASE_URL)
+
+class PoolTelemetry:
+    """Counts checkouts and the time spent waiting for them."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checked_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        self.checkouts += 1
+        self.checked_out += 1
+        return connection
+
+    def _do_return_conn(self, record):
+        self.checked_out -= 1
+        super()._do_return_conn(record)
+
+    def stats(self) -> dict:
+        return {
+            "pool": type(self).__name__,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "wait_seconds_total": round(self.wait_total, 6),
+            "wait_seconds_max": round(self.wait_max, 6),
+            "timeouts": self.timeouts,
+        }
+
+
+class TimedQueuePool(PoolTelemetry, AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.overflows = 0
+
+    def _do_get(self):
+        connection = super()._do_get()
+        if self.overflow() > 0:
+            self.overflows += 1
+        return connection
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "size": self.size(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "overflow_checkouts": self.overflows,
+        }
+
+
+class TimedNullPool(PoolTelemetry, NullPool):
+    pass
+
+
+def engine_options() -> dict:
+    if DB_PGBOUNCER:
+        # PgBouncer in transaction mode hands each transaction to any server
+        # connection: it does the pooling, and prepared statements must neither
+        # be cached nor reuse names across connections.
+        return {
+            "poolclass": TimedNullPool,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f'__asyncpg_{uuid4()}__',
+            },
+        }
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        },
+    }
+
+
+# Per request: {"user_id": ..., "written_at": ...} from the read-your-writes cookie, "wrote" once it commits.
+request_writes = contextvars.ContextVar('request_writes', default=None)
+
+
+class SessionRouter:
+    """Picks the replica for reads unless the user committed on the primary in the last ``window`` seconds.
+
+    Replicas of the API sit behind a round-robin balancer, so the read after a
+    write often lands on another process. Besides its own record, the router
+    therefore trusts the client's cookie (see ``ReadYourWritesMiddleware``).
+    """
+
+    def __init__(self, primary, replica=None, window: float = READ_YOUR_WRITES_WINDOW,
+                 maxsize: int = READ_YOUR_WRITES_USERS):
+        self.primary = primary
+        self.replica = replica
+        self.window = window
+        self.recent_writers = TTLCache(maxsize, window)
+
+    def for_read(self, user_id: int):
+        if self.replica is None or self.recent_writers.get(user_id) is not None:
+            return self.primary
+        writes = request_writes.get()
+        if writes is not None and writes["user_id"] == user_id and time.time() - writes["written_at"] < self.window:
+            return self.primary
+        return self.replica
+
+    def wrote(self, user_id: int):
+        self.recent_writers.set(user_id, True)
+
+
+engine = create_async_engine(DATABASE_URL, **engine_options())
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=True)
 
+replica_engine = REPLICA_URL and create_async_engine(REPLICA_URL, **engine_options())
+# Marked, so that process-wide caches can refuse to fill from reads that may lag behind a write.
+replica_session_maker = replica_engine and sessionmaker(
+    replica_engine, class_=AsyncSession, expire_on_commit=True, info={"replica": True}
+)
+
+router = SessionRouter(async_session_maker, replica_session_maker)
+
+instrument(engine)
+if replica_engine:
+    instrument(replica_engine)
+
 Base = declarative_base()
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
+@event.listens_for(Session, 'after_commit')
+def remember_writer(session):
+    # Marked at commit, before the response goes out, so the user's next read already sees it.
+    user_id = session.info.get('user_id')
+    if user_id is not None:
+        router.wrote(user_id)
+        writes = request_writes.get()
+        if writes is not None:
+            writes["wrote"] = (user_id, time.time())
+
+
+class ReadYourWritesMiddleware:
+    """Hands the client a cookie with the time of its last commit and reads it back on later requests.
+
+    The cookie carries the user id, so it only routes that user's reads. It
+    can at worst send a client's own reads to the primary, so it is not signed.
+    Replicas compare it against their own clocks.
+    """
+
+    def __init__(self, app, cookie: str = READ_YOUR_WRITES_COOKIE, window: float = READ_YOUR_WRITES_WINDOW):
+        self.app = app
+        self.cookie = cookie
+        self.window = window
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        writes = {"user_id": None, "written_at": 0.0, "wrote": None}
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                user_id, _, written_at = cookie_parser(value.decode('latin-1')).get(self.cookie, '').partition(':')
+                try:
+                    writes.update(user_id=int(user_id), written_at=float(written_at))
+                except ValueError:
+                    pass
+
+        async def send_with_cookie(message):
+            if message['type'] == 'http.response.start' and writes["wrote"] is not None:
+                user_id, written_at = writes["wrote"]
+                max_age = max(1, round(self.window))
+                cookie = f'{self.cookie}={user_id}:{written_at:.3f}; Max-Age={max_age}; Path=/; HttpOnly'
+                message = {**message, 'headers': [*message['headers'], (b'set-cookie', cookie.encode('latin-1'))]}
+            await send(message)
+
+        token = request_writes.set(writes)
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            request_writes.reset(token)
+
+
+async def get_async_session(token: dict = Depends(verify_token)) -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_maker(info={"user_id": token and token.get('user_id')}) as session:
         yield session
+
+
+async def get_read_session(token: dict = Depends(verify_token)) -> AsyncGenerator[AsyncSession, None]:
+    async with router.for_read(token and token.get('user_id'))() as session:
+        yield session
+
+
+def pool_stats() -> dict:
+    return {
+        "primary": engine.pool.stats(),
+        "replica": replica_engine.pool.stats() if replica_engine else None,
+    }
@@ -0,0 +1,267 @@
+"""Per-board change feed.
+
+Mutations send their events inside their transaction, chained into their own
+statement with ``notify`` (or on their own with ``publish``). Postgres delivers the
+NOTIFY to every replica (this one included) when the transaction commits, and
+each replica's ``BoardEventHub`` fans the event out to its local subscribers.
+Every published event is also noted for the activity log (see activity.py),
+and its id becomes the board's snapshot version (see snapshots.py).
+"""
+import asyncio
+import enum
+import json
+import logging
+from collections import deque
+
+import asyncpg
+from sqlalchemy import select, func, literal, cast, case, JSON, Text
+from sqlalchemy.orm import QueryableAttribute
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from activity import note
+from authz import GUEST
+from cache import TTLCache
+from models.models import board_event_id_seq
+from settings import (
+    DB_USER, DB_PASSWORD, DB_DIRECT_HOST, DB_DIRECT_PORT, DB_NAME, EVENT_CHANNEL, EVENT_QUEUE_SIZE,
+    EVENT_HISTORY_SIZE, EVENT_HISTORY_BOARDS, EVENT_HISTORY_TTL, EVENT_HEARTBEAT
+)
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads are limited to 8000 bytes.
+MAX_PAYLOAD = 7900
+
+
+def _encode(value):
+    return value.value if isinstance(value, enum.Enum) else str(value)
+
+
+def _is_sql(value) -> bool:
+    return isinstance(value, (ColumnElement, QueryableAttribute))
+
+
+def _json(value):
+    if _is_sql(value):
+        return value
+    return cast(literal(json.dumps(value, separators=(',', ':'), default=_encode)), JSON)
+
+
+def _message(event_id, board_id, kind: str, data):
+    body = cast(func.json_build_object(
+        literal('board_id'), board_id, literal('type'), literal(kind), literal('data'), data
+    ), Text)
+    return func.concat(event_id, literal(':'), body)
+
+
+def notify(board_id, kind: str, data: dict, *columns, where=None):
+    """SELECT that sends a change-feed event, for chaining into a mutation's own statement.
+
+    ``board_id`` and the ``data`` values may be columns of the mutation's
+    RETURNING, which sends one event per returned row that matches ``where``
+    (none if the mutation matched nothing). Rows carry ``columns`` and the
+    event itself; pass them to ``published`` once the statement ran.
+    """
+    if not _is_sql(board_id):
+        board_id = literal(board_id)
+    body = func.json_build_object(
+        *(part for name, value in data.items() for part in (literal(name), _json(value))), type_=JSON
+    )
+    event = select(
+        board_event_id_seq.next_value().label('event_id'),
+        board_id.label('event_board_id'),
+        literal(kind).label('event_kind'),
+        body.label('event_data'),
+        *columns,
+    )
+    if where is not None:
+        event = event.where(where)
+    # A subquery, so that the id in the message and in the row come from the same nextval().
+    event = event.subquery()
+    message = _message(event.c.event_id, event.c.event_board_id, kind, event.c.event_data)
+    # NOTIFY payloads are limited in size; larger diffs degrade to "refetch the board".
+    fallback = _message(event.c.event_id, event.c.event_board_id, "board.changed", func.json_build_object())
+    message = case((func.octet_length(message) > MAX_PAYLOAD, fallback), else_=message)
+    return select(*event.c, func.pg_notify(literal(EVENT_CHANNEL), message).label('notified'))
+
+
+def published(session: AsyncSession, rows) -> list:
+    """Record the events ``rows`` of a ``notify`` statement sent; returns the rows.
+
+    Each event is noted for the activity log and becomes its board's snapshot version.
+    """
+    versions = session.info.setdefault('board_versions', {})
+    for row in rows:
+        note(session, row.event_board_id, row.event_kind, **row.event_data)
+        versions[row.event_board_id] = max(row.event_id, versions.get(row.event_board_id, 0))
+    return rows
+
+
+async def publish(session: AsyncSession, board_id: int, kind: str, **data):
+    """Send an event in a statement of its own, for changes that have none to chain it into."""
+    published(session, (await session.execute(notify(board_id, kind, data))).all())
+
+
+def format_event(event: dict) -> str:
+    data = json.dumps({"board_id": event["board_id"], **event["data"]}, separators=(',', ':'))
+    return f'id: {event["id"]}\nevent: {event["type"]}\ndata: {data}\n\n'
+
+
+class Subscription:
+    def __init__(self, board_id: int, user_id: int, role: str, queue_size: int):
+        self.board_id = board_id
+        self.user_id = user_id
+        self.role = role
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout: float):
+        """Next event, None once closed; raises TimeoutError when idle for ``timeout``."""
+        if self.closed:
+            return None
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def revoked_by(self, event: dict) -> bool:
+        kind, data = event["type"], event["data"]
+        return kind == "board.deleted" \
+            or (kind == "member.removed" and data.get("user_id") == self.user_id) \
+            or (kind == "board.updated" and self.role == GUEST and data.get("visibility") not in (None, "Public"))
+
+
+class BoardEventHub:
+    """Fans events out to subscribers of a board and keeps a short history for resuming.
+
+    Every subscriber has a bounded queue; one that falls ``queue_size`` events
+    behind is closed instead of buffering without limit, and reconnects with
+    ``Last-Event-ID`` to replay what it missed from the history.
+    """
+
+    def __init__(
+            self,
+            queue_size: int = EVENT_QUEUE_SIZE,
+            history_size: int = EVENT_HISTORY_SIZE,
+            history_boards: int = EVENT_HISTORY_BOARDS,
+            history_ttl: float = EVENT_HISTORY_TTL,
+    ):
+        self.queue_size = queue_size
+        self.history_size = history_size
+        self.history = TTLCache(history_boards, history_ttl)
+        self.subscribers = {}
+        # Called with every received event, and with a "reset" event when notifications may have been missed.
+        self.listeners = []
+        self.dropped = 0
+
+    def subscribe(self, board_id: int, user_id: int, role: str, last_event_id: int = None) -> Subscription:
+        subscription = Subscription(board_id, user_id, role, self.queue_size)
+        if last_event_id is not None:
+            history = list(self.history.get(board_id, ()))
+            ids = [event["id"] for event in history]
+            backlog = history[ids.index(last_event_id) + 1:] if last_event_id in ids else None
+            if backlog is None or len(backlog) >= self.queue_size:
+                # Too far behind to replay: the client has to reload the board.
+                subscription.queue.put_nowait({"id": last_event_id, "board_id": board_id, "type": "reset", "data": {}})
+            else:
+                for event in backlog:
+                    subscription.queue.put_nowait(event)
+        self.subscribers.setdefault(board_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self.subscribers.get(subscription.board_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[subscription.board_id]
+
+    def dispatch(self, event: dict):
+        board_id = event["board_id"]
+        history = self.history.get(board_id)
+        if history is None:
+            history = deque(maxlen=self.history_size)
+        history.append(event)
+        self.history.set(board_id, history)
+
+        for subscription in list(self.subscribers.get(board_id, ())):
+            if subscription.revoked_by(event):
+                subscription.close()
+                self.unsubscribe(subscription)
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                subscription.close()
+                self.unsubscribe(subscription)
+
+    def receive(self, payload: str):
+        event_id, _, body = payload.partition(':')
+        event = json.loads(body)
+        event["id"] = int(event_id)
+        self.dispatch(event)
+        for listener in self.listeners:
+            listener(event)
+
+    def reset(self):
+        """Forget history and close every subscriber, e.g. after missing notifications."""
+        self.history.clear()
+        for subscribers in list(self.subscribers.values()):
+            for subscription in list(subscribers):
+                subscription.close()
+        self.subscribers.clear()
+        for listener in self.listeners:
+            listener({"id": None, "board_id": None, "type": "reset", "data": {}})
+
+    def stats(self):
+        return {
+            "boards": len(self.subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self.subscribers.values()),
+            "dropped": self.dropped,
+        }
+
+
+async def listen(hub: BoardEventHub, channel: str = EVENT_CHANNEL):
+    """Feed NOTIFYs on ``channel`` into ``hub``, reconnecting when the connection drops.
+
+    Uses its own connection outside the SQLAlchemy pool, straight to Postgres:
+    LISTEN is session state and does not survive PgBouncer's transaction mode.
+    """
+    while True:
+        try:
+            connection = await asyncpg.connect(
+                user=DB_USER, password=DB_PASSWORD, host=DB_DIRECT_HOST, port=DB_DIRECT_PORT, database=DB_NAME
+            )
+        except (OSError, asyncpg.PostgresError):
+            logger.exception("Connecting the event listener failed")
+            await asyncio.sleep(1)
+            continue
+
+        def on_notify(conn, pid, name, payload):
+            try:
+                hub.receive(payload)
+            except Exception:
+                logger.exception("Dropping malformed event %r", payload)
+
+        try:
+            await connection.add_listener(channel, on_notify)
+            # Anything published while we were disconnected is lost; make clients resync.
+            hub.reset()
+            while True:
+                await asyncio.sleep(EVENT_HEARTBEAT)
+                await connection.execute('SELECT 1')
+        except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+            logger.exception("Event listener connection lost")
+        finally:
+            if not connection.is_closed():
+                connection.terminate()
+        await asyncio.sleep(1)
+
+
+board_events = BoardEventHub()
@@ -0,0 +1,190 @@
+"""Board export and import as NDJSON, one JSON object per line.
+
+    {"type": "board", "version": 1, "board_name": "...", "visibility": "private"}
+    {"type": "table", "id": 7, "title": "...", "position": "U"}
+    {"type": "task", "table_id": 7, "message": "...", "position": "V"}
+
+Both directions work on a bounded number of rows at a time: the export reads
+through a server-side cursor and the import writes tasks with COPY in batches,
+so memory use does not depend on the size of the board.
+"""
+import json
+from collections import Counter
+
+from fastapi import HTTPException
+from sqlalchemy import select, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from models.models import Board, BoardTable, TaskTable, TrelloChoiceEnum
+import queries
+from ranking import valid_key
+from settings import EXPORT_CHUNK_SIZE, IMPORT_BATCH_SIZE, IMPORT_MAX_LINE
+
+FORMAT_VERSION = 1
+
+
+def _line(item: dict) -> str:
+    return json.dumps(item, separators=(',', ':'), ensure_ascii=False) + '\n'
+
+
+async def export_board(session: AsyncSession, board_id: int, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Yield the board as NDJSON text, ``chunk_size`` rows per chunk."""
+    # One snapshot for the whole export, so tasks always match the exported tables.
+    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    board = (await session.execute(
+        select(Board.board_name, Board.visibility).where((Board.id == board_id), Board.deleted_at.is_(None))
+    )).first()
+    if board is None:
+        return
+    yield _line({
+        "type": "board", "version": FORMAT_VERSION, "board_name": board.board_name,
+        "visibility": board.visibility.name if board.visibility else None,
+    })
+
+    tables = await session.stream(
+        select(BoardTable.id, BoardTable.title, BoardTable.position)
+        .where(BoardTable.board_id == board_id)
+        .order_by(BoardTable.position, BoardTable.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for rows in tables.partitions():
+        yield ''.join(
+            _line({"type": "table", "id": row.id, "title": row.title, "position": row.position}) for row in rows
+        )
+
+    tasks = await session.stream(
+        select(TaskTable.boardtable_id, TaskTable.message, TaskTable.position)
+        .join(BoardTable, BoardTable.id == TaskTable.boardtable_id)
+        .where(BoardTable.board_id == board_id)
+        .order_by(TaskTable.boardtable_id, TaskTable.position, TaskTable.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for rows in tasks.partitions():
+        yield ''.join(
+            _line({"type": "task", "table_id": row.boardtable_id, "message": row.message, "position": row.position})
+            for row in rows
+        )
+
+
+def _invalid(detail: str):
+    return HTTPException(detail=f"Invalid import: {detail}", status_code=status.HTTP_400_BAD_REQUEST)
+
+
+async def _read_lines(chunks, max_line: int = IMPORT_MAX_LINE):
+    buffer = b''
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        if len(buffer) > max_line:
+            raise _invalid(f"line {number + len(lines) + 1} is longer than {max_line} bytes")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+    if buffer.strip():
+        yield number + 1, buffer
+
+
+async def _parse(chunks):
+    async for number, line in _read_lines(chunks):
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise _invalid(f"line {number} is not JSON")
+        if not isinstance(item, dict):
+            raise _invalid(f"line {number} is not an object")
+        yield number, item
+
+
+def _text(item: dict, key: str, number: int, required: bool = True):
+    value = item.get(key)
+    if (value is None and required) or (value is not None and not isinstance(value, str)):
+        raise _invalid(f"line {number} needs a string {key!r}")
+    return value
+
+
+def _position(item: dict, number: int) -> str:
+    # Stored as is: a malformed key would break every later insert or move in its column.
+    position = _text(item, "position", number)
+    if not valid_key(position):
+        raise _invalid(f"line {number} has an invalid position {position!r}")
+    return position
+
+
+async def import_board(
+        session: AsyncSession, user_id: int, chunks, board_name: str = None, batch_size: int = IMPORT_BATCH_SIZE
+):
+    """Create a board owned by ``user_id`` from NDJSON ``chunks`` (an async iterable of bytes).
+
+    Returns ``(board_id, tables, tasks)``. Runs in the caller's transaction;
+    nothing is visible until the caller commits.
+    """
+    items = _parse(chunks)
+    header = None
+    async for number, header in items:
+        break
+    if header is None or header.get("type") != "board":
+        raise _invalid("the first line must describe the board")
+    if header.get("version") != FORMAT_VERSION:
+        raise _invalid(f"unsupported version {header.get('version')!r}")
+    try:
+        visibility = TrelloChoiceEnum[header.get("visibility") or "public"]
+    except KeyError:
+        raise _invalid(f"unknown visibility {header.get('visibility')!r}")
+
+    board_id = (await session.execute(insert(Board).values(
+        board_name=board_name or _text(header, "board_name", 1, required=False),
+        user_id=user_id,
+        visibility=visibility,
+    ).returning(Board.id))).scalar_one()
+
+    connection = await session.connection()
+    driver = (await connection.get_raw_connection()).driver_connection
+    table_ids = {}
+    tables, tasks = [], []
+    table_tasks = Counter()
+
+    async def flush_tables():
+        if tables:
+            query = insert(BoardTable).returning(BoardTable.id, sort_by_parameter_order=True)
+            new_ids = (await session.execute(query, [row for _, row in tables])).scalars().all()
+            table_ids.update(zip((old_id for old_id, _ in tables), new_ids))
+            tables.clear()
+
+    async def flush_tasks():
+        if tasks:
+            await driver.copy_records_to_table(
+                TaskTable.__tablename__, records=tasks, columns=['message', 'boardtable_id', 'position']
+            )
+            tasks.clear()
+
+    async for number, item in items:
+        kind = item.get("type")
+        if kind == "table":
+            if item.get("id") in table_ids or any(item.get("id") == old_id for old_id, _ in tables):
+                raise _invalid(f"line {number} repeats table {item.get('id')!r}")
+            tables.append((item.get("id"), {
+                "title": _text(item, "title", number, required=False),
+                "board_id": board_id,
+                "position": _position(item, number),
+            }))
+            if len(tables) >= batch_size:
+                await flush_tables()
+        elif kind == "task":
+            await flush_tables()
+            table_id = table_ids.get(item.get("table_id"))
+            if table_id is None:
+                raise _invalid(f"line {number} refers to unknown table {item.get('table_id')!r}")
+            tasks.append((_text(item, "message", number, required=False), table_id, _position(item, number)))
+            table_tasks[table_id] += 1
+            if len(tasks) >= batch_size:
+                await flush_tasks()
+        else:
+            raise _invalid(f"line {number} has unknown type {kind!r}")
+    await flush_tables()
+    await flush_tasks()
+    await session.execute(update(Board).where(Board.id == board_id).values(table_count=len(table_ids)))
+    await queries.add_task_counts(session, table_tasks)
+    return board_id, len(table_ids), sum(table_tasks.values())
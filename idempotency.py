@@ -0,0 +1,202 @@
+"""``Idempotency-Key`` support for POST endpoints that clients retry.
+
+The first request with a key runs normally, and its response is stored in
+the ``idempotency_key`` table for ``IDEMPOTENCY_TTL``. The table is what every
+replica checks; a small local cache only spares quick retries a query.
+A retry with the same key gets the stored response back, marked with an
+``Idempotent-Replayed: true`` header, and the handler does not run again.
+
+A duplicate that arrives while the first request is still running waits for
+it. On the same replica it waits on the first request's future. Across
+replicas it polls the claimed row. Keys are scoped to the user and the path.
+Reusing a key for a different request (other query string or body) gets a
+422. The first request's body is hashed as it streams to the handler; a
+duplicate's body is hashed and discarded, so neither is buffered.
+"""
+import asyncio
+import hashlib
+import json
+
+from cache import TTLCache
+from database import async_session_maker
+import queries
+from settings import (
+    IDEMPOTENCY_TTL, IDEMPOTENCY_LOCK_TIMEOUT, IDEMPOTENCY_WAIT, IDEMPOTENCY_POLL_INTERVAL, IDEMPOTENCY_CACHE_SIZE,
+    IDEMPOTENCY_CACHE_BYTES, IDEMPOTENCY_CACHE_TTL, IDEMPOTENCY_MAX_BODY
+)
+from utils import decode_token
+
+MAX_KEY_LENGTH = 255
+
+def _response_size(response: tuple) -> int:
+    fingerprint, _, headers, body = response
+    return len(fingerprint) + len(body) + sum(len(name) + len(value) for name, value in headers)
+
+
+# key -> (fingerprint, status_code, headers, body), the same shape as the stored row.
+response_cache = TTLCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_CACHE_TTL, IDEMPOTENCY_CACHE_BYTES, _response_size)
+
+
+def _digest(*parts: bytes) -> str:
+    return hashlib.sha256(b'\0'.join(parts)).hexdigest()
+
+
+async def _send_json(send, status_code: int, detail: str, headers=()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, paths, session_maker=async_session_maker, ttl: float = IDEMPOTENCY_TTL,
+                 wait: float = IDEMPOTENCY_WAIT, max_body: int = IDEMPOTENCY_MAX_BODY):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.session_maker = session_maker
+        self.ttl = ttl
+        self.wait = wait
+        self.max_body = max_body
+        self.in_flight = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope['headers'])
+        raw_key = headers.get(b'idempotency-key')
+        user_id = self._user_id(headers.get(b'authorization'))
+        if raw_key is None or user_id is None:
+            # Without a key there is nothing to dedupe; without a valid token the app answers 401 anyway.
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(raw_key) <= MAX_KEY_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        key = _digest(str(user_id).encode(), scope['path'].encode(), raw_key)
+        while True:
+            stored = response_cache.get(key)
+            if stored is not None:
+                await self._replay(stored, await self._drain(scope, receive), send)
+                return
+            first = self.in_flight.get(key)
+            if first is None:
+                break
+            # Shielded: a waiter that gets cancelled must not cancel the first request's future.
+            await asyncio.shield(first)
+
+        self.in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            await self._run_once(key, scope, receive, send)
+        finally:
+            self.in_flight.pop(key).set_result(None)
+
+    @staticmethod
+    def _user_id(authorization: bytes):
+        if authorization is None or not authorization.lower().startswith(b'bearer '):
+            return None
+        try:
+            return decode_token(authorization[7:].decode('latin-1')).get('user_id')
+        except Exception:
+            return None
+
+    @staticmethod
+    async def _drain(scope, receive) -> str:
+        """Fingerprint of a request whose body is not going to the handler."""
+        body = hashlib.sha256()
+        while True:
+            message = await receive()
+            if message['type'] != 'http.request':
+                break
+            body.update(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return _digest(scope['query_string'], body.digest())
+
+    async def _run_once(self, key: str, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait
+        while True:
+            async with self.session_maker() as session:
+                # The body is not hashed yet: the claim carries a placeholder, the stored response the fingerprint.
+                claimed = await queries.claim_idempotency_key(session, key, '', IDEMPOTENCY_LOCK_TIMEOUT)
+                stored = None if claimed else await queries.get_idempotency_key(session, key)
+                await session.commit()
+            if claimed:
+                await self._execute(key, scope, receive, send)
+                return
+            if stored is not None and stored.status_code is not None:
+                response_cache.set(key, tuple(stored))
+                await self._replay(tuple(stored), await self._drain(scope, receive), send)
+                return
+            if loop.time() >= deadline:
+                await _send_json(send, 409, "A request with this Idempotency-Key is still in progress",
+                                 [(b'retry-after', b'1')])
+                return
+            await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+    async def _execute(self, key: str, scope, receive, send):
+        status_code = None
+        headers = []
+        body = []
+        size = 0
+        request_body = hashlib.sha256()
+        request_read = False
+
+        async def hashing_receive():
+            nonlocal request_read
+            message = await receive()
+            if message['type'] == 'http.request':
+                request_body.update(message.get('body', b''))
+                request_read = not message.get('more_body')
+            return message
+
+        async def capturing_send(message):
+            nonlocal status_code, headers, size
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                headers = [[name.decode('latin-1'), value.decode('latin-1')] for name, value in message['headers']]
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+                if size <= self.max_body:
+                    body.append(message.get('body', b''))
+            await send(message)
+
+        stored = False
+        try:
+            await self.app(scope, hashing_receive, capturing_send)
+            # Server errors are not stored, so the client's retry gets to run again. Neither is a response sent
+            # before the body was read (e.g. an early 413): it cannot be fingerprinted without streaming the rest.
+            if request_read and status_code is not None and status_code < 500 and size <= self.max_body:
+                fingerprint = _digest(scope['query_string'], request_body.digest())
+                response = (fingerprint, status_code, headers, b''.join(body))
+                async with self.session_maker() as session:
+                    await queries.store_idempotent_response(session, key, *response, ttl=self.ttl)
+                    await session.commit()
+                response_cache.set(key, response)
+                stored = True
+        finally:
+            if not stored:
+                async with self.session_maker() as session:
+                    await queries.release_idempotency_key(session, key)
+                    await session.commit()
+
+    @staticmethod
+    async def _replay(stored: tuple, fingerprint: str, send):
+        stored_fingerprint, status_code, headers, body = stored
+        if stored_fingerprint != fingerprint:
+            await _send_json(send, 422, "Idempotency-Key was already used for a different request")
+            return
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                *((name.encode('latin-1'), value.encode('latin-1')) for name, value in headers),
+                (b'idempotent-replayed', b'true'),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps, features
+
+import queries
+from cache import TTLCache
+from database import async_session_maker
+from settings import UPLOAD_DIR, IMAGE_WORKERS, IMAGE_QUEUE_SIZE, IMAGE_RETRY_BACKOFF, IMAGE_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumb': (320, 200),
+    'display': (1920, 1080),
+}
+MEDIA_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+
+def blob_digest(path: str) -> str:
+    return os.path.basename(path).split('.', 1)[0]
+
+
+def derivative_path(digest: str, variant: str, extension: str) -> str:
+    return os.path.join(UPLOAD_DIR, 'derived', digest[:2], f'{digest}-{variant}.{extension}')
+
+
+def derivative_paths(source: str) -> list:
+    digest = blob_digest(source)
+    return [derivative_path(digest, variant, extension) for variant in VARIANTS for extension in ('webp', 'jpg')]
+
+
+def render_variants(source: str) -> dict:
+    """Write every variant of ``source`` that is not on disk yet; runs in a worker process."""
+    extension = 'webp' if features.check('webp') else 'jpg'
+    digest = blob_digest(source)
+    paths = {variant: derivative_path(digest, variant, extension) for variant in VARIANTS}
+    missing = [variant for variant, path in paths.items() if not os.path.exists(path)]
+    if not missing:
+        return paths
+
+    with Image.open(source) as image:
+        image.draft('RGB', max(VARIANTS.values()))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for variant in missing:
+            resized = image.copy()
+            resized.thumbnail(VARIANTS[variant], Image.LANCZOS)
+            os.makedirs(os.path.dirname(paths[variant]), exist_ok=True)
+            temp_path = f'{paths[variant]}.{uuid.uuid4().hex}.tmp'
+            resized.save(temp_path, 'WEBP' if extension == 'webp' else 'JPEG', quality=80)
+            os.replace(temp_path, paths[variant])
+    return paths
+
+
+class ImagePipeline:
+    """Bounded queue of background images waiting for their derivatives.
+
+    ``submit`` never blocks: when the queue is full it returns False and the
+    caller decides how to push back. Rendering happens in a process pool so the
+    event loop only waits on futures.
+
+    Reads re-submit backgrounds whose variants are missing, so a source that
+    fails to render is refused for a backoff that doubles with every failure,
+    and after ``max_attempts`` failures until its record expires.
+    """
+
+    def __init__(self, workers: int = IMAGE_WORKERS, queue_size: int = IMAGE_QUEUE_SIZE,
+                 retry_backoff: float = IMAGE_RETRY_BACKOFF, max_attempts: int = IMAGE_MAX_ATTEMPTS):
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.pending = set()
+        self.retry_backoff = retry_backoff
+        self.max_attempts = max_attempts
+        # source -> (failures, monotonic time before which it is not retried)
+        self.failures = TTLCache(queue_size * 10, retry_backoff * 2 ** max_attempts)
+        self.failed = 0
+        self._executor = None
+        self._tasks = []
+
+    def start(self):
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, source: str) -> bool:
+        if source in self.pending:
+            return True
+        failures, retry_at = self.failures.get(source, (0, 0))
+        if failures >= self.max_attempts or retry_at > time.monotonic():
+            return False
+        try:
+            self.queue.put_nowait(source)
+        except asyncio.QueueFull:
+            return False
+        self.pending.add(source)
+        return True
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            source = await self.queue.get()
+            try:
+                variants = await loop.run_in_executor(self._executor, render_variants, source)
+                async with async_session_maker() as session:
+                    await queries.set_background_variants(session, source, variants)
+                    await session.commit()
+            except Exception:
+                logger.exception("Rendering variants of %s failed", source)
+                self.failed += 1
+                failures = self.failures.get(source, (0, 0))[0] + 1
+                self.failures.set(source, (failures, time.monotonic() + self.retry_backoff * 2 ** (failures - 1)))
+            else:
+                self.failures.pop(source)
+            finally:
+                self.pending.discard(source)
+                self.queue.task_done()
+
+
+image_pipeline = ImagePipeline()
@@ -1,17 +1,200 @@
-import aiofiles
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from contextlib import asynccontextmanager
+
+import asyncio
+
+import httpx
+from fastapi import (
+    FastAPI, Depends, HTTPException, Query, Header, BackgroundTasks, Request, Response
+)
+from fastapi.responses import FileResponse, StreamingResponse, ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, delete, and_, update
+from sqlalchemy import insert
 from starlette import status
-from models.models import BoardUsers, Board, BoardTable, TaskTable
-from database import get_async_session
-from utils import verify_token, request_api_for_user_data
-from models.models import Board, TrelloChoiceEnum
+from models.models import Activity, Board, BoardTable, TaskTable, TrelloChoiceEnum
+from activity import activity_recorder, note
+from database import (
+    get_async_session, get_read_session, async_session_maker, router, pool_stats, ReadYourWritesMiddleware
+)
+import exports
+import queries
+from authz import board_auth, OWNER, GUEST
+from events import board_events, publish, format_event, listen
+from metrics import metrics, MetricsMiddleware, CONTENT_TYPE
+from idempotency import IdempotencyMiddleware, response_cache
+from images import image_pipeline, blob_digest, derivative_paths, MEDIA_TYPES, VARIANTS
+from reaper import board_reaper
+from snapshots import snapshot_cache
+from pagination import paginate
+from ranking import rank_between
+from schemas import (
+    TaskBatch, MemberInvite, InviteResults, Result, BatchResult, BoardPage, BoardSnapshot, TablePage, TaskPage,
+    SearchPage, ActivityPage, BoardImport, BoardDeletion, DashboardPage
+)
+from settings import (
+    PAGE_SIZE, MAX_PAGE_SIZE, MAX_BATCH_SIZE, RANK_REBALANCE_LENGTH, BLOB_SWEEP_INTERVAL, BLOB_SWEEP_GRACE,
+    IMAGE_CACHE_MAX_AGE, EVENT_HEARTBEAT, REAPER_INTERVAL, IDEMPOTENCY_SWEEP_INTERVAL, MAX_INVITES, INVITE_CONCURRENCY,
+    COUNTER_RECONCILE_INTERVAL, COUNTER_RECONCILE_CHUNK
+)
+from storage import receive_upload, publish_upload, discard_upload, multipart_file
+from utils import verify_token, request_api_for_user_data, run_periodically, token_cache
+from user_client import user_directory
+
+
+async def sweep_unused_blobs():
+    async with async_session_maker() as session:
+        for path in await queries.sweep_blobs(session, BLOB_SWEEP_GRACE):
+            await discard_upload(path)
+            for derived in derivative_paths(path):
+                await discard_upload(derived)
+        await session.commit()
+
+
+async def sweep_idempotency_keys():
+    async with async_session_maker() as session:
+        await queries.sweep_idempotency_keys(session)
+        await session.commit()
+
+
+# Counters found wrong by the reconciliation job, by kind; anything above zero points at a write path that missed them.
+counter_repairs = {"board": 0, "table": 0}
+
+
+async def reconcile_counters():
+    for kind, reconcile in (("table", queries.reconcile_table_counts), ("board", queries.reconcile_board_counts)):
+        after_id = 0
+        while after_id is not None:
+            async with async_session_maker() as session:
+                after_id, repaired = await reconcile(session, after_id, COUNTER_RECONCILE_CHUNK)
+                await session.commit()
+            counter_repairs[kind] += repaired
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background = [
+        asyncio.create_task(run_periodically(BLOB_SWEEP_INTERVAL, sweep_unused_blobs)),
+        asyncio.create_task(listen(board_events)),
+        asyncio.create_task(run_periodically(REAPER_INTERVAL, board_reaper.run)),
+        asyncio.create_task(run_periodically(IDEMPOTENCY_SWEEP_INTERVAL, sweep_idempotency_keys)),
+        asyncio.create_task(run_periodically(COUNTER_RECONCILE_INTERVAL, reconcile_counters)),
+    ]
+    image_pipeline.start()
+    activity_recorder.start()
+    yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await image_pipeline.stop()
+    await activity_recorder.stop()
+    await user_directory.aclose()
+    await snapshot_cache.aclose()
+
+
+app = FastAPI(title="Trello", lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(IdempotencyMiddleware, paths={
+    '/create-board', '/create-table-for-board', '/add-task-for-table', '/board-user/add', '/board-user/bulk-add',
+})
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@metrics.collector
+def runtime_metrics():
+    for name, stats in pool_stats().items():
+        if stats is None:
+            continue
+        labels = {"pool": name}
+        yield 'db_pool_checked_out', 'gauge', labels, stats["checked_out"]
+        yield 'db_pool_checkouts_total', 'counter', labels, stats["checkouts"]
+        yield 'db_pool_wait_seconds_total', 'counter', labels, stats["wait_seconds_total"]
+        yield 'db_pool_wait_seconds_max', 'gauge', labels, stats["wait_seconds_max"]
+        yield 'db_pool_timeouts_total', 'counter', labels, stats["timeouts"]
+        if "overflow_checkouts" in stats:
+            yield 'db_pool_overflow', 'gauge', labels, stats["overflow"]
+            yield 'db_pool_overflow_checkouts_total', 'counter', labels, stats["overflow_checkouts"]
+    for name, cache in (
+            ("authz", board_auth), ("token", token_cache), ("user", user_directory.cache),
+            ("idempotency", response_cache),
+    ):
+        yield 'cache_hits_total', 'counter', {"cache": name}, cache.hits
+        yield 'cache_misses_total', 'counter', {"cache": name}, cache.misses
+    snapshots = snapshot_cache.stats()
+    for tier in ("local", "shared"):
+        yield 'cache_hits_total', 'counter', {"cache": f"snapshot_{tier}"}, snapshots[f"{tier}_hits"]
+        yield 'cache_misses_total', 'counter', {"cache": f"snapshot_{tier}"}, snapshots[f"{tier}_misses"]
+    yield 'snapshot_loads_total', 'counter', {}, snapshots["loads"]
+    yield 'snapshot_coalesced_total', 'counter', {}, snapshots["coalesced"]
+    yield 'snapshot_store_errors_total', 'counter', {}, snapshots["errors"]
+    feed = board_events.stats()
+    yield 'board_event_subscribers', 'gauge', {}, feed["subscribers"]
+    yield 'board_event_dropped_subscribers_total', 'counter', {}, feed["dropped"]
+    yield 'image_queue_length', 'gauge', {}, image_pipeline.queue.qsize()
+    yield 'image_render_failures_total', 'counter', {}, image_pipeline.failed
+    reaper = board_reaper.stats()
+    yield 'board_reaper_boards_in_progress', 'gauge', {}, reaper["boards_in_progress"]
+    for kind, count in reaper["deleted"].items():
+        yield 'board_reaper_deleted_rows_total', 'counter', {"kind": kind}, count
+    yield 'board_reaper_chunk_seconds_max', 'gauge', {}, reaper["chunk_seconds_max"]
+    for kind, count in counter_repairs.items():
+        yield 'counter_repairs_total', 'counter', {"kind": kind}, count
+    log = activity_recorder.stats()
+    yield 'activity_queue_length', 'gauge', {}, log["queued"]
+    yield 'activity_queue_capacity', 'gauge', {}, activity_recorder.queue.maxsize
+    for outcome in ("written", "dropped", "failed"):
+        yield 'activity_rows_total', 'counter', {"outcome": outcome}, log[outcome]
+
 
-app = FastAPI(title="Trello")
+def denied(role, detail: str):
+    if role is None:
+        return HTTPException(detail=detail, status_code=status.HTTP_404_NOT_FOUND)
+    return HTTPException(detail="Forbidden", status_code=status.HTTP_403_FORBIDDEN)
 
 
-@app.post("/board-user/add")
+async def rebalance_positions(group, group_value):
+    async with async_session_maker() as session:
+        if await queries.rebalance(session, group, group_value):
+            if group.class_ is BoardTable:
+                await publish(session, group_value, 'tables.rebalanced')
+            else:
+                board_id = await board_auth.table_board(session, group_value)
+                if board_id is not None:
+                    await publish(session, board_id, 'tasks.rebalanced', table_id=group_value)
+        await session.commit()
+
+
+async def new_position(group, lower, upper, background_tasks: BackgroundTasks, group_value):
+    try:
+        position = rank_between(lower, upper)
+    except ValueError:
+        # Two rows share a key (concurrent appends) or a key is malformed; respread and let the client retry.
+        background_tasks.add_task(rebalance_positions, group, group_value)
+        raise HTTPException(detail="Position conflict, retry", status_code=status.HTTP_409_CONFLICT)
+    if len(position) > RANK_REBALANCE_LENGTH:
+        background_tasks.add_task(rebalance_positions, group, group_value)
+    return position
+
+
+def batch_changes(batch: TaskBatch, created: list, moved: dict):
+    """The batch's creates and moves, as ``queries.delete_tasks`` lists them in its events."""
+    destinations = {item.task_id: item.table_id for item in batch.move}
+    changes = [
+        ("created", task_id, item.table_id, item.table_id) for item, task_id in zip(batch.create, created) if task_id
+    ]
+    changes += [("moved", task_id, destinations[task_id], table_id) for task_id, table_id in moved.items()]
+    return changes
+
+
+@app.get('/metrics')
+async def get_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+
+@app.get('/pool-stats')
+async def get_pool_stats():
+    return pool_stats()
+
+
+@app.post("/board-user/add", response_model=Result, response_model_exclude_none=True)
 async def add_board_user(
         email: str,
         board_id: int,
@@ -22,35 +205,86 @@ async def add_board_user(
         raise HTTPException(status_code=404, detail='Forbidden!')
     creator_id = token.get('user_id')
 
-    response = request_api_for_user_data(email)
-    if response:
-        board_query = select(Board).where(and_(Board.id == board_id, Board.user_id == creator_id))
-        board_data = await session.execute(board_query)
-        board_data = board_data.scalars().first()
-
-        if board_data:
-            board_user_query = select(BoardUsers).where(
-                and_(BoardUsers.user_id == response['id'], BoardUsers.board_id == board_id))
-            board_user_data = await session.execute(board_user_query)
-            board_user_data = board_user_data.scalars().first()
-            if board_user_data:
-                raise HTTPException(status_code=404, detail='User already in Board!')
-            else:
-                add_query = insert(BoardUsers).values(board_id=board_id, user_id=response['id'])
-                await session.execute(add_query)
-                await session.commit()
-                return {
-                    "status": status.HTTP_201_CREATED,
-                    "detail": "User added successfully to Board",
-                    "success": True
-                }
-        else:
-            raise HTTPException(status_code=404, detail='Not found!')
-    else:
+    try:
+        response = await request_api_for_user_data(email)
+    except httpx.HTTPError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='User service unavailable')
+    if not response:
         raise HTTPException(status_code=404, detail='No such user exists!')
 
+    if await queries.add_board_member(session, board_id, creator_id, response['id']) is None:
+        role = await board_auth.role(session, creator_id, board_id)
+        if role == OWNER:
+            raise HTTPException(status_code=404, detail='User already in Board!')
+        raise denied(role, 'Not found!')
+    await session.commit()
+    board_auth.invalidate(response['id'], board_id)
+    return {
+        "status": status.HTTP_201_CREATED,
+        "detail": "User added successfully to Board",
+        "success": True
+    }
+
 
-@app.delete('/board-user/delete')
+@app.post('/board-user/bulk-add', response_model=InviteResults)
+async def bulk_add_board_users(
+        invite: MemberInvite,
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    if token is None:
+        raise HTTPException(status_code=404, detail='Forbidden!')
+    creator_id = token.get('user_id')
+    board_id = invite.board_id
+
+    emails = list(dict.fromkeys(email.strip().lower() for email in invite.emails if email.strip()))
+    if len(emails) > MAX_INVITES:
+        raise HTTPException(
+            detail=f"At most {MAX_INVITES} emails per invite",
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+    # Check ownership before spending auth-service lookups on the list.
+    role = await board_auth.role(session, creator_id, board_id)
+    if role != OWNER:
+        raise denied(role, 'Not found!')
+
+    lookups = asyncio.Semaphore(INVITE_CONCURRENCY)
+
+    async def lookup(email):
+        async with lookups:
+            return await request_api_for_user_data(email)
+
+    users = await asyncio.gather(*(lookup(email) for email in emails), return_exceptions=True)
+    user_ids = {user['id'] for user in users if isinstance(user, dict)}
+    members = await queries.existing_members(session, board_id, user_ids)
+    added = await queries.add_board_members(session, board_id, creator_id, user_ids - members)
+    await session.commit()
+    for user_id in added:
+        board_auth.invalidate(user_id, board_id)
+
+    results = []
+    for email, user in zip(emails, users):
+        # BaseException: a lookup can also end in CancelledError.
+        if isinstance(user, BaseException):
+            result = (None, False, "User service unavailable")
+        elif not user:
+            result = (None, False, "No such user exists!")
+        elif user['id'] in added:
+            result = (user['id'], True, "User added successfully to Board")
+            # Two emails of the same user: report the addition once.
+            added.discard(user['id'])
+        else:
+            result = (user['id'], False, "User already in Board!")
+        results.append({"email": email, "user_id": result[0], "success": result[1], "detail": result[2]})
+    return {
+        "results": results,
+        "added": sum(result["success"] for result in results),
+        "status": status.HTTP_200_OK,
+        "success": True,
+    }
+
+
+@app.delete('/board-user/delete', response_model=Result, response_model_exclude_none=True)
 async def delete_board_user(
         user_id: int,
         board_id: int,
@@ -62,26 +296,31 @@ async def delete_board_user(
 
     creator_id = token.get('user_id')
 
-    board_query = select(Board).where(and_(Board.id == board_id, Board.user_id == creator_id))
-    board_data = await session.execute(board_query)
-
-    if board_data:
-        query = delete(BoardUsers).where(BoardUsers.c.user_id == user_id, BoardUsers.c.board_id == board_id)
-        await session.execute(query)
-        return {
-            "status": status.HTTP_204_NO_CONTENT,
-            "detail": "User deleted successfully from Board",
-            "success": True
-        }
-    else:
-        raise HTTPException(status_code=404, detail='Not found!')
+    if await queries.remove_board_member(session, board_id, creator_id, user_id) is None:
+        role = await board_auth.role(session, creator_id, board_id)
+        if role != OWNER:
+            raise denied(role, 'Not found!')
+    await session.commit()
+    board_auth.invalidate(user_id, board_id)
+    return {
+        "status": status.HTTP_204_NO_CONTENT,
+        "detail": "User deleted successfully from Board",
+        "success": True
+    }
 
 
-@app.post('/create-board')
+# The body is parsed by storage.multipart_file as it streams in, so it is described here rather than declared.
+@app.post('/create-board', response_model=Result, response_model_exclude_none=True, openapi_extra={
+    "requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {"background": {"type": "string", "format": "binary"}},
+        "required": ["background"],
+    }}}},
+})
 async def create_board(
         board_name: str,
         visibility: TrelloChoiceEnum,
-        background: UploadFile = File(...),
+        request: Request,
         session: AsyncSession = Depends(get_async_session),
         token: dict = Depends(verify_token)
 ):
@@ -92,28 +331,283 @@ async def create_board(
         )
     user_id = token.get('user_id')
     try:
-        out_file = f'uploads/files/{background.filename}'
-        async with aiofiles.open(out_file, 'wb') as f:
-            content = await background.read()
-            await f.write(content)
-
-        insert_query = insert(Board).values(
-            board_name=board_name,
-            user_id=user_id,
-            visibility=visibility,
-            background=out_file
-        )
+        stored = await receive_upload(multipart_file(request, 'background'))
+        try:
+            await queries.acquire_blob(session, stored)
+            insert_query = insert(Board).values(
+                board_name=board_name,
+                user_id=user_id,
+                visibility=visibility,
+                background=stored.path
+            ).returning(Board.id)
 
-        await session.execute(insert_query)
-        await session.commit()
+            board_id = (await session.execute(insert_query)).scalar_one()
+            note(session, board_id, 'board.created', board_name=board_name, visibility=visibility)
+            await session.commit()
+            # Only once the blob row is committed: files no row accounts for are never swept.
+            await publish_upload(stored)
+        finally:
+            await discard_upload(stored.temp_path)
+        board_auth.grant(user_id, board_id, OWNER)
+        # With the queue full the board keeps its original only; reading the background re-submits it.
+        image_pipeline.submit(stored.path)
 
         return {"detail": "Board successfully created", "status_code": status.HTTP_201_CREATED, "success": True}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(detail=f"{e}", status_code=status.HTTP_400_BAD_REQUEST)
 
 
-@app.patch('/edit-board')
+@app.get('/boards', response_model=BoardPage)
+async def list_boards(
+        cursor: str = None,
+        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    return ORJSONResponse(await paginate(
+        session, queries.boards_for_user(user_id), (Board.created_at, Board.id), cursor, limit, descending=True
+    ))
+
+
+# Declared before /boards/{board_id}, which would otherwise match it.
+@app.get('/boards/dashboard', response_model=DashboardPage)
+async def board_dashboard(
+        cursor: str = None,
+        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    # Counts come from the maintained counters: one query, no COUNT(*) over tables or tasks.
+    return ORJSONResponse(await paginate(
+        session, queries.dashboard_for_user(user_id), (Board.created_at, Board.id), cursor, limit, descending=True
+    ))
+
+
+@app.get('/boards/{board_id}', response_model=BoardSnapshot)
+async def get_board(
+        board_id: int,
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    role = await board_auth.role(session, user_id, board_id)
+    # A cache miss loads on a connection of its own: return this one to the pool first,
+    # so a burst of misses never holds two connections per request.
+    await session.close()
+    snapshot = None if role is None else await snapshot_cache.get(board_id, user_id)
+    if snapshot is None or (role == GUEST and not snapshot[0]):
+        raise HTTPException(detail="Board not found", status_code=status.HTTP_404_NOT_FOUND)
+    return Response(snapshot[1], media_type="application/json")
+
+
+@app.get('/boards/{board_id}/background')
+async def get_board_background(
+        board_id: int,
+        request: Request,
+        variant: str = Query('display', pattern=f"^(original|{'|'.join(VARIANTS)})$"),
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    board = await queries.get_board_background(session, board_id, user_id)
+    if board is None or not board.background:
+        raise HTTPException(detail="Background not found", status_code=status.HTTP_404_NOT_FOUND)
+
+    path = board.background
+    if variant != 'original':
+        if board.background_variants and variant in board.background_variants:
+            path = board.background_variants[variant]
+        else:
+            # Not rendered yet (the queue was full at upload time, or rendering failed): serve the original.
+            image_pipeline.submit(board.background)
+            variant = 'original'
+
+    etag = f'"{blob_digest(board.background)}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={IMAGE_CACHE_MAX_AGE}"}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type=MEDIA_TYPES.get(path.rsplit('.', 1)[-1]), headers=headers)
+
+
+@app.get('/boards/{board_id}/events')
+async def board_event_stream(
+        board_id: int,
+        last_event_id: int = Header(None),
+        token: dict = Depends(verify_token),
+):
+    """Server-sent events for one board; reconnecting clients resume via ``Last-Event-ID``."""
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    # A short-lived session: the stream itself must not hold a pooled connection.
+    async with router.for_read(user_id)() as session:
+        role = await board_auth.role(session, user_id, board_id)
+        if role is None or (role == GUEST and not await queries.board_readable(session, board_id, user_id)):
+            raise HTTPException(detail="Board not found", status_code=status.HTTP_404_NOT_FOUND)
+
+    async def stream():
+        subscription = board_events.subscribe(board_id, user_id, role, last_event_id)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await subscription.get(EVENT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    return
+                yield format_event(event)
+        finally:
+            board_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(), media_type='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get('/boards/{board_id}/export')
+async def export_board(
+        board_id: int,
+        token: dict = Depends(verify_token),
+):
+    """The whole board as NDJSON, streamed from a server-side cursor; feed it back to ``/boards/import``."""
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    session_maker = router.for_read(user_id)
+    async with session_maker() as session:
+        role = await board_auth.role(session, user_id, board_id)
+        if role is None or (role == GUEST and not await queries.board_readable(session, board_id, user_id)):
+            raise HTTPException(detail="Board not found", status_code=status.HTTP_404_NOT_FOUND)
+
+    async def stream():
+        async with session_maker() as session:
+            async for chunk in exports.export_board(session, board_id):
+                yield chunk
+
+    return StreamingResponse(
+        stream(), media_type='application/x-ndjson',
+        headers={"Content-Disposition": f'attachment; filename="board-{board_id}.ndjson"'},
+    )
+
+
+@app.post('/boards/import', response_model=BoardImport, response_model_exclude_none=True)
+async def import_board(
+        request: Request,
+        board_name: str = None,
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """Create a new board from an NDJSON body produced by ``/boards/{board_id}/export``."""
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    board_id, tables, tasks = await exports.import_board(session, user_id, request.stream(), board_name)
+    note(session, board_id, 'board.imported', tables=tables, tasks=tasks)
+    await session.commit()
+    board_auth.grant(user_id, board_id, OWNER)
+
+    return {
+        "detail": "Board successfully imported",
+        "board_id": board_id,
+        "tables": tables,
+        "tasks": tasks,
+        "status_code": status.HTTP_201_CREATED,
+        "success": True
+    }
+
+
+@app.get('/boards/{board_id}/activity', response_model=ActivityPage)
+async def list_activity(
+        board_id: int,
+        cursor: str = None,
+        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    """Newest first. Rows appear up to ``ACTIVITY_FLUSH_INTERVAL`` seconds after the change."""
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    return ORJSONResponse(await paginate(
+        session, queries.activity_for_board(board_id, user_id), (Activity.id,), cursor, limit, descending=True
+    ))
+
+
+@app.get('/boards/{board_id}/tables', response_model=TablePage)
+async def list_tables(
+        board_id: int,
+        cursor: str = None,
+        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    return ORJSONResponse(await paginate(
+        session, queries.tables_for_board(board_id, user_id), (BoardTable.position, BoardTable.id), cursor, limit
+    ))
+
+
+@app.get('/tables/{table_id}/tasks', response_model=TaskPage)
+async def list_tasks(
+        table_id: int,
+        cursor: str = None,
+        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    return ORJSONResponse(await paginate(
+        session, queries.tasks_for_table(table_id, user_id), (TaskTable.position, TaskTable.id), cursor, limit
+    ))
+
+
+@app.get('/search/tasks', response_model=SearchPage)
+async def search_tasks(
+        q: str = Query(..., min_length=1, max_length=200),
+        board_id: int = None,
+        cursor: str = None,
+        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    query, columns = queries.search_tasks(user_id, q, board_id)
+    return ORJSONResponse(await paginate(session, query, columns, cursor, limit, descending=True))
+
+
+@app.patch('/edit-board', response_model=Result, response_model_exclude_none=True)
 async def edit_board(
         board_id: int,
         new_board_name: str = None,
@@ -125,45 +619,31 @@ async def edit_board(
         raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
     user_id = token.get('user_id')
 
+    values = {}
+    if new_board_name is not None:
+        values['board_name'] = new_board_name
+    if new_board_visibility is not None:
+        values['visibility'] = new_board_visibility
+    if not values:
+        return {"detail": "No changes!!!", "status": status.HTTP_204_NO_CONTENT}
+
     try:
-        board_query = select(Board).where(
-            (Board.id == board_id),
-            (Board.user_id == user_id)
-        )
-        board_data = await session.execute(board_query)
-        board_data = board_data.scalars().first()
-        if board_data:
-            update_query = update(Board)
-            if new_board_name and new_board_visibility is not None:
-                update_query = update_query.where(Board.id == board_id).values(
-                    board_name=new_board_name,
-                    visibility=new_board_visibility,
-                )
-            if new_board_name is not None and new_board_visibility is None:
-                update_query = update_query.where(Board.id == board_id).values(
-                    board_name=new_board_name
-                )
-            if new_board_visibility is not None and new_board_name is None:
-                update_query = update_query.where(Board.id == board_id).values(
-                    visibility=new_board_visibility
-                )
-            if new_board_name and new_board_visibility is None:
-                return {"detail": "No changes!!!", "status": status.HTTP_204_NO_CONTENT}
-            await session.execute(update_query)
-            await session.commit()
+        if await queries.update_board(session, board_id, user_id, **values) is None:
+            raise denied(await board_auth.role(session, user_id, board_id), "Board not found")
+        await session.commit()
 
-            return {
-                "detail": "Board updated successfully",
-                "status": status.HTTP_200_OK,
-                "success": True
-            }
-        else:
-            raise HTTPException(detail="Board not found", status_code=status.HTTP_404_NOT_FOUND)
+        return {
+            "detail": "Board updated successfully",
+            "status": status.HTTP_200_OK,
+            "success": True
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(detail=f"{e}", status_code=status.HTTP_400_BAD_REQUEST)
 
 
-@app.delete('/delete-board')
+@app.delete('/delete-board', response_model=Result, response_model_exclude_none=True)
 async def delete_board(
         board_id: int,
         token: dict = Depends(verify_token),
@@ -174,29 +654,47 @@ async def delete_board(
     user_id = token.get('user_id')
 
     try:
-        board_query = select(Board).where(
-            (Board.id == board_id),
-            (Board.user_id == user_id)
-        )
-        board_data = await session.execute(board_query)
-        board_data = board_data.scalars().first()
-        if board_data:
-            delete_query = delete(Board).where(Board.id == board_id)
-            await session.execute(delete_query)
-            await session.commit()
-            return {
-                "detail": "Board deleted successfully",
-                "status": status.HTTP_204_NO_CONTENT,
-                "success": True
-            }
-        else:
-            raise HTTPException(detail="Board not found", status_code=status.HTTP_404_NOT_FOUND)
-
+        board = await queries.delete_board(session, board_id, user_id)
+        if board is None:
+            raise denied(await board_auth.role(session, user_id, board_id), "Board not found")
+        if board.background:
+            await queries.release_blob(session, board.background)
+        await session.commit()
+        board_auth.invalidate_board(board_id)
+        return {
+            "detail": "Board deleted successfully",
+            "status": status.HTTP_204_NO_CONTENT,
+            "success": True
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(detail=f"{e}", status_code=status.HTTP_400_BAD_REQUEST)
 
 
-@app.post('/create-table-for-board')
+@app.get('/boards/{board_id}/deletion', response_model=BoardDeletion)
+async def board_deletion_progress(
+        board_id: int,
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """What is left of a deleted board; 404 once the reaper has removed it completely."""
+    if token is None:
+        raise HTTPException(detail="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = token.get('user_id')
+
+    progress = await queries.deletion_progress(session, board_id, user_id)
+    if progress is None:
+        raise HTTPException(detail="No deletion in progress", status_code=status.HTTP_404_NOT_FOUND)
+    return {
+        "board_id": board_id,
+        "deleted_at": progress.deleted_at,
+        "remaining_tables": progress.tables,
+        "remaining_tasks": progress.tasks,
+    }
+
+
+@app.post('/create-table-for-board', response_model=Result, response_model_exclude_none=True)
 async def create_table_for_board(
         title: str,
         board_id: int,
@@ -208,35 +706,17 @@ async def create_table_for_board(
     user_id = token.get('user_id')
 
     try:
-        board_query = select(Board).where(
-            (Board.id == board_id),
-            (Board.user_id == user_id)
-        )
-        board_data = await session.execute(board_query)
-        board_data = board_data.scalars().first()
-        board_user_query = select(BoardUsers).where(
-            (BoardUsers.board_id == board_id),
-            (BoardUsers.user_id == user_id)
-        )
-        board_datas = await session.execute(board_query)
-        board_datas = board_datas.scalars().first()
-        if board_data or board_datas is not None:
-            insert_query = insert(BoardTable).values(
-                title=title,
-                board_id=board_id
-            )
-            await session.execute(insert_query)
-            await session.commit()
-            return {
-                "detail": "Table for Board created successfully",
-                "status": status.HTTP_201_CREATED,
-                "success": True
-            }
-        else:
-            raise HTTPException(
-                detail="Board not found",
-                status_code=status.HTTP_404_NOT_FOUND
-            )
+        table = await queries.create_table(session, board_id, user_id, title)
+        if table is None:
+            raise denied(await board_auth.role(session, user_id, board_id), "Board not found")
+        await session.commit()
+        return {
+            "detail": "Table for Board created successfully",
+            "status": status.HTTP_201_CREATED,
+            "success": True
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             detail=f"{e}",
@@ -244,7 +724,7 @@ async def create_table_for_board(
         )
 
 
-@app.patch("/update-table-title")
+@app.patch("/update-table-title", response_model=Result, response_model_exclude_none=True)
 async def update_table_title(
         table_id: int,
         new_title: str = None,
@@ -258,38 +738,25 @@ async def update_table_title(
         )
     user_id = token.get("user_id")
 
+    if new_title is None:
+        return {
+            "detail": "No local changes to save",
+            "status": status.HTTP_204_NO_CONTENT,
+        }
+
     try:
-        table_query = select(BoardTable).where(
-            (BoardTable.id == table_id),
-            (BoardTable.user_id == user_id),
-        )
-        table_data = await session.execute(table_query)
-        table_data = table_data.scalars().first()
-
-        if table_data:
-            update_query = update(BoardTable)
-            if new_title is not None:
-                update_query = update_query.where(BoardTable.id == table_id).values(
-                    title=new_title
-                )
-            else:
-                return {
-                    "detail": "No local changes to save",
-                    "status": status.HTTP_204_NO_CONTENT,
-                }
-            await session.execute(update_query)
-            await session.commit()
+        board_id = await queries.update_table(session, table_id, user_id, title=new_title)
+        if board_id is None:
+            raise denied(await board_auth.table_role(session, user_id, table_id), "Table not found")
+        await session.commit()
 
-            return {
-                "detail": "Table title updated successfully",
-                "status": status.HTTP_200_OK,
-                "success": True,
-            }
-        else:
-            raise HTTPException(
-                detail="Table not found",
-                status_code=status.HTTP_404_NOT_FOUND,
-            )
+        return {
+            "detail": "Table title updated successfully",
+            "status": status.HTTP_200_OK,
+            "success": True,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             detail=f"{e}",
@@ -297,7 +764,7 @@ async def update_table_title(
         )
 
 
-@app.delete("/delete-table{table_id}")
+@app.delete("/delete-table{table_id}", response_model=Result, response_model_exclude_none=True)
 async def delete_table(
         table_id: int,
         token: dict = Depends(verify_token),
@@ -311,28 +778,19 @@ async def delete_table(
     user_id = token.get("user_id")
 
     try:
-        table_query = select(BoardTable).where(
-            (BoardTable.id == table_id),
-            (BoardTable.user_id == user_id),
-        )
-        table_data = await session.execute(table_query)
-        table_data = table_data.scalars().first()
-
-        if table_data:
-            delete_query = delete(BoardTable).where(BoardTable.id == table_id)
-            await session.execute(delete_query)
-            await session.commit()
+        board_id = await queries.delete_table(session, table_id, user_id)
+        if board_id is None:
+            raise denied(await board_auth.table_role(session, user_id, table_id), "Table not found")
+        await session.commit()
+        board_auth.invalidate_table(table_id)
 
-            return {
-                "detail": "Table deleted successfully",
-                "status": status.HTTP_204_NO_CONTENT,
-                "success": True,
-            }
-        else:
-            raise HTTPException(
-                detail="Table not found",
-                status_code=status.HTTP_404_NOT_FOUND,
-            )
+        return {
+            "detail": "Table deleted successfully",
+            "status": status.HTTP_204_NO_CONTENT,
+            "success": True,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             detail=f"{e}",
@@ -340,7 +798,7 @@ async def delete_table(
         )
 
 
-@app.post('/add-task-for-table')
+@app.post('/add-task-for-table', response_model=Result, response_model_exclude_none=True)
 async def add_task(
         message: str,
         table_id: int,
@@ -355,25 +813,17 @@ async def add_task(
 
     user_id = token.get('user_id')
     try:
-        table_query = select(BoardTable).where(
-            (BoardTable.id == table_id),
-            (BoardTable.user_id == user_id),
-        )
-        table_data = await session.execute(table_query)
-        table_data = table_data.scalars().first()
-
-        if table_data:
-            insert_query = insert(TaskTable).values(
-                message=message,
-                boardtable_id=table_query
-            )
-            await session.execute(insert_query)
-            await session.commit()
-            return {
-                "detail": "Message added to table successfully",
-                "status": status.HTTP_201_CREATED,
-                "success": True,
-            }
+        task = await queries.create_task(session, table_id, user_id, message)
+        if task is None:
+            raise denied(await board_auth.table_role(session, user_id, table_id), "Table not found")
+        await session.commit()
+        return {
+            "detail": "Message added to table successfully",
+            "status": status.HTTP_201_CREATED,
+            "success": True,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             detail=f"{e}",
@@ -381,7 +831,7 @@ async def add_task(
         )
 
 
-@app.patch('/update-task')
+@app.patch('/update-task', response_model=Result, response_model_exclude_none=True)
 async def update_task(
         task_id: int,
         new_message: str = None,
@@ -396,44 +846,34 @@ async def update_task(
         )
 
     user_id = token.get('user_id')
+
+    values = {}
+    if new_message is not None:
+        values['message'] = new_message
+    if new_boardtable_id is not None:
+        values['boardtable_id'] = new_boardtable_id
+    if not values:
+        return {
+            "detail": "No local changes to save",
+            "status": status.HTTP_204_NO_CONTENT,
+        }
+
     try:
-        check_query = select(TaskTable).where(
-            (TaskTable.id == task_id)
-        )
-        check_data = await session.execute(check_query)
-        check_data = check_data.scalars().first()
-        if check_data:
-            update_query = update(TaskTable)
-            if new_message and new_boardtable_id is not None:
-                update_query = update_query.where(TaskTable.id == task_id).values(
-                    message=new_message,
-                    boardtable_id=new_boardtable_id
-                )
-            if new_message is not None and new_boardtable_id is None:
-                update_query = update_query.where(TaskTable.id == task_id).values(
-                    message=new_message
-                )
-            if new_boardtable_id is not None and new_message is None:
-                update_query = update_query.where(TaskTable.id == task_id).values(
-                    boardtable_id=new_boardtable_id
-                )
-            if new_message and new_boardtable_id is None:
-                return {
-                    "detail": "No local changes to save",
-                    "status": status.HTTP_204_NO_CONTENT,
-                }
-            await session.execute(update_query)
-            await session.commit()
-            return {
-                "detail": "Task updated successfully",
-                "status": status.HTTP_200_OK,
-                "success": True,
-            }
-        else:
-            raise HTTPException(
-                detail="Task not found",
-                status_code=status.HTTP_404_NOT_FOUND,
-            )
+        task = await queries.update_task(session, task_id, user_id, **values)
+        if task is None:
+            table_id = await queries.task_table_id(session, task_id)
+            role = table_id and await board_auth.table_role(session, user_id, table_id)
+            if role not in (None, GUEST) and new_boardtable_id is not None:
+                raise denied(await board_auth.table_role(session, user_id, new_boardtable_id), "Table not found")
+            raise denied(role, "Task not found")
+        await session.commit()
+        return {
+            "detail": "Task updated successfully",
+            "status": status.HTTP_200_OK,
+            "success": True,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             detail=f"{e}",
@@ -441,7 +881,7 @@ async def update_task(
         )
 
 
-@app.delete('/delete-task')
+@app.delete('/delete-task', response_model=Result, response_model_exclude_none=True)
 async def delete_task(
         task_id: int,
         token: dict = Depends(verify_token),
@@ -455,28 +895,161 @@ async def delete_task(
     user_id = token.get('user_id')
 
     try:
-        task_query = select(TaskTable).where(
-            (TaskTable.id == task_id),
+        table_id = await queries.delete_task(session, task_id, user_id)
+        if table_id is None:
+            table_id = await queries.task_table_id(session, task_id)
+            raise denied(table_id and await board_auth.table_role(session, user_id, table_id), "Task not found")
+        await session.commit()
+
+        return {
+            "detail": "Task deleted successfully",
+            "status": status.HTTP_204_NO_CONTENT,
+            "success": True,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            detail=f"{e}",
+            status_code=status.HTTP_400_BAD_REQUEST,
         )
-        task_data = await session.execute(task_query)
-        task_data = task_data.scalars().first()
-        if task_data:
-            delete_query = delete(TaskTable).where(TaskTable.id == task_id)
-            await session.execute(delete_query)
-            await session.commit()
 
-            return {
-                "detail": "Task deleted successfully",
-                "status": status.HTTP_204_NO_CONTENT,
-                "success": True,
-            }
-        else:
-            raise HTTPException(
-                detail="Task not found",
-                status_code=status.HTTP_404_NOT_FOUND,
-            )
+
+@app.post('/tasks/batch', response_model=BatchResult)
+async def batch_tasks(
+        batch: TaskBatch,
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session),
+):
+    if token is None:
+        raise HTTPException(
+            detail="Unauthorized",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+        )
+    user_id = token.get('user_id')
+
+    if len(batch.create) + len(batch.move) + len(batch.delete) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            detail=f"At most {MAX_BATCH_SIZE} operations per batch",
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    try:
+        created = await queries.create_tasks(session, user_id, batch.create)
+        moved = await queries.move_tasks(session, user_id, batch.move)
+        deleted = await queries.delete_tasks(session, user_id, batch.delete, batch_changes(batch, created, moved))
+        await session.commit()
     except Exception as e:
         raise HTTPException(
             detail=f"{e}",
             status_code=status.HTTP_400_BAD_REQUEST,
         )
+
+    return {
+        "create": [
+            {"id": task_id, "success": task_id is not None,
+             "detail": "Task created" if task_id is not None else "Table not found"}
+            for task_id in created
+        ],
+        "move": [
+            {"id": item.task_id, "success": item.task_id in moved,
+             "detail": "Task moved" if item.task_id in moved else "Task or table not found"}
+            for item in batch.move
+        ],
+        "delete": [
+            {"id": task_id, "success": task_id in deleted,
+             "detail": "Task deleted" if task_id in deleted else "Task not found"}
+            for task_id in batch.delete
+        ],
+        "status": status.HTTP_200_OK,
+        "success": True,
+    }
+
+
+@app.post('/tasks/{task_id}/move', response_model=Result, response_model_exclude_none=True)
+async def move_task(
+        task_id: int,
+        background_tasks: BackgroundTasks,
+        before_id: int = None,
+        after_id: int = None,
+        table_id: int = None,
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session),
+):
+    if token is None:
+        raise HTTPException(
+            detail="Unauthorized",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+        )
+    user_id = token.get('user_id')
+
+    anchor_id = before_id if before_id is not None else after_id
+    if (before_id is not None and after_id is not None) or (anchor_id is None and table_id is None) \
+            or anchor_id == task_id:
+        raise HTTPException(
+            detail="Give one of before_id or after_id, or a table_id to move to its end",
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if anchor_id is not None:
+        slot = await queries.rank_slot(session, TaskTable.boardtable_id, anchor_id, task_id, before=before_id is not None)
+        if slot is None:
+            raise HTTPException(detail="Task not found", status_code=status.HTTP_404_NOT_FOUND)
+        table_id, lower, upper = slot
+    else:
+        lower = (await queries.last_positions(session, TaskTable.boardtable_id, [table_id])).get(table_id)
+        upper = None
+    position = await new_position(TaskTable.boardtable_id, lower, upper, background_tasks, table_id)
+
+    previous_table_id = await queries.move_task(session, task_id, user_id, table_id, position)
+    if previous_table_id is None:
+        task_table = await queries.task_table_id(session, task_id)
+        role = task_table and await board_auth.table_role(session, user_id, task_table)
+        if role not in (None, GUEST):
+            raise denied(await board_auth.table_role(session, user_id, table_id), "Table not found")
+        raise denied(role, "Task not found")
+    await session.commit()
+    return {
+        "detail": "Task moved successfully",
+        "status": status.HTTP_200_OK,
+        "success": True,
+    }
+
+
+@app.post('/tables/{table_id}/move', response_model=Result, response_model_exclude_none=True)
+async def move_table(
+        table_id: int,
+        background_tasks: BackgroundTasks,
+        before_id: int = None,
+        after_id: int = None,
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session),
+):
+    if token is None:
+        raise HTTPException(
+            detail="Unauthorized",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+        )
+    user_id = token.get('user_id')
+
+    anchor_id = before_id if before_id is not None else after_id
+    if (before_id is not None and after_id is not None) or anchor_id is None or anchor_id == table_id:
+        raise HTTPException(
+            detail="Give one of before_id or after_id",
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+
+    slot = await queries.rank_slot(session, BoardTable.board_id, anchor_id, table_id, before=before_id is not None)
+    if slot is None:
+        raise HTTPException(detail="Table not found", status_code=status.HTTP_404_NOT_FOUND)
+    board_id, lower, upper = slot
+    position = await new_position(BoardTable.board_id, lower, upper, background_tasks, board_id)
+
+    if await queries.move_table(session, table_id, user_id, board_id, position) is None:
+        raise denied(await board_auth.table_role(session, user_id, table_id), "Table not found")
+    await session.commit()
+    return {
+        "detail": "Table moved successfully",
+        "status": status.HTTP_200_OK,
+        "success": True,
+    }
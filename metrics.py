@@ -0,0 +1,196 @@
+"""Per-route request metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every HTTP request and ``instrument`` hooks an
+engine's cursor events, so each request also knows how many statements it ran
+and how long they took. Both write into a ``RequestStats`` kept in a
+contextvar for the duration of the request.
+"""
+import contextvars
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from sqlalchemy import event
+
+from settings import SLOW_REQUEST_SECONDS, SLOW_REQUEST_MAX_STATEMENTS
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    def __init__(self, capture: bool = False):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.captured = [] if capture else None
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: dict):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket', {**labels, "le": str(bound)}, cumulative
+        yield f'{name}_bucket', {**labels, "le": "+Inf"}, self.count
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, self.count
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+class Registry:
+    """Request metrics keyed by (method, route, status) plus gauges pulled from collectors at scrape time."""
+
+    def __init__(self):
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.statements = defaultdict(lambda: Histogram(STATEMENT_BUCKETS))
+        self.db_seconds = defaultdict(float)
+        self.bytes_in = defaultdict(int)
+        self.bytes_out = defaultdict(int)
+        self.collectors = []
+
+    def collector(self, func):
+        """Register ``func`` yielding ``(name, type, labels, value)`` tuples on every scrape."""
+        self.collectors.append(func)
+        return func
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route, str(status))
+        self.latency[key].observe(seconds)
+        self.statements[key].observe(stats.statements)
+        self.db_seconds[key] += stats.db_seconds
+        self.bytes_in[key] += stats.bytes_in
+        self.bytes_out[key] += stats.bytes_out
+
+    def render(self) -> str:
+        lines = []
+
+        def family(name, kind, samples):
+            lines.append(f'# TYPE {name} {kind}')
+            for sample, labels, value in samples:
+                lines.append(f'{sample}{_format_labels(labels)} {value}')
+
+        def labels(key):
+            return {"method": key[0], "route": key[1], "status": key[2]}
+
+        family('http_request_duration_seconds', 'histogram', (
+            sample for key, histogram in self.latency.items()
+            for sample in histogram.samples('http_request_duration_seconds', labels(key))
+        ))
+        family('http_request_sql_statements', 'histogram', (
+            sample for key, histogram in self.statements.items()
+            for sample in histogram.samples('http_request_sql_statements', labels(key))
+        ))
+        for name, counter in (
+                ('http_request_db_seconds_total', self.db_seconds),
+                ('http_request_received_bytes_total', self.bytes_in),
+                ('http_response_sent_bytes_total', self.bytes_out),
+        ):
+            family(name, 'counter', ((name, labels(key), value) for key, value in counter.items()))
+
+        gauges = defaultdict(list)
+        for collect in self.collectors:
+            for name, kind, sample_labels, value in collect():
+                gauges[(name, kind)].append((name, sample_labels, value))
+        for (name, kind), samples in gauges.items():
+            family(name, kind, samples)
+        return '\n'.join(lines) + '\n'
+
+
+def instrument(engine):
+    """Count statements and DB time of ``engine`` against the current request."""
+    sync_engine = getattr(engine, 'sync_engine', engine)
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        if stats is None:
+            return
+        elapsed = time.perf_counter() - context.metrics_started
+        stats.statements += 1
+        stats.db_seconds += elapsed
+        if stats.captured is not None and len(stats.captured) < SLOW_REQUEST_MAX_STATEMENTS:
+            stats.captured.append((elapsed, statement))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: nothing is buffered, streaming responses stay streaming."""
+
+    def __init__(self, app, registry: Registry = None, slow_request_seconds: float = SLOW_REQUEST_SECONDS):
+        self.app = app
+        self.registry = registry if registry is not None else metrics
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(capture=self.slow_request_seconds > 0)
+        token = _current.set(stats)
+        status_code = 500
+
+        async def counting_receive():
+            message = await receive()
+            if message['type'] == 'http.request':
+                stats.bytes_in += len(message.get('body', b''))
+            return message
+
+        async def counting_send(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            elif message['type'] == 'http.response.body':
+                stats.bytes_out += len(message.get('body', b''))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            route = scope.get('route')
+            path = route.path if route is not None else 'unmatched'
+            self.registry.observe(scope['method'], path, status_code, elapsed, stats)
+            if 0 < self.slow_request_seconds <= elapsed:
+                logger.warning(
+                    "Slow request %s %s: %.3fs, %d statements, %.3fs in the database\n%s",
+                    scope['method'], scope['path'], elapsed, stats.statements, stats.db_seconds,
+                    '\n'.join(f'  [{seconds * 1000:.1f} ms] {statement}' for seconds, statement in stats.captured),
+                )
+
+
+metrics = Registry()
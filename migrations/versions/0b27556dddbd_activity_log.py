@@ -0,0 +1,37 @@
+"""activity log
+
+Revision ID: 0b27556dddbd
+Revises: fa2a75ead3e2
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b27556dddbd'
+down_revision: Union[str, None] = 'fa2a75ead3e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'activity',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('board_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('data', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_activity_board_id_id', 'activity', ['board_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_activity_board_id_id', table_name='activity')
+    op.drop_table('activity')
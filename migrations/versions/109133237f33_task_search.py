@@ -0,0 +1,39 @@
+"""task search
+
+Revision ID: 109133237f33
+Revises: f4a80d75ea6a
+Create Date: 2026-10-18 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '109133237f33'
+down_revision: Union[str, None] = 'f4a80d75ea6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Adding a stored generated column rewrites tasktable; run it in a quiet window on large installs.
+    op.add_column('tasktable', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', coalesce(message, ''))", persisted=True), nullable=True
+    ))
+    op.create_index('ix_tasktable_search_vector', 'tasktable', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+    op.create_index('ix_tasktable_message_trgm', 'tasktable', ['message'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'message': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasktable_message_trgm', table_name='tasktable', postgresql_using='gin',
+                  postgresql_ops={'message': 'gin_trgm_ops'})
+    op.drop_index('ix_tasktable_search_vector', table_name='tasktable', postgresql_using='gin')
+    op.drop_column('tasktable', 'search_vector')
@@ -0,0 +1,40 @@
+"""board and table counters
+
+Revision ID: 1fe27094e723
+Revises: 5e6407cee231
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1fe27094e723'
+down_revision: Union[str, None] = '5e6407cee231'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('board', sa.Column('table_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('board', sa.Column('task_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('boardtable', sa.Column('task_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE boardtable SET task_count = counted.n "
+        "FROM (SELECT boardtable_id, count(*) AS n FROM tasktable GROUP BY boardtable_id) AS counted "
+        "WHERE boardtable.id = counted.boardtable_id"
+    )
+    op.execute(
+        "UPDATE board SET table_count = counted.tables, task_count = counted.tasks "
+        "FROM (SELECT board_id, count(*) AS tables, sum(task_count) AS tasks FROM boardtable GROUP BY board_id) "
+        "AS counted WHERE board.id = counted.board_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('boardtable', 'task_count')
+    op.drop_column('board', 'task_count')
+    op.drop_column('board', 'table_count')
@@ -0,0 +1,28 @@
+"""background variants
+
+Revision ID: 284f9c60e765
+Revises: 8814625709f1
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '284f9c60e765'
+down_revision: Union[str, None] = '8814625709f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('board', sa.Column('background_variants', sa.JSON(), nullable=True))
+    op.create_index(op.f('ix_board_background'), 'board', ['background'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_board_background'), table_name='board')
+    op.drop_column('board', 'background_variants')
@@ -0,0 +1,71 @@
+"""initial schema
+
+Revision ID: 530def5609d9
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '530def5609d9'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'board',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('board_name', sa.String(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('visibility', sa.Enum('private', 'public', 'workspace', name='trellochoiceenum'), nullable=True),
+        sa.Column('background', sa.String(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_board_id'), 'board', ['id'], unique=False)
+    op.create_table(
+        'boardtable',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('board_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['board_id'], ['board.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_boardtable_id'), 'boardtable', ['id'], unique=False)
+    op.create_table(
+        'boardusers',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('board_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['board_id'], ['board.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_boardusers_id'), 'boardusers', ['id'], unique=False)
+    op.create_table(
+        'tasktable',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('message', sa.String(), nullable=True),
+        sa.Column('boardtable_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['boardtable_id'], ['boardtable.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tasktable_id'), 'tasktable', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_tasktable_id'), table_name='tasktable')
+    op.drop_table('tasktable')
+    op.drop_index(op.f('ix_boardusers_id'), table_name='boardusers')
+    op.drop_table('boardusers')
+    op.drop_index(op.f('ix_boardtable_id'), table_name='boardtable')
+    op.drop_table('boardtable')
+    op.drop_index(op.f('ix_board_id'), table_name='board')
+    op.drop_table('board')
+    sa.Enum(name='trellochoiceenum').drop(op.get_bind(), checkfirst=True)
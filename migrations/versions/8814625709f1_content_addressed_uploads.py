@@ -0,0 +1,37 @@
+"""content addressed uploads
+
+Revision ID: 8814625709f1
+Revises: 9934f35f6471
+Create Date: 2026-10-18 11:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8814625709f1'
+down_revision: Union[str, None] = '9934f35f6471'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'upload_blob',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('content_type', sa.String(), nullable=True),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('released_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('digest'),
+        sa.UniqueConstraint('path')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('upload_blob')
@@ -0,0 +1,49 @@
+"""hot path indexes and cascades
+
+Revision ID: 9934f35f6471
+Revises: 9e74732f2dad
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9934f35f6471'
+down_revision: Union[str, None] = '9e74732f2dad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOREIGN_KEYS = (
+    ('boardtable_board_id_fkey', 'boardtable', 'board', 'board_id'),
+    ('boardusers_board_id_fkey', 'boardusers', 'board', 'board_id'),
+    ('tasktable_boardtable_id_fkey', 'tasktable', 'boardtable', 'boardtable_id'),
+)
+
+
+def upgrade() -> None:
+    # Duplicate memberships were possible before the unique constraint.
+    op.execute(
+        "DELETE FROM boardusers a USING boardusers b "
+        "WHERE a.board_id = b.board_id AND a.user_id = b.user_id AND a.id > b.id"
+    )
+    op.create_unique_constraint('uq_boardusers_board_id_user_id', 'boardusers', ['board_id', 'user_id'])
+    op.create_index('ix_boardusers_user_id_board_id', 'boardusers', ['user_id', 'board_id'], unique=False)
+    op.create_index('ix_board_user_id_created_at', 'board', ['user_id', 'created_at', 'id'], unique=False)
+
+    for name, table, referent, column in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    for name, table, referent, column in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], ['id'])
+
+    op.drop_index('ix_board_user_id_created_at', table_name='board')
+    op.drop_index('ix_boardusers_user_id_board_id', table_name='boardusers')
+    op.drop_constraint('uq_boardusers_board_id_user_id', 'boardusers', type_='unique')
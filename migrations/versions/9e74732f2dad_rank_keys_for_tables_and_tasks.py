@@ -0,0 +1,43 @@
+"""rank keys for tables and tasks
+
+Revision ID: 9e74732f2dad
+Revises: 530def5609d9
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e74732f2dad'
+down_revision: Union[str, None] = '530def5609d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Existing rows keep their id order: zero-padded row numbers are valid rank
+# keys once trailing zeros are trimmed (see ranking.py).
+BACKFILL = """
+UPDATE {table} SET position = ranked.position
+FROM (
+    SELECT id, rtrim(lpad(row_number() OVER (PARTITION BY {group} ORDER BY id)::text, 10, '0'), '0') AS position
+    FROM {table}
+) AS ranked
+WHERE {table}.id = ranked.id
+"""
+
+
+def upgrade() -> None:
+    for table, group in (('boardtable', 'board_id'), ('tasktable', 'boardtable_id')):
+        op.add_column(table, sa.Column('position', sa.String(collation='C'), nullable=True))
+        op.execute(BACKFILL.format(table=table, group=group))
+        op.alter_column(table, 'position', nullable=False)
+        op.create_index(f'ix_{table}_{group}_position', table, [group, 'position'], unique=False)
+
+
+def downgrade() -> None:
+    for table, group in (('tasktable', 'boardtable_id'), ('boardtable', 'board_id')):
+        op.drop_index(f'ix_{table}_{group}_position', table_name=table)
+        op.drop_column(table, 'position')
@@ -0,0 +1,29 @@
+"""board tombstones
+
+Revision ID: fa2a75ead3e2
+Revises: 109133237f33
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fa2a75ead3e2'
+down_revision: Union[str, None] = '109133237f33'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('board', sa.Column('deleted_at', sa.TIMESTAMP(), nullable=True))
+    op.create_index('ix_board_deleted_at', 'board', ['deleted_at'], unique=False,
+                    postgresql_where=sa.text('deleted_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_board_deleted_at', table_name='board', postgresql_where=sa.text('deleted_at IS NOT NULL'))
+    op.drop_column('board', 'deleted_at')
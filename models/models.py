@@ -2,10 +2,21 @@ from datetime import datetime
 import enum
 
 from database import Base
-from sqlalchemy import Column, Integer, String, ForeignKey, MetaData, Enum, TIMESTAMP
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, ForeignKey, MetaData, Enum, TIMESTAMP, JSON, Index, UniqueConstraint, Sequence,
+    Computed, LargeBinary, text
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 
 metadata = MetaData()
 
+# Text search configuration of TaskTable.search_vector; queries must use the same one.
+SEARCH_CONFIG = 'simple'
+
+# Ids of the change feed events published through NOTIFY (see events.py).
+board_event_id_seq = Sequence('board_event_id_seq', metadata=metadata)
+
 
 class TrelloChoiceEnum(enum.Enum):
     private = "Private"
@@ -21,16 +32,34 @@ class Board(Base):
     board_name = Column(String)
     user_id = Column(Integer)
     visibility = Column(Enum(TrelloChoiceEnum), default=TrelloChoiceEnum.public)
-    background = Column(String)
+    background = Column(String, index=True)
+    background_variants = Column(JSON)
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    # Set when the board is deleted; the reaper removes the board and its rows later.
+    deleted_at = Column(TIMESTAMP)
+    # Maintained by the writes in queries.py; the reconciliation job repairs any drift.
+    table_count = Column(Integer, nullable=False, default=0, server_default='0')
+    task_count = Column(Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        Index("ix_board_user_id_created_at", "user_id", "created_at", "id"),
+        Index("ix_board_deleted_at", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+    )
 
 
 class BoardTable(Base):
     __tablename__ = "boardtable"
+    metadata = metadata
 
     id = Column(Integer, index=True, autoincrement=True, primary_key=True)
     title = Column(String)
-    board_id = Column(Integer, ForeignKey("board.id"))
+    board_id = Column(Integer, ForeignKey("board.id", ondelete="CASCADE"))
+    position = Column(String(collation="C"), nullable=False)
+    task_count = Column(Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        Index("ix_boardtable_board_id_position", "board_id", "position"),
+    )
 
 
 class BoardUsers(Base):
@@ -38,13 +67,77 @@ class BoardUsers(Base):
     metadata = metadata
 
     id = Column(Integer, index=True, autoincrement=True, primary_key=True)
-    board_id = Column(Integer, ForeignKey("board.id"))
+    board_id = Column(Integer, ForeignKey("board.id", ondelete="CASCADE"))
     user_id = Column(Integer)
 
+    __table_args__ = (
+        UniqueConstraint("board_id", "user_id", name="uq_boardusers_board_id_user_id"),
+        Index("ix_boardusers_user_id_board_id", "user_id", "board_id"),
+    )
+
 
 class TaskTable(Base):
     __tablename__ = "tasktable"
+    metadata = metadata
 
     id = Column(Integer, index=True, autoincrement=True, primary_key=True)
     message = Column(String)
-    boardtable_id = Column(Integer, ForeignKey("boardtable.id"))
+    boardtable_id = Column(Integer, ForeignKey("boardtable.id", ondelete="CASCADE"))
+    position = Column(String(collation="C"), nullable=False)
+    search_vector = deferred(Column(
+        TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}', coalesce(message, ''))", persisted=True)
+    ))
+
+    __table_args__ = (
+        Index("ix_tasktable_boardtable_id_position", "boardtable_id", "position"),
+        Index("ix_tasktable_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_tasktable_message_trgm", "message",
+            postgresql_using="gin", postgresql_ops={"message": "gin_trgm_ops"},
+        ),
+    )
+
+
+class Activity(Base):
+    """Audit trail of board changes, written behind the request by ``activity.ActivityRecorder``."""
+    __tablename__ = "activity"
+    metadata = metadata
+
+    # No foreign key: the trail outlives reaped boards.
+    id = Column(BigInteger, autoincrement=True, primary_key=True)
+    board_id = Column(Integer, nullable=False)
+    user_id = Column(Integer)
+    action = Column(String, nullable=False)
+    data = Column(JSON)
+    created_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_activity_board_id_id", "board_id", "id"),
+    )
+
+
+class UploadBlob(Base):
+    __tablename__ = "upload_blob"
+    metadata = metadata
+
+    digest = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False, unique=True)
+    size = Column(BigInteger)
+    content_type = Column(String)
+    refcount = Column(Integer, nullable=False, default=1)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    released_at = Column(TIMESTAMP)
+
+
+class IdempotencyKey(Base):
+    """Stored responses of POSTs sent with an ``Idempotency-Key`` header (see idempotency.py)."""
+    __tablename__ = "idempotency_key"
+    metadata = metadata
+
+    key = Column(String(64), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    # NULL while the first request is still running.
+    status_code = Column(Integer)
+    headers = Column(JSON)
+    body = Column(LargeBinary)
+    expires_at = Column(TIMESTAMP, nullable=False, index=True)
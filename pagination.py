@@ -0,0 +1,83 @@
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_, BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from settings import PAGE_SIZE
+
+
+def _dump(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([_dump(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _load(column, value):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    value = python_type(value)
+    # Anything the database would refuse to bind must fail here, as a 400, not in the driver.
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(value)
+    if python_type is int:
+        bound = 2 ** 63 if isinstance(column.type, BigInteger) else 2 ** 31
+        if not -bound <= value < bound:
+            raise ValueError(value)
+    return value
+
+
+def decode_cursor(cursor: str, columns) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return tuple(_load(column, value) for column, value in zip(columns, values))
+    except (ValueError, TypeError, OverflowError, binascii.Error):
+        raise HTTPException(detail="Invalid cursor", status_code=status.HTTP_400_BAD_REQUEST)
+
+
+def keyset(query, columns, after: tuple = None, descending: bool = False):
+    """Order ``query`` by ``columns`` and start it right after the ``after`` key.
+
+    The key is compared as a row value, so any page is an index range scan on
+    ``columns`` instead of an OFFSET that reads and discards every earlier row.
+    """
+    if after is not None:
+        key, bound = tuple_(*columns), tuple_(*after)
+        query = query.where(key < bound if descending else key > bound)
+    return query.order_by(*(column.desc() if descending else column for column in columns))
+
+
+async def paginate(
+        session: AsyncSession,
+        query,
+        columns,
+        cursor: str = None,
+        limit: int = PAGE_SIZE,
+        descending: bool = False,
+):
+    after = decode_cursor(cursor, columns) if cursor else None
+    result = await session.execute(keyset(query, columns, after, descending).limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+
+    return {
+        "items": [dict(row._mapping) for row in rows],
+        "next_cursor": next_cursor,
+    }
+
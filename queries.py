@@ -0,0 +1,817 @@
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    select, union, union_all, or_, and_, insert, update, delete, exists, literal, values, column, func, null, case,
+    Integer, BigInteger, String, Float
+)
+from sqlalchemy.dialects.postgresql import REGCONFIG, aggregate_order_by
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from models.models import (
+    Activity, Board, BoardUsers, BoardTable, TaskTable, TrelloChoiceEnum, UploadBlob, IdempotencyKey, SEARCH_CONFIG
+)
+from events import notify, published
+from ranking import rank_between, spread, DIGITS, BASE, STEP_WIDTH
+
+# Every mutation below is a single statement whose WHERE clause carries the
+# ownership/membership check, so the write either happens or returns no rows.
+# Callers decide between 404 and 403 only when nothing came back. The same
+# statement sends the change-feed event (see events.notify) off the write's
+# RETURNING, so a write that matched nothing sends nothing.
+#
+# Deleted boards are tombstoned (``deleted_at`` set) and reaped later in the
+# background; every read and write below treats a tombstoned board as missing.
+#
+# Boards count their tables and tasks, tables their tasks. Every write that
+# adds, moves or removes rows adjusts the counters in the same statement,
+# through data-modifying CTEs chained off its RETURNING.
+
+
+async def _publish(session: AsyncSession, query):
+    """Run a statement built on ``notify`` and record the events it sent; returns its rows."""
+    return published(session, (await session.execute(query)).all())
+
+
+def accessible_board_ids(user_id: int):
+    return union(
+        select(Board.id).where((Board.user_id == user_id), Board.deleted_at.is_(None)),
+        select(BoardUsers.board_id).join(Board, Board.id == BoardUsers.board_id).where(
+            (BoardUsers.user_id == user_id),
+            Board.deleted_at.is_(None),
+        ),
+    )
+
+
+def readable_boards(user_id: int):
+    return and_(
+        Board.deleted_at.is_(None),
+        or_(
+            Board.visibility == TrelloChoiceEnum.public,
+            Board.id.in_(accessible_board_ids(user_id)),
+        ),
+    )
+
+
+async def get_board_snapshot(session: AsyncSession, board_id: int, user_id: int = None):
+    """``(board, tables, tasks)`` rows of a readable board, or None.
+
+    One query per level regardless of board size. Plain rows rather than ORM
+    objects: nothing is tracked in the identity map and serialization can go
+    straight from the row mappings. Without ``user_id`` any live board is
+    returned and the caller checks access (the shared snapshot cache does).
+    """
+    readable = Board.deleted_at.is_(None) if user_id is None else readable_boards(user_id)
+    query = select(
+        Board.id, Board.board_name, Board.user_id, Board.visibility, Board.background, Board.created_at
+    ).where((Board.id == board_id), readable)
+    board = (await session.execute(query)).first()
+    if board is None:
+        return None
+    query = select(BoardTable.id, BoardTable.title).where(BoardTable.board_id == board_id).order_by(
+        BoardTable.position, BoardTable.id
+    )
+    tables = (await session.execute(query)).all()
+    query = select(TaskTable.id, TaskTable.message, TaskTable.boardtable_id).where(
+        TaskTable.boardtable_id.in_(select(BoardTable.id).where(BoardTable.board_id == board_id))
+    ).order_by(TaskTable.boardtable_id, TaskTable.position, TaskTable.id)
+    tasks = (await session.execute(query)).all()
+    return board, tables, tasks
+
+
+async def board_readable(session: AsyncSession, board_id: int, user_id: int) -> bool:
+    query = select(Board.id).where((Board.id == board_id), readable_boards(user_id))
+    return (await session.execute(query)).scalar() is not None
+
+
+def boards_for_user(user_id: int):
+    return select(
+        Board.id, Board.board_name, Board.user_id, Board.visibility, Board.background, Board.created_at
+    ).where(Board.id.in_(accessible_board_ids(user_id)))
+
+
+def tables_for_board(board_id: int, user_id: int):
+    return select(BoardTable.id, BoardTable.title, BoardTable.board_id, BoardTable.position).where(
+        (BoardTable.board_id == board_id),
+        BoardTable.board_id.in_(select(Board.id).where(Board.id == board_id, readable_boards(user_id))),
+    )
+
+
+def tasks_for_table(table_id: int, user_id: int):
+    readable_tables = select(BoardTable.id).join(Board, Board.id == BoardTable.board_id).where(
+        (BoardTable.id == table_id),
+        readable_boards(user_id),
+    )
+    return select(TaskTable.id, TaskTable.message, TaskTable.boardtable_id, TaskTable.position).where(
+        (TaskTable.boardtable_id == table_id),
+        TaskTable.boardtable_id.in_(readable_tables),
+    )
+
+
+def dashboard_for_user(user_id: int):
+    return select(
+        Board.id, Board.board_name, Board.visibility, Board.background, Board.table_count, Board.task_count,
+        Board.created_at
+    ).where(Board.id.in_(accessible_board_ids(user_id)))
+
+
+def activity_for_board(board_id: int, user_id: int):
+    return select(Activity.id, Activity.user_id, Activity.action, Activity.data, Activity.created_at).where(
+        (Activity.board_id == board_id),
+        Activity.board_id.in_(select(Board.id).where(Board.id == board_id, readable_boards(user_id))),
+    )
+
+
+def search_tasks(user_id: int, text: str, board_id: int = None):
+    """Tasks matching ``text`` with a ``score`` column; returns ``(query, keyset columns)``.
+
+    Word matches go through the GIN index on ``search_vector``; trigram word
+    similarity (``<%``) picks up typos and partial words through the trigram
+    index. Without ``board_id`` the search covers every board the user owns or
+    belongs to.
+    """
+    tsquery = func.websearch_to_tsquery(literal(SEARCH_CONFIG, REGCONFIG), text)
+    score = func.greatest(
+        func.ts_rank_cd(TaskTable.search_vector, tsquery),
+        func.word_similarity(text, TaskTable.message),
+    )
+    if board_id is None:
+        boards = accessible_board_ids(user_id)
+    else:
+        boards = select(Board.id).where((Board.id == board_id), readable_boards(user_id))
+    matches = select(
+        TaskTable.id, TaskTable.message, TaskTable.boardtable_id, BoardTable.board_id,
+        score.cast(Float).label('score'),
+    ).join(BoardTable, BoardTable.id == TaskTable.boardtable_id).where(
+        BoardTable.board_id.in_(boards),
+        or_(TaskTable.search_vector.op('@@')(tsquery), literal(text).op('<%')(TaskTable.message)),
+    ).subquery('matches')
+    return select(matches), (matches.c.score, matches.c.id)
+
+
+def writable_tables(user_id: int):
+    return select(BoardTable.id).where(BoardTable.board_id.in_(accessible_board_ids(user_id)))
+
+
+async def add_board_member(session: AsyncSession, board_id: int, owner_id: int, user_id: int):
+    query = pg_insert(BoardUsers).from_select(
+        ['board_id', 'user_id'],
+        select(literal(board_id), literal(user_id)).where(
+            exists().where((Board.id == board_id), (Board.user_id == owner_id), Board.deleted_at.is_(None))
+        )
+    ).on_conflict_do_nothing(constraint='uq_boardusers_board_id_user_id').returning(
+        BoardUsers.id, BoardUsers.user_id
+    ).cte('added')
+    query = notify(board_id, 'member.added', {"user_id": query.c.user_id}, query.c.id)
+    rows = await _publish(session, query)
+    return rows[0].id if rows else None
+
+
+async def existing_members(session: AsyncSession, board_id: int, user_ids) -> set:
+    """Which of ``user_ids`` already belong to the board, the owner included."""
+    if not user_ids:
+        return set()
+    query = union(
+        select(BoardUsers.user_id).where((BoardUsers.board_id == board_id), BoardUsers.user_id.in_(user_ids)),
+        select(Board.user_id).where((Board.id == board_id), Board.user_id.in_(user_ids)),
+    )
+    return set((await session.execute(query)).scalars())
+
+
+async def add_board_members(session: AsyncSession, board_id: int, owner_id: int, user_ids) -> set:
+    """Add ``user_ids`` with one INSERT ... ON CONFLICT DO NOTHING; returns the ids actually added."""
+    if not user_ids:
+        return set()
+    invitees = values(column('user_id', Integer), name='invitees').data([(user_id,) for user_id in user_ids])
+    query = pg_insert(BoardUsers).from_select(
+        ['board_id', 'user_id'],
+        select(literal(board_id), invitees.c.user_id).where(
+            exists().where((Board.id == board_id), (Board.user_id == owner_id), Board.deleted_at.is_(None))
+        )
+    ).on_conflict_do_nothing(constraint='uq_boardusers_board_id_user_id').returning(BoardUsers.user_id).cte('added')
+    added = select(func.json_agg(aggregate_order_by(query.c.user_id, query.c.user_id)).label('user_ids')).having(
+        func.count() > 0
+    ).subquery('added_ids')
+    query = notify(board_id, 'members.added', {"user_ids": added.c.user_ids})
+    rows = await _publish(session, query)
+    return set(rows[0].event_data['user_ids']) if rows else set()
+
+
+async def remove_board_member(session: AsyncSession, board_id: int, owner_id: int, user_id: int):
+    query = delete(BoardUsers).where(
+        (BoardUsers.board_id == board_id),
+        (BoardUsers.user_id == user_id),
+        BoardUsers.board_id.in_(select(Board.id).where(
+            (Board.id == board_id),
+            (Board.user_id == owner_id),
+            Board.deleted_at.is_(None),
+        )),
+    ).returning(BoardUsers.id).cte('removed')
+    query = notify(board_id, 'member.removed', {"user_id": user_id}, query.c.id)
+    rows = await _publish(session, query)
+    return rows[0].id if rows else None
+
+
+async def update_board(session: AsyncSession, board_id: int, user_id: int, **values):
+    query = update(Board).where(
+        (Board.id == board_id),
+        (Board.user_id == user_id),
+        Board.deleted_at.is_(None),
+    ).values(**values).returning(Board.id).cte('updated')
+    query = notify(query.c.id, 'board.updated', values)
+    rows = await _publish(session, query)
+    return rows[0].event_board_id if rows else None
+
+
+async def delete_board(session: AsyncSession, board_id: int, user_id: int):
+    """Tombstone the board; its rows are removed later by ``reap_board``."""
+    query = update(Board).where(
+        (Board.id == board_id),
+        (Board.user_id == user_id),
+        Board.deleted_at.is_(None),
+    ).values(deleted_at=datetime.utcnow()).returning(Board.id, Board.background).cte('deleted')
+    query = notify(query.c.id, 'board.deleted', {}, query.c.background)
+    rows = await _publish(session, query)
+    return rows[0] if rows else None
+
+
+async def deletion_progress(session: AsyncSession, board_id: int, user_id: int):
+    """``(deleted_at, tables, tasks)`` still left of a tombstoned board, or None."""
+    tables = select(func.count()).where(BoardTable.board_id == board_id)
+    tasks = select(func.count()).where(
+        TaskTable.boardtable_id.in_(select(BoardTable.id).where(BoardTable.board_id == board_id))
+    )
+    query = select(
+        Board.deleted_at, tables.scalar_subquery().label('tables'), tasks.scalar_subquery().label('tasks')
+    ).where(
+        (Board.id == board_id),
+        (Board.user_id == user_id),
+        Board.deleted_at.is_not(None),
+    )
+    return (await session.execute(query)).first()
+
+
+async def next_deleted_board(session: AsyncSession):
+    """Lock the oldest tombstoned board nobody else is reaping; returns its id or None.
+
+    The row lock lasts until the caller's transaction ends, so each replica's
+    reaper works on a different board.
+    """
+    query = select(Board.id).where(Board.deleted_at.is_not(None)).order_by(Board.deleted_at).limit(1).with_for_update(
+        skip_locked=True
+    )
+    return (await session.execute(query)).scalar()
+
+
+async def reap_board(session: AsyncSession, board_id: int, chunk_size: int):
+    """Delete at most ``chunk_size`` rows of a tombstoned board, children first.
+
+    Returns ``(kind, count)`` for the rows deleted by this call; ``kind`` is
+    ``"board"`` once the board row itself is gone. Keeping each call bounded
+    keeps every transaction, and the locks it holds, short.
+    """
+    tables = select(BoardTable.id).where(BoardTable.board_id == board_id)
+    steps = (
+        ("tasks", TaskTable, select(TaskTable.id).where(TaskTable.boardtable_id.in_(tables))),
+        ("tables", BoardTable, tables),
+        ("members", BoardUsers, select(BoardUsers.id).where(BoardUsers.board_id == board_id)),
+    )
+    for kind, model, ids in steps:
+        query = delete(model).where(model.id.in_(ids.limit(chunk_size)))
+        count = (await session.execute(query)).rowcount
+        if count:
+            return kind, count
+    query = delete(Board).where((Board.id == board_id), Board.deleted_at.is_not(None))
+    return "board", (await session.execute(query)).rowcount
+
+
+def _add_counts(model, deltas, name: str, **counters):
+    """UPDATE ``model`` adding ``deltas`` (``id`` plus one column per counter) to ``counters``.
+
+    The rows are locked in id order first, so that two writes touching the
+    same rows cannot deadlock. Returns the deltas applied.
+    """
+    locked = select(model.id, *(deltas.c[delta] for delta in counters.values())).where(
+        model.id == deltas.c.id
+    ).order_by(model.id).with_for_update(of=model, key_share=True).cte(f'locked_{name}')
+    return update(model).where(model.id == locked.c.id).values(**{
+        counter: getattr(model, counter) + locked.c[delta] for counter, delta in counters.items()
+    }).returning(*(locked.c[delta] for delta in counters.values()))
+
+
+def with_task_counts(query, changes):
+    """Attach to ``query`` the CTEs that add ``changes`` to the task counters.
+
+    ``changes`` selects ``(table_id, delta)`` rows, usually off the RETURNING
+    of a write CTE; they are summed per table and then per board. Tables are
+    locked even when their sum is zero: the foreign key checks at the end of
+    the statement lock them too, and must not do so out of id order.
+    """
+    changes = changes.subquery('changes')
+    table_deltas = select(changes.c.table_id.label('id'), func.sum(changes.c.delta).label('tasks')).group_by(
+        changes.c.table_id
+    ).cte('table_deltas')
+    tables = _add_counts(BoardTable, table_deltas, 'tables', task_count='tasks').returning(
+        BoardTable.board_id
+    ).cte('table_counts')
+    board_deltas = select(tables.c.board_id.label('id'), func.sum(tables.c.tasks).label('tasks')).group_by(
+        tables.c.board_id
+    ).having(func.sum(tables.c.tasks) != 0).cte('board_deltas')
+    return query.add_cte(_add_counts(Board, board_deltas, 'boards', task_count='tasks').cte('board_counts'))
+
+
+async def add_task_counts(session: AsyncSession, deltas: dict):
+    """Add ``{table_id: tasks}`` to the tables' task counters, and to their boards'."""
+    rows = [(table_id, delta) for table_id, delta in deltas.items() if delta]
+    if rows:
+        changes = values(column('table_id', Integer), column('delta', Integer), name='deltas').data(rows)
+        await session.execute(with_task_counts(select(literal(1)), select(changes.c.table_id, changes.c.delta)))
+
+
+async def reconcile_table_counts(session: AsyncSession, after_id: int, chunk_size: int):
+    """Recount the tasks of the next ``chunk_size`` tables after ``after_id``.
+
+    Returns ``(last table id or None when done, tables repaired)``. Tables a
+    write has locked are skipped until the next run. Holding the lock while
+    counting makes the count exact: a write that has not updated the counter
+    yet adds its delta on top of it afterwards.
+    """
+    query = select(BoardTable.id).where(BoardTable.id > after_id).order_by(BoardTable.id).limit(chunk_size)
+    ids = (await session.execute(query.with_for_update(key_share=True, skip_locked=True))).scalars().all()
+    if not ids:
+        return None, 0
+    counted = select(
+        BoardTable.id.label('id'), func.count(TaskTable.id).label('tasks')
+    ).outerjoin(TaskTable, TaskTable.boardtable_id == BoardTable.id).where(BoardTable.id.in_(ids)).group_by(
+        BoardTable.id
+    ).subquery('counted')
+    query = update(BoardTable).where(
+        (BoardTable.id == counted.c.id), BoardTable.task_count.is_distinct_from(counted.c.tasks)
+    ).values(task_count=counted.c.tasks)
+    return ids[-1], (await session.execute(query)).rowcount
+
+
+async def reconcile_board_counts(session: AsyncSession, after_id: int, chunk_size: int):
+    """Recount the tables and tasks of the next ``chunk_size`` boards, like ``reconcile_table_counts``."""
+    query = select(Board.id).where((Board.id > after_id), Board.deleted_at.is_(None)).order_by(Board.id).limit(
+        chunk_size
+    )
+    ids = (await session.execute(query.with_for_update(key_share=True, skip_locked=True))).scalars().all()
+    if not ids:
+        return None, 0
+    counted = select(
+        Board.id.label('id'),
+        func.count(BoardTable.id.distinct()).label('tables'),
+        func.count(TaskTable.id).label('tasks'),
+    ).outerjoin(BoardTable, BoardTable.board_id == Board.id).outerjoin(
+        TaskTable, TaskTable.boardtable_id == BoardTable.id
+    ).where(Board.id.in_(ids)).group_by(Board.id).subquery('counted')
+    query = update(Board).where(
+        (Board.id == counted.c.id),
+        or_(Board.table_count.is_distinct_from(counted.c.tables), Board.task_count.is_distinct_from(counted.c.tasks)),
+    ).values(table_count=counted.c.tables, task_count=counted.c.tasks)
+    return ids[-1], (await session.execute(query)).rowcount
+
+
+async def create_table(session: AsyncSession, board_id: int, user_id: int, title: str):
+    created = insert(BoardTable).from_select(
+        ['title', 'board_id', 'position'],
+        select(literal(title), literal(board_id), _next_position(BoardTable.board_id, board_id)).where(
+            literal(board_id).in_(accessible_board_ids(user_id))
+        )
+    ).returning(BoardTable.id, BoardTable.position, BoardTable.board_id).cte('created')
+    counted = update(Board).where(Board.id == created.c.board_id).values(table_count=Board.table_count + 1)
+    query = notify(
+        created.c.board_id, 'table.created', {"id": created.c.id, "title": title, "position": created.c.position},
+        created.c.id, created.c.position,
+    ).add_cte(counted.cte('board_counts'))
+    rows = await _publish(session, query)
+    return rows[0] if rows else None
+
+
+async def update_table(session: AsyncSession, table_id: int, user_id: int, **values):
+    query = update(BoardTable).where(
+        (BoardTable.id == table_id),
+        BoardTable.board_id.in_(accessible_board_ids(user_id)),
+    ).values(**values).returning(BoardTable.board_id).cte('updated')
+    query = notify(query.c.board_id, 'table.updated', {"id": table_id, **values})
+    rows = await _publish(session, query)
+    return rows[0].event_board_id if rows else None
+
+
+async def delete_table(session: AsyncSession, table_id: int, user_id: int):
+    deleted = delete(BoardTable).where(
+        (BoardTable.id == table_id),
+        BoardTable.board_id.in_(accessible_board_ids(user_id)),
+    ).returning(BoardTable.board_id, BoardTable.task_count).cte('deleted')
+    counted = update(Board).where(Board.id == deleted.c.board_id).values(
+        table_count=Board.table_count - 1,
+        task_count=Board.task_count - deleted.c.task_count,
+    )
+    query = notify(deleted.c.board_id, 'table.deleted', {"id": table_id}).add_cte(counted.cte('board_counts'))
+    rows = await _publish(session, query)
+    return rows[0].event_board_id if rows else None
+
+
+async def create_task(session: AsyncSession, table_id: int, user_id: int, message: str):
+    created = insert(TaskTable).from_select(
+        ['message', 'boardtable_id', 'position'],
+        select(literal(message), literal(table_id), _next_position(TaskTable.boardtable_id, table_id)).where(
+            literal(table_id).in_(writable_tables(user_id))
+        )
+    ).returning(TaskTable.id, TaskTable.position, TaskTable.boardtable_id).cte('created')
+    events = _task_events(
+        'task.created', created.c.id, created.c.boardtable_id, created.c.boardtable_id,
+        {"message": message, "position": created.c.position}, created.c.id, created.c.position,
+    )
+    query = with_task_counts(events, select(created.c.boardtable_id.label('table_id'), literal(1).label('delta')))
+    rows = await _publish(session, query)
+    return rows[0] if rows else None
+
+
+async def update_task(session: AsyncSession, task_id: int, user_id: int, **values):
+    """Returns the task's ``(boardtable_id, position, previous_table_id)``, or None."""
+    # Self-join to read the pre-update row, so callers learn which table the task left.
+    previous = TaskTable.__table__.alias('previous')
+    query = update(TaskTable).where(
+        (TaskTable.id == task_id),
+        (previous.c.id == TaskTable.id),
+        TaskTable.boardtable_id.in_(writable_tables(user_id)),
+    )
+    changes = {"message": values['message']} if values.get('message') is not None else {}
+    if values.get('boardtable_id') is not None:
+        query = query.where(literal(values['boardtable_id']).in_(writable_tables(user_id)))
+        values['position'] = _next_position(TaskTable.boardtable_id, values['boardtable_id'])
+    updated = query.values(**values).returning(
+        TaskTable.boardtable_id, TaskTable.position, previous.c.boardtable_id.label('previous_table_id')
+    ).cte('updated')
+    if 'position' in values:
+        changes["position"] = updated.c.position
+    events = _task_events(
+        'task.updated', literal(task_id), updated.c.boardtable_id, updated.c.previous_table_id, changes,
+        updated.c.boardtable_id, updated.c.position, updated.c.previous_table_id,
+    )
+    query = with_task_counts(events, _moved(updated.c.previous_table_id, updated.c.boardtable_id))
+    rows = await _publish(session, query)
+    return rows[0] if rows else None
+
+
+async def delete_task(session: AsyncSession, task_id: int, user_id: int):
+    deleted = delete(TaskTable).where(
+        (TaskTable.id == task_id),
+        TaskTable.boardtable_id.in_(writable_tables(user_id)),
+    ).returning(TaskTable.boardtable_id).cte('deleted')
+    events = _task_events(
+        'task.deleted', literal(task_id), deleted.c.boardtable_id, deleted.c.boardtable_id, {}, deleted.c.boardtable_id
+    )
+    query = with_task_counts(events, select(deleted.c.boardtable_id.label('table_id'), literal(-1).label('delta')))
+    rows = await _publish(session, query)
+    return rows[0].boardtable_id if rows else None
+
+
+def _task_events(kind: str, task_id, table_id, previous_table_id, data: dict, *columns):
+    """``kind`` on the board of ``table_id``, plus ``task.deleted`` on the board the task left, if another."""
+    table, left = aliased(BoardTable), aliased(BoardTable)
+    return union_all(
+        notify(
+            table.board_id, kind, {"id": task_id, "table_id": table_id, **data}, *columns, where=table.id == table_id
+        ),
+        notify(left.board_id, 'task.deleted', {"id": task_id, "table_id": previous_table_id}, *columns, where=and_(
+            (left.id == previous_table_id), (table.id == table_id), (left.board_id != table.board_id)
+        )),
+    )
+
+
+def _moved(previous_table_id, table_id):
+    """Counter changes of tasks moved from ``previous_table_id`` to ``table_id``; same-table moves have none."""
+    moved = previous_table_id != table_id
+    return union_all(
+        select(previous_table_id.label('table_id'), literal(-1).label('delta')).where(moved),
+        select(table_id.label('table_id'), literal(1).label('delta')).where(moved),
+    )
+
+
+async def task_table_id(session: AsyncSession, task_id: int):
+    query = select(TaskTable.boardtable_id).where(TaskTable.id == task_id)
+    return (await session.execute(query)).scalar()
+
+
+async def create_tasks(session: AsyncSession, user_id: int, items):
+    """Insert ``items`` with one multi-row INSERT; returns the new id or None per item."""
+    table_ids = {item.table_id for item in items}
+    query = writable_tables(user_id).where(BoardTable.id.in_(table_ids))
+    allowed = set((await session.execute(query)).scalars())
+
+    positions = await last_positions(session, TaskTable.boardtable_id, allowed)
+    rows, keys = [], []
+    for item in items:
+        if item.table_id in allowed:
+            positions[item.table_id] = rank_between(positions.get(item.table_id), None)
+            rows.append({
+                "message": item.message,
+                "boardtable_id": item.table_id,
+                "position": positions[item.table_id],
+            })
+            # Keys are unique per table, so (table, position) tells which item a returned row is.
+            keys.append((item.table_id, positions[item.table_id]))
+        else:
+            keys.append(None)
+    if not rows:
+        return [None] * len(items)
+    inserted = insert(TaskTable).values(rows).returning(
+        TaskTable.id, TaskTable.boardtable_id, TaskTable.position
+    ).cte('created')
+    query = with_task_counts(
+        select(inserted.c.boardtable_id, inserted.c.position, inserted.c.id),
+        select(inserted.c.boardtable_id.label('table_id'), literal(1).label('delta')),
+    )
+    created = {(table_id, position): task_id for table_id, position, task_id in (await session.execute(query)).all()}
+    return [created.get(key) for key in keys]
+
+
+async def move_tasks(session: AsyncSession, user_id: int, items):
+    """Move tasks with one UPDATE ... FROM (VALUES ...); returns {task_id: previous table_id} of those moved."""
+    if not items:
+        return {}
+    positions = await last_positions(session, TaskTable.boardtable_id, {item.table_id for item in items})
+    rows = []
+    for item in items:
+        positions[item.table_id] = rank_between(positions.get(item.table_id), None)
+        rows.append((item.task_id, item.table_id, positions[item.table_id]))
+    moves = values(
+        column('task_id', Integer), column('table_id', Integer), column('position', String), name='moves'
+    ).data(rows)
+    previous = TaskTable.__table__.alias('previous')
+    updated = update(TaskTable).where(
+        (TaskTable.id == moves.c.task_id),
+        (previous.c.id == TaskTable.id),
+        TaskTable.boardtable_id.in_(writable_tables(user_id)),
+        moves.c.table_id.in_(writable_tables(user_id)),
+    ).values(boardtable_id=moves.c.table_id, position=moves.c.position).returning(
+        TaskTable.id, previous.c.boardtable_id.label('previous_table_id'), TaskTable.boardtable_id
+    ).cte('updated')
+    query = with_task_counts(
+        select(updated.c.id, updated.c.previous_table_id),
+        _moved(updated.c.previous_table_id, updated.c.boardtable_id),
+    )
+    return dict((await session.execute(query)).all())
+
+
+async def delete_tasks(session: AsyncSession, user_id: int, task_ids, changes=()):
+    """Delete tasks and send the batch's events, one ``tasks.batch`` per board; returns {task_id: table_id} deleted.
+
+    ``changes`` are the batch's earlier writes as ``(kind, task_id, table_id,
+    previous_table_id)``, ``kind`` being ``"created"`` (from and to the same
+    table) or ``"moved"``; a task moved to another board is listed as deleted
+    on the board it left.
+    """
+    entries = []
+    if changes:
+        earlier = values(
+            column('kind', String), column('task_id', Integer), column('table_id', Integer),
+            column('previous_table_id', Integer), name='changes',
+        ).data(list(changes))
+        earlier = select(earlier).cte('earlier')
+        table, left = aliased(BoardTable), aliased(BoardTable)
+        entries += [
+            select(earlier.c.kind, earlier.c.task_id, earlier.c.table_id, table.board_id).where(
+                table.id == earlier.c.table_id
+            ),
+            select(literal('left'), earlier.c.task_id, earlier.c.previous_table_id, left.board_id).where(
+                (earlier.c.kind == 'moved'), (left.id == earlier.c.previous_table_id),
+                (table.id == earlier.c.table_id), (left.board_id != table.board_id),
+            ),
+        ]
+    deleted = None
+    if task_ids:
+        deleted = delete(TaskTable).where(
+            TaskTable.id.in_(task_ids),
+            TaskTable.boardtable_id.in_(writable_tables(user_id)),
+        ).returning(TaskTable.id, TaskTable.boardtable_id).cte('deleted')
+        entries.append(select(literal('deleted'), deleted.c.id, deleted.c.boardtable_id, BoardTable.board_id).where(
+            BoardTable.id == deleted.c.boardtable_id
+        ))
+    if not entries:
+        return {}
+    entries = union_all(*entries).subquery('entries')
+    kind, task = entries.c[0], func.json_build_array(entries.c[1], entries.c[2])
+
+    def listed(*kinds):
+        return func.coalesce(func.json_agg(task).filter(kind.in_(kinds)), func.json_build_array())
+
+    boards = select(
+        entries.c[3].label('board_id'), listed('created').label('created'), listed('moved').label('moved'),
+        listed('left', 'deleted').label('deleted'), listed('deleted').label('removed'),
+    ).group_by(entries.c[3]).subquery('boards')
+    query = notify(
+        boards.c.board_id, 'tasks.batch', {"created": boards.c.created, "moved": boards.c.moved,
+                                           "deleted": boards.c.deleted}, boards.c.removed,
+    )
+    if deleted is not None:
+        query = with_task_counts(
+            query, select(deleted.c.boardtable_id.label('table_id'), literal(-1).label('delta'))
+        )
+    rows = await _publish(session, query)
+    return {task_id: table_id for row in rows for task_id, table_id in row.removed}
+
+
+def _key_after(key):
+    """SQL twin of ``ranking.rank_between(key, None)``: add one unit at STEP_WIDTH digits or more."""
+    padded = func.rpad(key, func.greatest(func.length(key), STEP_WIDTH), DIGITS[0])
+    # Trailing top digits carry over; the digit before them goes up by one.
+    kept = func.length(func.rtrim(padded, DIGITS[-1]))
+    digit = func.substr(literal(DIGITS), func.strpos(literal(DIGITS), func.substr(padded, kept, 1)) + 1, 1)
+    return case(
+        (key.is_(None), DIGITS[BASE // 2]),
+        (kept == 0, func.concat(key, DIGITS[BASE // 2])),
+        else_=func.concat(func.left(padded, kept - 1), digit),
+    )
+
+
+def _next_position(group, group_value):
+    """Scalar subquery for a key after the last one of the group, to compute it in the write itself."""
+    last = select(func.max(group.class_.position).label('key')).where(group == group_value).subquery('last')
+    return select(_key_after(last.c.key)).scalar_subquery()
+
+
+async def last_positions(session: AsyncSession, group, group_values):
+    if not group_values:
+        return {}
+    query = select(group, func.max(group.class_.position)).where(group.in_(group_values)).group_by(group)
+    return dict((await session.execute(query)).all())
+
+
+async def rank_slot(session: AsyncSession, group, anchor_id: int, moving_id: int, before: bool):
+    """Return ``(group_value, lower, upper)`` keys around the anchor row.
+
+    The neighbour on the other side of the anchor is read with a correlated
+    MIN/MAX over the (group, position) index, so this is a single lookup.
+    """
+    model = group.class_
+    anchor = aliased(model)
+    anchor_group = getattr(anchor, group.key)
+    siblings = select(func.max(model.position) if before else func.min(model.position)).where(
+        (group == anchor_group),
+        (model.position < anchor.position) if before else (model.position > anchor.position),
+        (model.id != moving_id),
+    )
+    query = select(anchor_group, anchor.position, siblings.scalar_subquery()).where(anchor.id == anchor_id)
+    row = (await session.execute(query)).first()
+    if row is None:
+        return None
+    group_value, anchor_position, neighbour = row
+    if before:
+        return group_value, neighbour, anchor_position
+    return group_value, anchor_position, neighbour
+
+
+async def move_task(session: AsyncSession, task_id: int, user_id: int, table_id: int, position: str):
+    """Returns the table the task was moved from, or None."""
+    previous = TaskTable.__table__.alias('previous')
+    updated = update(TaskTable).where(
+        (TaskTable.id == task_id),
+        (previous.c.id == TaskTable.id),
+        TaskTable.boardtable_id.in_(writable_tables(user_id)),
+        literal(table_id).in_(writable_tables(user_id)),
+    ).values(boardtable_id=table_id, position=position).returning(
+        previous.c.boardtable_id.label('previous_table_id'), TaskTable.boardtable_id
+    ).cte('updated')
+    events = _task_events(
+        'task.moved', literal(task_id), updated.c.boardtable_id, updated.c.previous_table_id,
+        {"position": position}, updated.c.previous_table_id,
+    )
+    query = with_task_counts(events, _moved(updated.c.previous_table_id, updated.c.boardtable_id))
+    rows = await _publish(session, query)
+    return rows[0].previous_table_id if rows else None
+
+
+async def move_table(session: AsyncSession, table_id: int, user_id: int, board_id: int, position: str):
+    query = update(BoardTable).where(
+        (BoardTable.id == table_id),
+        (BoardTable.board_id == board_id),
+        BoardTable.board_id.in_(accessible_board_ids(user_id)),
+    ).values(position=position).returning(BoardTable.id).cte('moved')
+    query = notify(board_id, 'table.moved', {"id": query.c.id, "position": position})
+    rows = await _publish(session, query)
+    return rows[0].event_board_id if rows else None
+
+
+async def rebalance(session: AsyncSession, group, group_value, chunk_size: int = 5000):
+    """Respread the rank keys of one column; returns the number of rows rewritten.
+
+    Runs in the caller's transaction under an advisory lock so that only one
+    replica rebalances a given column at a time.
+    """
+    model = group.class_
+    lock_key = zlib.crc32(f'{model.__tablename__}:{group_value}'.encode())
+    if not (await session.execute(select(func.pg_try_advisory_xact_lock(literal(lock_key, BigInteger))))).scalar():
+        return 0
+
+    query = select(model.id).where(group == group_value).order_by(model.position, model.id)
+    ids = (await session.execute(query)).scalars().all()
+    keys = spread(len(ids))
+    for start in range(0, len(ids), chunk_size):
+        ranks = values(column('id', Integer), column('position', String), name='ranks').data(
+            list(zip(ids[start:start + chunk_size], keys[start:start + chunk_size]))
+        )
+        await session.execute(update(model).where(model.id == ranks.c.id).values(position=ranks.c.position))
+    return len(ids)
+
+
+async def acquire_blob(session: AsyncSession, stored):
+    query = pg_insert(UploadBlob).values(
+        digest=stored.digest,
+        path=stored.path,
+        size=stored.size,
+        content_type=stored.content_type,
+        refcount=1,
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[UploadBlob.digest],
+        set_={"refcount": UploadBlob.refcount + 1, "released_at": None},
+    )
+    await session.execute(query)
+
+
+async def release_blob(session: AsyncSession, path: str):
+    query = update(UploadBlob).where(UploadBlob.path == path).values(
+        refcount=UploadBlob.refcount - 1,
+        released_at=datetime.utcnow(),
+    )
+    await session.execute(query)
+
+
+async def sweep_blobs(session: AsyncSession, grace: float):
+    """Delete blob rows unreferenced for ``grace`` seconds; returns their paths.
+
+    The deleted rows stay locked until the caller commits, so a concurrent
+    upload of the same content waits and then recreates the row and file.
+    """
+    query = delete(UploadBlob).where(
+        (UploadBlob.refcount <= 0),
+        (UploadBlob.released_at < datetime.utcnow() - timedelta(seconds=grace)),
+    ).returning(UploadBlob.path)
+    return (await session.execute(query)).scalars().all()
+
+
+async def set_background_variants(session: AsyncSession, background: str, variants: dict):
+    # Boards share a blob when their backgrounds are identical, so update them all.
+    query = update(Board).where(Board.background == background).values(background_variants=variants)
+    await session.execute(query)
+
+
+async def get_board_background(session: AsyncSession, board_id: int, user_id: int):
+    query = select(Board.background, Board.background_variants).where(
+        (Board.id == board_id),
+        readable_boards(user_id),
+    )
+    return (await session.execute(query)).first()
+
+
+async def claim_idempotency_key(session: AsyncSession, key: str, fingerprint: str, lock_timeout: float):
+    """Claim ``key`` for a request about to run; returns True when this caller owns it.
+
+    An expired row (a finished response past its TTL, or a claim abandoned for
+    ``lock_timeout`` seconds) is taken over as if it did not exist.
+    """
+    now = datetime.utcnow()
+    query = pg_insert(IdempotencyKey).values(
+        key=key, fingerprint=fingerprint, expires_at=now + timedelta(seconds=lock_timeout)
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[IdempotencyKey.key],
+        set_={
+            "fingerprint": query.excluded.fingerprint, "status_code": null(), "headers": null(), "body": null(),
+            "expires_at": query.excluded.expires_at,
+        },
+        where=IdempotencyKey.expires_at < now,
+    ).returning(IdempotencyKey.key)
+    return (await session.execute(query)).scalar() is not None
+
+
+async def get_idempotency_key(session: AsyncSession, key: str):
+    query = select(
+        IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.headers, IdempotencyKey.body
+    ).where((IdempotencyKey.key == key), IdempotencyKey.expires_at >= datetime.utcnow())
+    return (await session.execute(query)).first()
+
+
+async def store_idempotent_response(session: AsyncSession, key: str, fingerprint: str, status_code: int,
+                                    headers: list, body: bytes, ttl: float):
+    query = update(IdempotencyKey).where(IdempotencyKey.key == key).values(
+        fingerprint=fingerprint, status_code=status_code, headers=headers, body=body,
+        expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+    )
+    await session.execute(query)
+
+
+async def release_idempotency_key(session: AsyncSession, key: str):
+    query = delete(IdempotencyKey).where((IdempotencyKey.key == key), IdempotencyKey.status_code.is_(None))
+    await session.execute(query)
+
+
+async def sweep_idempotency_keys(session: AsyncSession):
+    query = delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow())
+    return (await session.execute(query)).rowcount
@@ -0,0 +1,96 @@
+"""Lexicographic rank keys for ordering tables and tasks.
+
+Keys are strings over ``DIGITS`` read as a base-62 fraction, so there is always
+another key between two different keys and a move only rewrites the moved row.
+Keys never end in ``'0'`` and must be compared with the "C" collation.
+"""
+import math
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+_INDEX = {digit: i for i, digit in enumerate(DIGITS)}
+STEP_WIDTH = 4
+# Longest key accepted from outside (imports); keys generated here stay far shorter.
+MAX_KEY_LENGTH = 255
+
+
+def _index(digit: str) -> int:
+    try:
+        return _INDEX[digit]
+    except KeyError:
+        raise ValueError(f'{digit!r} is not a rank digit') from None
+
+
+def valid_key(key: str) -> bool:
+    return 0 < len(key) <= MAX_KEY_LENGTH and key[-1] != DIGITS[0] and all(digit in _INDEX for digit in key)
+
+
+def midpoint(a: str, b: str = None) -> str:
+    """Return a key strictly between ``a`` and ``b`` (``b=None`` is +infinity)."""
+    if b is not None:
+        if a >= b:
+            raise ValueError(f'{a!r} is not before {b!r}')
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else '0') == b[n]:
+            n += 1
+        if n:
+            return b[:n] + midpoint(a[n:], b[n:])
+
+    digit_a = _index(a[0]) if a else 0
+    digit_b = _index(b[0]) if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + midpoint(a[1:], None)
+
+
+def _to_int(key: str) -> int:
+    value = 0
+    for digit in key:
+        value = value * BASE + _index(digit)
+    return value
+
+
+def _to_key(value: int, width: int) -> str:
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits)).rstrip(DIGITS[0])
+
+
+def key_after(a: str) -> str:
+    # Step by one unit at STEP_WIDTH digits, so a column can take millions of
+    # appends before keys have to grow.
+    # queries._key_after computes the same key in SQL; keep the two in step.
+    width = max(len(a), STEP_WIDTH)
+    value = _to_int(a.ljust(width, DIGITS[0])) + 1
+    if value < BASE ** width:
+        return _to_key(value, width)
+    return midpoint(a, None)
+
+
+def key_before(b: str) -> str:
+    width = max(len(b), STEP_WIDTH)
+    value = _to_int(b.ljust(width, DIGITS[0])) - 1
+    if value > 0:
+        return _to_key(value, width)
+    return midpoint('', b)
+
+
+def rank_between(a: str = None, b: str = None) -> str:
+    if a is None and b is None:
+        return DIGITS[BASE // 2]
+    if b is None:
+        return key_after(a)
+    if a is None:
+        return key_before(b)
+    return midpoint(a, b)
+
+
+def spread(n: int) -> list:
+    """``n`` evenly spaced keys filling the lower half of the key space."""
+    width = max(STEP_WIDTH, math.ceil(math.log(max(n, 1) * 4, BASE)))
+    step = BASE ** width // 2 // (n + 1)
+    return [_to_key(i * step, width) for i in range(1, n + 1)]
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import time
+
+import queries
+from database import async_session_maker
+from settings import REAPER_CHUNK_SIZE, REAPER_PAUSE
+
+logger = logging.getLogger(__name__)
+
+
+class BoardReaper:
+    """Deletes the rows of tombstoned boards in small transactions.
+
+    Each chunk locks the board row with SKIP LOCKED, deletes at most
+    ``chunk_size`` rows and commits, so no transaction holds its locks for
+    long and several replicas can reap different boards at once. ``progress``
+    holds the rows deleted so far per board being reaped by this process.
+    """
+
+    def __init__(self, chunk_size: int = REAPER_CHUNK_SIZE, pause: float = REAPER_PAUSE,
+                 session_maker=async_session_maker):
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.session_maker = session_maker
+        self.progress = {}
+        self.deleted = {"tasks": 0, "tables": 0, "members": 0, "board": 0}
+        self.chunk_seconds_max = 0.0
+
+    def stats(self):
+        return {
+            "boards_in_progress": len(self.progress),
+            "deleted": dict(self.deleted),
+            "chunk_seconds_max": self.chunk_seconds_max,
+        }
+
+    async def reap_chunk(self):
+        """Delete one chunk of the oldest tombstoned board; returns False when none is left."""
+        started = time.perf_counter()
+        async with self.session_maker() as session:
+            board_id = await queries.next_deleted_board(session)
+            if board_id is None:
+                return False
+            kind, count = await queries.reap_board(session, board_id, self.chunk_size)
+            await session.commit()
+        self.chunk_seconds_max = max(self.chunk_seconds_max, time.perf_counter() - started)
+
+        self.deleted[kind] += count
+        progress = self.progress.setdefault(
+            board_id, {"tasks": 0, "tables": 0, "members": 0, "started": time.monotonic()}
+        )
+        if kind != "board":
+            progress[kind] += count
+            logger.debug("Reaping board %s: %s", board_id, progress)
+        else:
+            del self.progress[board_id]
+            logger.info(
+                "Reaped board %s in %.1fs: %d tasks, %d tables, %d members", board_id,
+                time.monotonic() - progress["started"], progress["tasks"], progress["tables"], progress["members"],
+            )
+        return True
+
+    async def run(self):
+        """Reap until no tombstoned board is left, pausing between chunks."""
+        while await self.reap_chunk():
+            await asyncio.sleep(self.pause)
+
+
+board_reaper = BoardReaper()
@@ -0,0 +1,206 @@
+from collections import Counter
+from datetime import datetime
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, field_validator
+
+from models.models import TrelloChoiceEnum
+
+# Bulk read endpoints declare these as ``response_model`` for the OpenAPI
+# schema but return ``ORJSONResponse`` themselves, so their rows go from
+# SQLAlchemy row mappings straight to bytes without a model instance per row.
+
+
+class TaskCreate(BaseModel):
+    table_id: int
+    message: str
+
+
+class TaskMove(BaseModel):
+    task_id: int
+    table_id: int
+
+
+class TaskBatch(BaseModel):
+    create: List[TaskCreate] = []
+    move: List[TaskMove] = []
+    delete: List[int] = []
+
+    # A task listed twice would be moved to whichever row the UPDATE ... FROM happened to join.
+    @field_validator('move')
+    @classmethod
+    def unique_moves(cls, move: List[TaskMove]) -> List[TaskMove]:
+        _unique([item.task_id for item in move])
+        return move
+
+    @field_validator('delete')
+    @classmethod
+    def unique_deletes(cls, delete: List[int]) -> List[int]:
+        _unique(delete)
+        return delete
+
+
+def _unique(task_ids: List[int]):
+    duplicates = sorted(task_id for task_id, count in Counter(task_ids).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"task ids listed more than once: {duplicates}")
+
+
+class MemberInvite(BaseModel):
+    board_id: int
+    emails: List[str]
+
+
+class InviteResult(BaseModel):
+    email: str
+    user_id: Optional[int]
+    success: bool
+    detail: str
+
+
+class InviteResults(BaseModel):
+    results: List[InviteResult]
+    added: int
+    status: int
+    success: bool
+
+
+class Result(BaseModel):
+    """Outcome of a mutation; fields a handler leaves out are omitted from the response."""
+    detail: str
+    status: Optional[int] = None
+    status_code: Optional[int] = None
+    success: Optional[bool] = None
+
+
+class BatchItemResult(BaseModel):
+    id: Optional[int]
+    success: bool
+    detail: str
+
+
+class BatchResult(BaseModel):
+    create: List[BatchItemResult]
+    move: List[BatchItemResult]
+    delete: List[BatchItemResult]
+    status: int
+    success: bool
+
+
+class BoardOut(BaseModel):
+    id: int
+    board_name: Optional[str]
+    user_id: Optional[int]
+    visibility: Optional[TrelloChoiceEnum]
+    background: Optional[str]
+    created_at: Optional[datetime]
+
+
+class BoardPage(BaseModel):
+    items: List[BoardOut]
+    next_cursor: Optional[str]
+
+
+class DashboardBoard(BaseModel):
+    id: int
+    board_name: Optional[str]
+    visibility: Optional[TrelloChoiceEnum]
+    background: Optional[str]
+    table_count: int
+    task_count: int
+    created_at: Optional[datetime]
+
+
+class DashboardPage(BaseModel):
+    items: List[DashboardBoard]
+    next_cursor: Optional[str]
+
+
+class SnapshotTask(BaseModel):
+    id: int
+    message: Optional[str]
+
+
+class SnapshotTable(BaseModel):
+    id: int
+    title: Optional[str]
+    tasks: List[SnapshotTask]
+
+
+class BoardSnapshot(BoardOut):
+    tables: List[SnapshotTable]
+
+
+class TableOut(BaseModel):
+    id: int
+    title: Optional[str]
+    board_id: int
+    position: str
+
+
+class TablePage(BaseModel):
+    items: List[TableOut]
+    next_cursor: Optional[str]
+
+
+class TaskOut(BaseModel):
+    id: int
+    message: Optional[str]
+    boardtable_id: int
+    position: str
+
+
+class TaskPage(BaseModel):
+    items: List[TaskOut]
+    next_cursor: Optional[str]
+
+
+class SearchHit(BaseModel):
+    id: int
+    message: Optional[str]
+    boardtable_id: int
+    board_id: int
+    score: float
+
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str]
+
+
+class ActivityOut(BaseModel):
+    id: int
+    user_id: Optional[int]
+    action: str
+    data: Optional[Any]
+    created_at: datetime
+
+
+class ActivityPage(BaseModel):
+    items: List[ActivityOut]
+    next_cursor: Optional[str]
+
+
+class BoardImport(Result):
+    board_id: int
+    tables: int
+    tasks: int
+
+
+class BoardDeletion(BaseModel):
+    board_id: int
+    deleted_at: datetime
+    remaining_tables: int
+    remaining_tasks: int
+
+
+def snapshot_content(board, tables, tasks) -> dict:
+    """Plain ``BoardSnapshot``-shaped content from ``queries.get_board_snapshot`` rows."""
+    by_table = {table.id: [] for table in tables}
+    for task_id, message, table_id in tasks:
+        # setdefault: a table created between the two queries is left out, not a KeyError.
+        by_table.setdefault(table_id, []).append({"id": task_id, "message": message})
+    return {
+        **board._mapping,
+        "tables": [{"id": table.id, "title": table.title, "tasks": by_table[table.id]} for table in tables],
+    }
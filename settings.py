@@ -7,4 +7,124 @@ DB_NAME = os.getenv('DB_NAME')
 DB_USER = os.getenv('DB_USER')
 DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
\ No newline at end of file
+DB_PASSWORD = os.getenv('DB_PASSWORD')
+
+AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'http://localhost:8000')
+AUTH_MAX_CONNECTIONS = int(os.getenv('AUTH_MAX_CONNECTIONS', 100))
+USER_LOOKUP_TIMEOUT = float(os.getenv('USER_LOOKUP_TIMEOUT', 5))
+USER_LOOKUP_RETRIES = int(os.getenv('USER_LOOKUP_RETRIES', 2))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 300))
+USER_CACHE_NEGATIVE_TTL = float(os.getenv('USER_CACHE_NEGATIVE_TTL', 30))
+# Bulk invites: emails per request and auth-service lookups in flight per request.
+MAX_INVITES = int(os.getenv('MAX_INVITES', 1000))
+INVITE_CONCURRENCY = int(os.getenv('INVITE_CONCURRENCY', 20))
+
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 500))
+
+AUTHZ_CACHE_SIZE = int(os.getenv('AUTHZ_CACHE_SIZE', 100000))
+AUTHZ_CACHE_TTL = float(os.getenv('AUTHZ_CACHE_TTL', 60))
+
+SECRET = os.getenv('SECRET')
+JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
+# Optional JSON object of {"kid": "secret"}; tokens carrying a kid header are verified against it.
+JWT_KEYS = os.getenv('JWT_KEYS')
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 50000))
+TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', 300))
+
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 1000))
+
+RANK_REBALANCE_LENGTH = int(os.getenv('RANK_REBALANCE_LENGTH', 12))
+
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'uploads')
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 64 * 1024 * 1024))
+BLOB_SWEEP_INTERVAL = float(os.getenv('BLOB_SWEEP_INTERVAL', 3600))
+BLOB_SWEEP_GRACE = float(os.getenv('BLOB_SWEEP_GRACE', 3600))
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_QUEUE_SIZE = int(os.getenv('IMAGE_QUEUE_SIZE', 100))
+# A background whose rendering failed is not re-queued for IMAGE_RETRY_BACKOFF seconds,
+# doubling with every failure; after IMAGE_MAX_ATTEMPTS failures it is served as the original only.
+IMAGE_RETRY_BACKOFF = float(os.getenv('IMAGE_RETRY_BACKOFF', 60))
+IMAGE_MAX_ATTEMPTS = int(os.getenv('IMAGE_MAX_ATTEMPTS', 5))
+IMAGE_CACHE_MAX_AGE = int(os.getenv('IMAGE_CACHE_MAX_AGE', 86400))
+
+EVENT_CHANNEL = os.getenv('EVENT_CHANNEL', 'board_events')
+EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', 100))
+EVENT_HISTORY_SIZE = int(os.getenv('EVENT_HISTORY_SIZE', 200))
+EVENT_HISTORY_BOARDS = int(os.getenv('EVENT_HISTORY_BOARDS', 10000))
+EVENT_HISTORY_TTL = float(os.getenv('EVENT_HISTORY_TTL', 600))
+EVENT_HEARTBEAT = float(os.getenv('EVENT_HEARTBEAT', 15))
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 100))
+# Set when DB_HOST/DB_PORT point at PgBouncer in transaction mode: no client-side
+# pool and no cached prepared statements. LISTEN then needs DB_DIRECT_HOST/PORT.
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() in ('1', 'true', 'yes')
+DB_DIRECT_HOST = os.getenv('DB_DIRECT_HOST', DB_HOST)
+DB_DIRECT_PORT = os.getenv('DB_DIRECT_PORT', DB_PORT)
+
+# Optional streaming replica for read-only endpoints; unset sends everything to DB_HOST.
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+DB_REPLICA_PORT = os.getenv('DB_REPLICA_PORT', DB_PORT)
+READ_YOUR_WRITES_WINDOW = float(os.getenv('READ_YOUR_WRITES_WINDOW', 5))
+READ_YOUR_WRITES_USERS = int(os.getenv('READ_YOUR_WRITES_USERS', 100000))
+READ_YOUR_WRITES_COOKIE = os.getenv('READ_YOUR_WRITES_COOKIE', 'last_write')
+
+# Requests slower than this are logged with their SQL; 0 turns the log off.
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', 0))
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv('SLOW_REQUEST_MAX_STATEMENTS', 50))
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 5000))
+IMPORT_MAX_LINE = int(os.getenv('IMPORT_MAX_LINE', 1024 * 1024))
+
+# Deleted boards are reaped in chunks of REAPER_CHUNK_SIZE rows, one transaction
+# per chunk, sleeping REAPER_PAUSE seconds in between.
+REAPER_INTERVAL = float(os.getenv('REAPER_INTERVAL', 30))
+REAPER_CHUNK_SIZE = int(os.getenv('REAPER_CHUNK_SIZE', 1000))
+REAPER_PAUSE = float(os.getenv('REAPER_PAUSE', 0.05))
+
+# Activity log: rows are queued in memory and inserted in batches of up to
+# ACTIVITY_BATCH_SIZE, at least every ACTIVITY_FLUSH_INTERVAL seconds.
+ACTIVITY_QUEUE_SIZE = int(os.getenv('ACTIVITY_QUEUE_SIZE', 10000))
+ACTIVITY_BATCH_SIZE = int(os.getenv('ACTIVITY_BATCH_SIZE', 500))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', 1))
+ACTIVITY_DRAIN_TIMEOUT = float(os.getenv('ACTIVITY_DRAIN_TIMEOUT', 10))
+
+# Idempotency-Key support for retried POSTs. A claim whose request never
+# finished (crashed replica) can be taken over after IDEMPOTENCY_LOCK_TIMEOUT.
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', 24 * 3600))
+IDEMPOTENCY_LOCK_TIMEOUT = float(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', 30))
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv('IDEMPOTENCY_POLL_INTERVAL', 0.2))
+# Stored responses are also kept in process, for retries that come back to the
+# same replica soon: at most IDEMPOTENCY_CACHE_BYTES, for IDEMPOTENCY_CACHE_TTL.
+# The database row stays the source of truth.
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 10000))
+IDEMPOTENCY_CACHE_BYTES = int(os.getenv('IDEMPOTENCY_CACHE_BYTES', 16 * 1024 * 1024))
+IDEMPOTENCY_CACHE_TTL = float(os.getenv('IDEMPOTENCY_CACHE_TTL', 60))
+IDEMPOTENCY_MAX_BODY = int(os.getenv('IDEMPOTENCY_MAX_BODY', 64 * 1024))
+IDEMPOTENCY_SWEEP_INTERVAL = float(os.getenv('IDEMPOTENCY_SWEEP_INTERVAL', 3600))
+
+# Board snapshots (GET /boards/{id}) are cached per board version: in process
+# for SNAPSHOT_CACHE_TTL and, when SNAPSHOT_REDIS_URL is set, in Redis shared by
+# every replica for SNAPSHOT_SHARED_TTL. Larger snapshots than
+# SNAPSHOT_CACHE_MAX_BODY bytes are served but not cached.
+SNAPSHOT_REDIS_URL = os.getenv('SNAPSHOT_REDIS_URL', '')
+SNAPSHOT_CACHE_SIZE = int(os.getenv('SNAPSHOT_CACHE_SIZE', 500))
+SNAPSHOT_CACHE_TTL = float(os.getenv('SNAPSHOT_CACHE_TTL', 60))
+SNAPSHOT_SHARED_TTL = float(os.getenv('SNAPSHOT_SHARED_TTL', 300))
+SNAPSHOT_VERSION_TTL = float(os.getenv('SNAPSHOT_VERSION_TTL', 7 * 24 * 3600))
+SNAPSHOT_CACHE_MAX_BODY = int(os.getenv('SNAPSHOT_CACHE_MAX_BODY', 4 * 1024 * 1024))
+
+# Board and table counters are recounted every COUNTER_RECONCILE_INTERVAL
+# seconds, COUNTER_RECONCILE_CHUNK rows per transaction.
+COUNTER_RECONCILE_INTERVAL = float(os.getenv('COUNTER_RECONCILE_INTERVAL', 3600))
+COUNTER_RECONCILE_CHUNK = int(os.getenv('COUNTER_RECONCILE_CHUNK', 1000))
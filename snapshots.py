@@ -0,0 +1,203 @@
+"""Two-tier cache of board snapshots, the body of ``GET /boards/{id}``.
+
+A snapshot is the same for every user who can read the board, so the
+serialized response is cached and access is checked per request. Each replica
+keeps recently used snapshots in process; behind that, a store shared by all
+replicas (Redis, or ``MemoryStore`` in tests) keeps them per board version.
+
+The version of a board is the id of its latest change-feed event:
+
+* ``events.published`` records the event id on the session. Once the
+  transaction commits, the writer drops its local copy and raises the board's
+  version in the shared store. Older shared entries become unreachable and
+  expire on their own.
+* Postgres delivers the event's NOTIFY to every replica, which drops its local
+  copy too.
+
+Concurrent misses on one board version share a single load. Misses are
+loaded through the read router like any other read. A snapshot from the
+replica may lag the version it is stored under, so it is kept no longer than
+the read-your-writes window. Users the router pins to the primary (they just
+wrote) skip both tiers and refresh them from the primary.
+"""
+import asyncio
+import logging
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import TTLCache, shared_store
+from database import router as read_router
+from events import board_events
+from models.models import TrelloChoiceEnum
+import queries
+from schemas import snapshot_content
+from settings import (
+    SNAPSHOT_REDIS_URL, SNAPSHOT_CACHE_SIZE, SNAPSHOT_CACHE_TTL, SNAPSHOT_SHARED_TTL, SNAPSHOT_VERSION_TTL,
+    SNAPSHOT_CACHE_MAX_BODY
+)
+
+logger = logging.getLogger(__name__)
+
+
+def version_key(board_id: int) -> str:
+    return f'board:{board_id}:version'
+
+
+def snapshot_key(board_id: int, version: int) -> str:
+    return f'board:{board_id}:snapshot:{version}'
+
+
+class SnapshotCache:
+    """Snapshots as ``(public, body)`` pairs, ``body`` being the JSON response."""
+
+    def __init__(self, store=None, size: int = SNAPSHOT_CACHE_SIZE, ttl: float = SNAPSHOT_CACHE_TTL,
+                 shared_ttl: float = SNAPSHOT_SHARED_TTL, version_ttl: float = SNAPSHOT_VERSION_TTL,
+                 max_body: int = SNAPSHOT_CACHE_MAX_BODY, router=read_router):
+        self.store = shared_store(SNAPSHOT_REDIS_URL) if store is None else store
+        self.local = TTLCache(size, ttl)
+        # Latest version this replica knows of, from its own commits and the change feed.
+        self.versions = TTLCache(size * 10, version_ttl)
+        self.shared_ttl = shared_ttl
+        self.version_ttl = version_ttl
+        self.max_body = max_body
+        self.router = router
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._inflight = {}
+        self._pending = set()
+
+    def stats(self):
+        return {
+            "local_hits": self.local.hits,
+            "local_misses": self.local.misses,
+            "shared_hits": self.shared_hits,
+            "shared_misses": self.shared_misses,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
+
+    async def get(self, board_id: int, user_id: int):
+        """``(public, body)`` for the board, or None if it does not exist (or is deleted)."""
+        session_maker = self.router.for_read(user_id)
+        pinned = self.router.replica is not None and session_maker is self.router.primary
+        if not pinned:
+            entry = self.local.get(board_id)
+            if entry is not None:
+                return entry
+
+        # Keyed by version too: a request that follows a commit must not wait on a load that preceded it.
+        seen = self.versions.get(board_id, 0)
+        key = (board_id, seen, session_maker)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # A task of its own: a caller that gets cancelled must not cancel the load others wait on.
+            task = asyncio.ensure_future(self._fill(board_id, seen, session_maker, pinned))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._fill_done(key, done))
+        return await asyncio.shield(task)
+
+    def _fill_done(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Every caller may have gone; avoid "never retrieved" warnings.
+            task.exception()
+
+    async def _fill(self, board_id: int, seen: int, session_maker, pinned: bool):
+        # Also pushes a version this replica has seen but the writer has not stored yet.
+        version = await self._shared(self.store.set_max(version_key(board_id), seen, self.version_ttl))
+        if version is not None and not pinned:
+            value = await self._shared(self.store.get(snapshot_key(board_id, version)))
+            if value is not None:
+                self.shared_hits += 1
+                entry = value[:1] == b'1', value[1:]
+                self._keep(board_id, seen, entry)
+                return entry
+            self.shared_misses += 1
+
+        entry = await self._load(board_id, session_maker)
+        if entry is not None and len(entry[1]) <= self.max_body:
+            ttl, shared_ttl = self.local.ttl, self.shared_ttl
+            if session_maker is not self.router.primary:
+                ttl, shared_ttl = min(ttl, self.router.window), min(shared_ttl, self.router.window)
+            if version is not None:
+                public, body = entry
+                value = (b'1' if public else b'0') + body
+                await self._shared(self.store.set(snapshot_key(board_id, version), value, shared_ttl))
+            self._keep(board_id, seen, entry, ttl)
+        return entry
+
+    async def _load(self, board_id: int, session_maker):
+        """Load on a fresh session; callers must not hold a connection of their own while waiting."""
+        self.loads += 1
+        async with session_maker() as session:
+            snapshot = await queries.get_board_snapshot(session, board_id)
+        if snapshot is None:
+            return None
+        return snapshot[0].visibility == TrelloChoiceEnum.public, orjson.dumps(snapshot_content(*snapshot))
+
+    def _keep(self, board_id: int, seen: int, entry: tuple, ttl: float = None):
+        # The board changed while loading: the entry may predate the change.
+        if self.versions.get(board_id, 0) == seen:
+            self.local.set(board_id, entry, ttl)
+
+    async def _shared(self, call):
+        """Result of a shared store call, None if it failed: the cache is an optimization, not a dependency."""
+        try:
+            return await call
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Snapshot cache store failed: %r", e)
+            return None
+
+    def bump(self, board_id: int, version: int):
+        self.local.pop(board_id)
+        if version > self.versions.get(board_id, 0):
+            self.versions.set(board_id, version)
+
+    def committed(self, versions: dict):
+        for board_id, version in versions.items():
+            self.bump(board_id, version)
+        task = asyncio.get_running_loop().create_task(self._raise_versions(versions))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _raise_versions(self, versions: dict):
+        for board_id, version in versions.items():
+            await self._shared(self.store.set_max(version_key(board_id), version, self.version_ttl))
+
+    def on_event(self, event: dict):
+        if event["type"] == "reset":
+            # Notifications may have been missed: nothing local can be trusted.
+            self.local.clear()
+            self.versions.clear()
+        else:
+            self.bump(event["board_id"], event["id"])
+
+    async def aclose(self):
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        await self.store.aclose()
+
+
+snapshot_cache = SnapshotCache()
+board_events.listeners.append(snapshot_cache.on_event)
+
+
+@event.listens_for(Session, 'after_commit')
+def bump_snapshot_versions(session):
+    versions = session.info.pop('board_versions', None)
+    if versions:
+        snapshot_cache.committed(versions)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_snapshot_versions(session):
+    session.info.pop('board_versions', None)
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, Request
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette import status
+
+from settings import UPLOAD_DIR, UPLOAD_CHUNK_SIZE, MAX_UPLOAD_SIZE
+
+IMAGE_TYPES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+    (b'GIF87a', 'image/gif', 'gif'),
+    (b'GIF89a', 'image/gif', 'gif'),
+)
+# Enough leading bytes to recognize every type above.
+SNIFF_LENGTH = 12
+# Room for the multipart framing (boundaries, part headers) on top of the file itself.
+FORM_OVERHEAD = 64 * 1024
+
+
+@dataclass
+class StoredUpload:
+    digest: str
+    path: str
+    size: int
+    content_type: str
+    temp_path: str
+
+
+def sniff_image(head: bytes):
+    for magic, content_type, extension in IMAGE_TYPES:
+        if head.startswith(magic):
+            return content_type, extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp', 'webp'
+    return None
+
+
+def blob_path(digest: str, extension: str) -> str:
+    return os.path.join(UPLOAD_DIR, 'blobs', digest[:2], f'{digest}.{extension}')
+
+
+def _too_large(max_size: int):
+    return HTTPException(
+        detail=f"Background is larger than {max_size} bytes",
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    )
+
+
+async def multipart_file(request: Request, field: str, max_size: int = MAX_UPLOAD_SIZE):
+    """Yield the content of file ``field`` of a multipart ``request`` as it arrives.
+
+    Parses ``request.stream()`` itself: Starlette's form parsing spools the
+    whole body to disk before the handler runs, so an oversized upload would
+    only be rejected once it had been received in full. Here it is rejected up
+    front by ``Content-Length``, or as soon as the body runs past the limit.
+    """
+    content_type, options = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or not options.get(b'boundary'):
+        raise HTTPException(detail="Expected a multipart/form-data body", status_code=status.HTTP_400_BAD_REQUEST)
+    limit = max_size + FORM_OVERHEAD
+    length = request.headers.get('content-length', '')
+    if length.isdigit() and int(length) > limit:
+        raise _too_large(max_size)
+
+    chunks = []
+    part = {"name": b"", "value": b"", "headers": {}, "wanted": False}
+
+    def on_part_begin():
+        part.update(name=b"", value=b"", headers={}, wanted=False)
+
+    def on_header_field(data, start, end):
+        part["name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["name"].lower()] = part["value"]
+        part.update(name=b"", value=b"")
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b'content-disposition', b''))
+        part["wanted"] = disposition.get(b'name') == field.encode() and b'filename' in disposition
+
+    def on_part_data(data, start, end):
+        if part["wanted"]:
+            chunks.append(data[start:end])
+
+    parser = MultipartParser(options[b'boundary'], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    received = 0
+    try:
+        async for data in request.stream():
+            received += len(data)
+            if received > limit:
+                raise _too_large(max_size)
+            parser.write(data)
+            # Written out in UPLOAD_CHUNK_SIZE pieces rather than in whatever the server received.
+            if sum(map(len, chunks)) >= UPLOAD_CHUNK_SIZE:
+                yield b''.join(chunks)
+                chunks.clear()
+        parser.finalize()
+    except MultipartParseError:
+        raise HTTPException(detail="Malformed multipart body", status_code=status.HTTP_400_BAD_REQUEST)
+    if chunks:
+        yield b''.join(chunks)
+
+
+async def receive_upload(chunks, max_size: int = MAX_UPLOAD_SIZE) -> StoredUpload:
+    """Stream ``chunks`` (an async iterable of bytes) to a temporary file, hashing and size-checking each one.
+
+    The type is taken from the magic bytes at the start; nothing larger than
+    one chunk is held in memory. Call ``publish_upload`` once the blob row is
+    committed to move the file to its content-addressed path.
+    """
+    temp_dir = os.path.join(UPLOAD_DIR, 'tmp')
+    await aiofiles.os.makedirs(temp_dir, exist_ok=True)
+    temp_path = os.path.join(temp_dir, uuid.uuid4().hex)
+
+    sha256 = hashlib.sha256()
+    size = 0
+    head = b''
+    kind = None
+    try:
+        async with aiofiles.open(temp_path, 'wb') as f:
+            async for chunk in chunks:
+                if kind is None:
+                    head += chunk
+                    if len(head) < SNIFF_LENGTH:
+                        continue
+                    chunk, head = head, b''
+                    kind = sniff_image(chunk)
+                    if kind is None:
+                        raise HTTPException(
+                            detail="Background must be a PNG, JPEG, GIF or WebP image",
+                            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                        )
+                size += len(chunk)
+                if size > max_size:
+                    raise _too_large(max_size)
+                sha256.update(chunk)
+                await f.write(chunk)
+        if head:
+            # Shorter than any image header.
+            raise HTTPException(
+                detail="Background must be a PNG, JPEG, GIF or WebP image",
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        if kind is None:
+            raise HTTPException(detail="Background is empty", status_code=status.HTTP_400_BAD_REQUEST)
+    except BaseException:
+        await discard_upload(temp_path)
+        raise
+
+    digest = sha256.hexdigest()
+    content_type, extension = kind
+    return StoredUpload(digest, blob_path(digest, extension), size, content_type, temp_path)
+
+
+async def publish_upload(stored: StoredUpload):
+    await aiofiles.os.makedirs(os.path.dirname(stored.path), exist_ok=True)
+    # Identical content may already be there; replacing it is atomic and harmless.
+    await aiofiles.os.replace(stored.temp_path, stored.path)
+
+
+async def discard_upload(path: str):
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
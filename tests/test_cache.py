@@ -0,0 +1,84 @@
+import pytest
+
+import cache
+from cache import TTLCache, MISSING
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def weighed(maxweight: int, maxsize: int = 100) -> TTLCache:
+    return TTLCache(maxsize, 60, maxweight=maxweight, weigh=len)
+
+
+def test_evicts_least_recently_used_by_weight():
+    entries = weighed(10)
+    entries.set('a', 'aaaa')
+    entries.set('b', 'bbbb')
+    assert entries.get('a') == 'aaaa'
+    entries.set('c', 'cccc')
+    assert entries.get('b') is None
+    assert entries.get('a') == 'aaaa'
+    assert entries.get('c') == 'cccc'
+    assert entries.weight == 8
+
+
+def test_one_entry_can_evict_several():
+    entries = weighed(10)
+    for key in 'abcde':
+        entries.set(key, 'xx')
+    entries.set('f', 'x' * 9)
+    assert len(entries) == 1
+    assert entries.get('f') == 'x' * 9
+    assert entries.weight == 9
+
+
+def test_value_heavier_than_the_cache_is_not_stored():
+    entries = weighed(10)
+    entries.set('a', 'aaaa')
+    entries.set('a', 'x' * 11)
+    assert entries.get('a', MISSING) is MISSING
+    assert len(entries) == 0
+    assert entries.weight == 0
+
+
+def test_replacing_a_key_reweighs_it():
+    entries = weighed(10)
+    entries.set('a', 'aaaa')
+    entries.set('a', 'aa')
+    assert entries.weight == 2
+    entries.set('b', 'b' * 8)
+    assert entries.get('a') == 'aa'
+    assert entries.weight == 10
+
+
+def test_pop_and_clear_release_weight():
+    entries = weighed(10)
+    entries.set('a', 'aaaa')
+    entries.set('b', 'bbb')
+    assert entries.pop('a') == 'aaaa'
+    assert entries.weight == 3
+    entries.clear()
+    assert entries.weight == 0
+    assert len(entries) == 0
+
+
+def test_maxsize_still_applies_with_weights():
+    entries = weighed(100, maxsize=2)
+    for key in 'abc':
+        entries.set(key, key)
+    assert entries.get('a') is None
+    assert len(entries) == 2
+
+
+def test_expired_entry_releases_weight(clock):
+    entries = weighed(10)
+    entries.set('a', 'aaaa', ttl=5)
+    clock[0] += 5
+    assert entries.get('a') is None
+    assert entries.weight == 0
+    assert (entries.hits, entries.misses) == (0, 1)
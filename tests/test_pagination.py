@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Column, Integer, BigInteger, Float, TIMESTAMP
+
+from pagination import encode_cursor, decode_cursor
+
+CREATED_AT = Column('created_at', TIMESTAMP)
+ID = Column('id', Integer)
+BIG_ID = Column('id', BigInteger)
+SCORE = Column('score', Float)
+
+
+def raw_cursor(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip('=')
+
+
+def test_round_trip():
+    key = (datetime(2024, 2, 29, 13, 45, 1, 123456), 42)
+    cursor = encode_cursor(key)
+    assert '=' not in cursor
+    assert decode_cursor(cursor, (CREATED_AT, ID)) == key
+
+
+def test_round_trip_float():
+    assert decode_cursor(encode_cursor((0.25, 7)), (SCORE, ID)) == (0.25, 7)
+
+
+def test_bigint_bounds():
+    assert decode_cursor(encode_cursor((2 ** 40,)), (BIG_ID,)) == (2 ** 40,)
+    assert decode_cursor(encode_cursor((-2 ** 63,)), (BIG_ID,)) == (-2 ** 63,)
+
+
+@pytest.mark.parametrize('cursor, columns', [
+    ('', (ID,)),
+    ('%%%', (ID,)),
+    ('a', (ID,)),
+    (raw_cursor('not json'), (ID,)),
+    (raw_cursor('{"id": 1}'), (ID,)),
+    (raw_cursor('[1]'), (CREATED_AT, ID)),
+    (raw_cursor('[1, 2]'), (ID,)),
+    (raw_cursor('["abc"]'), (ID,)),
+    (raw_cursor('[[1]]'), (ID,)),
+    (raw_cursor('[null]'), (ID,)),
+    (raw_cursor('["yesterday", 1]'), (CREATED_AT, ID)),
+    (raw_cursor('[1e999]'), (ID,)),
+    (raw_cursor('[1e999, 1]'), (SCORE, ID)),
+    (raw_cursor('[NaN, 1]'), (SCORE, ID)),
+    (raw_cursor('["-Infinity", 1]'), (SCORE, ID)),
+    (raw_cursor(json.dumps([2 ** 31])), (ID,)),
+    (raw_cursor(json.dumps([-2 ** 31 - 1])), (ID,)),
+    (raw_cursor(json.dumps([2 ** 63])), (BIG_ID,)),
+    (raw_cursor('[' + '9' * 5000 + ']'), (ID,)),
+])
+def test_malformed_cursor_is_a_400(cursor, columns):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor, columns)
+    assert raised.value.status_code == 400
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from ranking import DIGITS, BASE, STEP_WIDTH, MAX_KEY_LENGTH, rank_between, spread, valid_key, midpoint
+
+
+def random_key(rng: random.Random) -> str:
+    return ''.join(rng.choice(DIGITS) for _ in range(rng.randint(1, 8))).rstrip(DIGITS[0]) or DIGITS[1]
+
+
+def test_first_key_is_the_middle():
+    assert rank_between() == DIGITS[BASE // 2]
+
+
+def test_appends_increase_without_growing():
+    keys = [rank_between()]
+    for _ in range(10000):
+        keys.append(rank_between(keys[-1], None))
+    assert keys == sorted(set(keys))
+    assert max(map(len, keys)) == STEP_WIDTH
+    assert all(map(valid_key, keys))
+
+
+def test_prepends_decrease():
+    keys = [rank_between()]
+    for _ in range(1000):
+        keys.append(rank_between(None, keys[-1]))
+    assert keys == sorted(set(keys), reverse=True)
+    assert all(map(valid_key, keys))
+
+
+def test_append_after_the_last_key_of_a_width():
+    key = DIGITS[-1] * STEP_WIDTH
+    after = rank_between(key, None)
+    assert after > key
+    assert valid_key(after)
+
+
+def test_between_random_neighbours():
+    rng = random.Random(7)
+    for _ in range(5000):
+        a, b = random_key(rng), random_key(rng)
+        if a == b:
+            continue
+        a, b = min(a, b), max(a, b)
+        key = rank_between(a, b)
+        assert a < key < b, (a, b, key)
+        assert valid_key(key)
+
+
+def test_repeated_bisection_stays_ordered():
+    low = rank_between()
+    high = rank_between(low, None)
+    for _ in range(200):
+        key = rank_between(low, high)
+        assert low < key < high
+        low = key
+    assert valid_key(low)
+
+
+@pytest.mark.parametrize('a, b', [('V', 'V'), ('W', 'V'), ('V1', 'V')])
+def test_midpoint_rejects_unordered_keys(a, b):
+    with pytest.raises(ValueError):
+        midpoint(a, b)
+
+
+def test_rank_digits_are_checked():
+    with pytest.raises(ValueError):
+        rank_between('V-', None)
+
+
+@pytest.mark.parametrize('key, valid', [
+    ('V', True), ('V001', True), ('', False), ('V0', False), ('V-', False), ('A' * (MAX_KEY_LENGTH + 1), False),
+])
+def test_valid_key(key, valid):
+    assert valid_key(key) is valid
+
+
+@pytest.mark.parametrize('n', [0, 1, 2, 61, 62, 1000, 100000])
+def test_spread(n):
+    keys = spread(n)
+    assert len(keys) == n
+    assert keys == sorted(set(keys))
+    assert all(map(valid_key, keys))
+    # The lower half only: appends after a respread keep room.
+    assert all(key < DIGITS[BASE // 2] for key in keys)
+    if keys:
+        assert keys[-1] < rank_between(keys[-1], None)
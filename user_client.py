@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+
+from cache import TTLCache, MISSING
+from settings import (
+    AUTH_SERVICE_URL, AUTH_MAX_CONNECTIONS, USER_LOOKUP_TIMEOUT, USER_LOOKUP_RETRIES,
+    USER_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_NEGATIVE_TTL
+)
+
+
+class UserDirectoryClient:
+    """Async lookups against the auth service's user directory.
+
+    A single pooled ``httpx.AsyncClient`` is shared by every request, results are
+    kept in a TTL/LRU cache (misses are cached for a shorter time) and concurrent
+    lookups of the same email share one in-flight call.
+    """
+
+    def __init__(
+            self,
+            base_url: str = AUTH_SERVICE_URL,
+            timeout: float = USER_LOOKUP_TIMEOUT,
+            retries: int = USER_LOOKUP_RETRIES,
+            cache_size: int = USER_CACHE_SIZE,
+            cache_ttl: float = USER_CACHE_TTL,
+            negative_ttl: float = USER_CACHE_NEGATIVE_TTL,
+            max_connections: int = AUTH_MAX_CONNECTIONS,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.negative_ttl = negative_ttl
+        self.max_connections = max_connections
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self._client = None
+        self._inflight = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_user(self, email: str):
+        key = email.strip().lower()
+        user = self.cache.get(key, MISSING)
+        if user is not MISSING:
+            return user
+
+        task = self._inflight.get(key)
+        if task is None:
+            # A task of its own: a caller that gets cancelled must not cancel the lookup others wait on.
+            task = asyncio.ensure_future(self._lookup(key, email))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._lookup_done(key, done))
+        return await asyncio.shield(task)
+
+    async def _lookup(self, key: str, email: str):
+        user = await self._fetch(email)
+        self.cache.set(key, user, None if user else self.negative_ttl)
+        return user
+
+    def _lookup_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Every caller may have gone; avoid "never retrieved" warnings.
+            task.exception()
+
+    async def _fetch(self, email: str):
+        url = f'/auth/get-user-data{email}'
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.request('GET', url, json={"email": email})
+                if response.status_code == 404:
+                    return None
+                if response.status_code < 500 or attempt == self.retries:
+                    response.raise_for_status()
+                    return response.json()
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(0.05 * 2 ** attempt)
+
+
+user_directory = UserDirectoryClient()
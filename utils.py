@@ -1,33 +1,64 @@
-import requests
-import os
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
 import jwt
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import Depends, HTTPException
-from dotenv import load_dotenv
 
-load_dotenv()
-algorithm = 'HS256'
+from cache import TTLCache
+from settings import SECRET, JWT_ALGORITHM, JWT_KEYS, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL
+from user_client import user_directory
+
+logger = logging.getLogger(__name__)
 security = HTTPBearer()
+keyring = {None: SECRET, **json.loads(JWT_KEYS or '{}')}
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
 
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        secret_key = os.environ.get('SECRET')
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
 
-        payload = jwt.decode(token, secret_key, algorithms=['HS256'])
+
+def decode_token(token: str) -> dict:
+    """Verify ``token`` once and reuse the payload until it expires."""
+    digest = token_digest(token)
+    payload = token_cache.get(digest)
+    if payload is not None:
         return payload
+
+    kid = jwt.get_unverified_header(token).get('kid')
+    secret_key = keyring.get(kid)
+    if secret_key is None:
+        raise jwt.InvalidTokenError('Unknown key id')
+
+    payload = jwt.decode(token, secret_key, algorithms=[JWT_ALGORITHM])
+    ttl = TOKEN_CACHE_TTL
+    if 'exp' in payload:
+        ttl = min(ttl, payload['exp'] - time.time())
+    token_cache.set(digest, payload, ttl)
+    return payload
+
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    try:
+        return decode_token(credentials.credentials)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def request_api_for_user_data(email):
-    url = f'http://localhost:8000/auth/get-user-data{email}'
-    payload = {
-        "email": email
-    }
-    response = requests.get(url, json=payload)
-    response.raise_for_status()
-    return response.json()
+async def request_api_for_user_data(email):
+    return await user_directory.get_user(email)
+
+
+async def run_periodically(interval: float, func, *args):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await func(*args)
+        except Exception:
+            logger.exception("Periodic task %s failed", func.__name__)